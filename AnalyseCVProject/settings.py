@@ -203,3 +203,158 @@ MINIO_STORAGE_MEDIA_BUCKET_NAME = MINIO_BUCKET_NAME
 MINIO_STORAGE_AUTO_CREATE_MEDIA_BUCKET = True
 MINIO_STORAGE_STATIC_BUCKET_NAME = 'static'
 MINIO_STORAGE_AUTO_CREATE_STATIC_BUCKET = True
+
+# Routage de l'analyse de CV (texte / OCR / PDF direct)
+# Politiques : 'auto', 'cost' (moins de tokens), 'latency' (réponse la plus rapide)
+CV_ROUTING_POLICY = os.getenv('CV_ROUTING_POLICY', 'auto')
+CV_ROUTING_SAMPLE_PAGES = int(os.getenv('CV_ROUTING_SAMPLE_PAGES', '1'))
+CV_ROUTING_MIN_CHARS_PER_PAGE = int(os.getenv('CV_ROUTING_MIN_CHARS_PER_PAGE', '200'))
+CV_ROUTING_OCR_MAX_PAGES = int(os.getenv('CV_ROUTING_OCR_MAX_PAGES', '2'))
+CV_ROUTING_DIRECT_MAX_PAGES = int(os.getenv('CV_ROUTING_DIRECT_MAX_PAGES', '100'))
+CV_ROUTING_DIRECT_MAX_BYTES = int(os.getenv('CV_ROUTING_DIRECT_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# Extraction de texte PDF : 'pdfminer' (historique), 'pdfminer_fast', 'pdfminer_raw',
+# 'pdfium' ou 'pymupdf' si installés. Choisir avec `manage.py benchmark_extraction`.
+CV_EXTRACTION_BACKEND = os.getenv('CV_EXTRACTION_BACKEND', 'pdfminer')
+CV_EXTRACTION_TIMEOUT = float(os.getenv('CV_EXTRACTION_TIMEOUT', '20'))
+
+# Ré-analyse incrémentale : au-delà de cette part de sections modifiées, analyse complète
+CV_INCREMENTAL_MAX_CHANGED_RATIO = float(os.getenv('CV_INCREMENTAL_MAX_CHANGED_RATIO', '0.34'))
+
+# Découpage du CV en sections : plafonds en caractères par catégorie
+# (header, experience, education, skills, languages, interests, other)
+CV_SECTION_CAPS = {
+    'header': 1500,
+    'experience': 8000,
+    'education': 3000,
+    'skills': 2000,
+    'languages': 500,
+    'interests': 500,
+    'other': 1000,
+}
+# Au-delà de CV_SECTION_PARALLEL_MIN_CHARS (texte condensé), un appel Claude par groupe de sections
+CV_SECTION_PARALLEL = os.getenv('CV_SECTION_PARALLEL', 'False').lower() == 'true'
+CV_SECTION_PARALLEL_MIN_CHARS = int(os.getenv('CV_SECTION_PARALLEL_MIN_CHARS', '12000'))
+
+# Sandbox des traitements PDF : processus enfant limité en CPU, temps réel et mémoire
+CV_SANDBOX_ENABLED = os.getenv('CV_SANDBOX_ENABLED', 'True').lower() == 'true'
+CV_SANDBOX_START_METHOD = os.getenv('CV_SANDBOX_START_METHOD') or None  # forkserver si disponible, sinon spawn
+CV_SANDBOX_LIMITS = {
+    'extract': {'cpu_seconds': 20, 'wall_seconds': 30, 'memory_mb': 768},
+    'ocr': {'cpu_seconds': 60, 'wall_seconds': 90, 'memory_mb': 1536},
+}
+# Enfants réutilisés par worker (0 : un enfant par traitement) : les modèles Tesseract
+# chargés par tesserocr restent en mémoire entre les CV, et le preflight puis l'extraction
+# d'un CV texte ne démarrent pas chacun un processus ; recyclés après max_jobs traitements
+CV_SANDBOX_POOLS = {
+    'extract': {
+        'processes': int(os.getenv('CV_SANDBOX_EXTRACT_PROCESSES', '4')),
+        'max_jobs': int(os.getenv('CV_SANDBOX_EXTRACT_MAX_JOBS', '200')),
+    },
+    'ocr': {
+        'processes': int(os.getenv('CV_SANDBOX_OCR_PROCESSES', '2')),
+        'max_jobs': int(os.getenv('CV_SANDBOX_OCR_MAX_JOBS', '100')),
+    },
+}
+
+# OCR des PDF scannés : prétraitement des images et nouvel essai à plus haute
+# résolution pour les pages dont la confiance Tesseract est faible.
+# Comparer avec `manage.py benchmark_ocr`.
+# Moteur : 'tesserocr' (libtesseract en mémoire, modèles chargés une fois par processus),
+# 'pytesseract' (un binaire tesseract par page) ou 'auto'.
+CV_OCR_OPTIONS = {
+    'engine': os.getenv('CV_OCR_ENGINE', 'auto'),
+    'lang': os.getenv('CV_OCR_LANG', 'fra+eng'),
+    'base_dpi': int(os.getenv('CV_OCR_BASE_DPI', '150')),
+    'retry_dpi': int(os.getenv('CV_OCR_RETRY_DPI', '300')),
+    'min_confidence': float(os.getenv('CV_OCR_MIN_CONFIDENCE', '70')),
+    'preprocess': os.getenv('CV_OCR_PREPROCESS', 'True').lower() == 'true',
+    'adaptive_dpi': os.getenv('CV_OCR_ADAPTIVE_DPI', 'True').lower() == 'true',
+}
+
+# Détection de la langue du CV (première page) : choix des modèles Tesseract
+# et de la variante du prompt ; en dessous du seuil, fra+eng et prompt français
+CV_LANGUAGE_DETECTION = os.getenv('CV_LANGUAGE_DETECTION', 'True').lower() == 'true'
+CV_LANGUAGE_MIN_CONFIDENCE = float(os.getenv('CV_LANGUAGE_MIN_CONFIDENCE', '0.6'))
+
+# Latence de queue : requête couverte au-delà du p95 des appels Claude précédents
+# (au plus CV_HEDGE_MAX_RATIO des requêtes, prompts de moins de CV_HEDGE_MAX_PROMPT_CHARS)
+CV_HEDGE_ENABLED = os.getenv('CV_HEDGE_ENABLED', 'False').lower() == 'true'
+CV_HEDGE_PERCENTILE = float(os.getenv('CV_HEDGE_PERCENTILE', '0.95'))
+CV_HEDGE_MIN_SAMPLES = int(os.getenv('CV_HEDGE_MIN_SAMPLES', '20'))
+CV_HEDGE_MAX_RATIO = float(os.getenv('CV_HEDGE_MAX_RATIO', '0.1'))
+CV_HEDGE_MAX_PROMPT_CHARS = int(os.getenv('CV_HEDGE_MAX_PROMPT_CHARS', '40000'))
+# Threads des appels couverts (0 : limite de l'étape llm de CV_ADMISSION)
+CV_HEDGE_MAX_WORKERS = int(os.getenv('CV_HEDGE_MAX_WORKERS', '0'))
+# Documents limites (texte présent mais moins de N car./page) : PDF direct lancé en parallèle
+CV_SPECULATIVE_DIRECT = os.getenv('CV_SPECULATIVE_DIRECT', 'False').lower() == 'true'
+CV_SPECULATIVE_MAX_CHARS_PER_PAGE = int(os.getenv('CV_SPECULATIVE_MAX_CHARS_PER_PAGE', '400'))
+
+# Routage des modèles : petit modèle pour les CV texte courts et structurés,
+# grand modèle pour les scans, le PDF direct et les documents longs ou multilingues.
+# Budget : 'quality' (toujours le grand), 'balanced' ou 'latency' (petit sur toute la route texte)
+CV_MODEL_BUDGET = os.getenv('CV_MODEL_BUDGET', 'balanced')
+CV_MODEL_SMALL = os.getenv('CV_MODEL_SMALL', ANTHROPIC_MODEL)
+CV_MODEL_LARGE = os.getenv('CV_MODEL_LARGE', ANTHROPIC_MODEL)
+CV_MODEL_SMALL_MAX_PAGES = int(os.getenv('CV_MODEL_SMALL_MAX_PAGES', '2'))
+CV_MODEL_SMALL_MIN_SECTIONS = int(os.getenv('CV_MODEL_SMALL_MIN_SECTIONS', '2'))
+
+# Analyse asynchrone (déploiement ASGI) : la page d'analyse appelle api/analyze-async/
+CV_ANALYZE_ASYNC = os.getenv('CV_ANALYZE_ASYNC', 'False').lower() == 'true'
+# Threads réservés aux traitements bloquants (preflight, extraction, OCR) des vues asynchrones
+CV_ASYNC_EXTRACTION_WORKERS = int(os.getenv('CV_ASYNC_EXTRACTION_WORKERS', '4'))
+
+# Contrôle d'admission des analyses (par worker) : au-delà, attente courte pour
+# les analyses interactives, refus immédiat (HTTP 429 + Retry-After) pour les analyses de masse
+CV_ADMISSION = {
+    'max_in_flight': int(os.getenv('CV_ADMISSION_MAX_IN_FLIGHT', '8')),
+    'max_queue': int(os.getenv('CV_ADMISSION_MAX_QUEUE', '16')),
+    'bulk_max_share': float(os.getenv('CV_ADMISSION_BULK_MAX_SHARE', '0.5')),
+    'queue_timeout': float(os.getenv('CV_ADMISSION_QUEUE_TIMEOUT', '10')),
+    'min_retry_after': int(os.getenv('CV_ADMISSION_MIN_RETRY_AFTER', '5')),
+    'stages': {'extract': 8, 'ocr': 2, 'llm': 16},
+}
+# Vues asynchrones : une analyse qui attend Claude n'occupe pas de thread, d'où des limites
+# propres bien plus hautes ; les autres clés (et étapes extract, ocr) viennent de CV_ADMISSION
+CV_ASYNC_ADMISSION = {
+    'max_in_flight': int(os.getenv('CV_ASYNC_ADMISSION_MAX_IN_FLIGHT', '200')),
+    'max_queue': int(os.getenv('CV_ASYNC_ADMISSION_MAX_QUEUE', '400')),
+    'stages': {'llm': int(os.getenv('CV_ASYNC_ADMISSION_MAX_LLM_CALLS', '200'))},
+}
+
+# Ordonnancement des analyses (par worker) : nombre d'analyses exécutées en même temps,
+# priorité puis partage équitable entre clients (entreprise du recruteur) ; une analyse qui
+# attend plus de CV_SCHEDULER_MAX_WAIT secondes passe devant (anti-famine)
+CV_SCHEDULER_CONCURRENCY = int(os.getenv('CV_SCHEDULER_CONCURRENCY', '4'))
+CV_ASYNC_SCHEDULER_CONCURRENCY = int(os.getenv('CV_ASYNC_SCHEDULER_CONCURRENCY', '100'))
+CV_SCHEDULER_MAX_WAIT = float(os.getenv('CV_SCHEDULER_MAX_WAIT', '60'))
+# Poids par client (1 par défaut), ex. CV_SCHEDULER_TENANT_WEIGHTS="Acme:2,Globex:0.5"
+CV_SCHEDULER_TENANT_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, weight in (
+        item.rsplit(':', 1) for item in os.getenv('CV_SCHEDULER_TENANT_WEIGHTS', '').split(',') if ':' in item
+    )
+}
+
+# Budget journalier des appels Claude (dollars, 24 h glissantes ; 0 = sans limite).
+# Au-delà de CV_BUDGET_DEFER_RATIO du budget, les analyses de masse et le re-scoring sont différés
+CV_DAILY_BUDGET_USD = float(os.getenv('CV_DAILY_BUDGET_USD', '0'))
+CV_TENANT_DAILY_BUDGET_USD = float(os.getenv('CV_TENANT_DAILY_BUDGET_USD', '0'))
+# Dépôts anonymes (candidats sans recruteur connecté) : un seul client ; vide = CV_TENANT_DAILY_BUDGET_USD
+CV_ANONYMOUS_DAILY_BUDGET_USD = os.getenv('CV_ANONYMOUS_DAILY_BUDGET_USD') or None
+CV_BUDGET_DEFER_RATIO = float(os.getenv('CV_BUDGET_DEFER_RATIO', '0.8'))
+# Tarifs ($ par million de tokens, entrée/sortie) par nom ou famille de modèle, en plus des tarifs par défaut
+CV_LLM_PRICING = {}
+
+# Alias de compétences ajoutés à la taxonomie intégrée (candidatures/taxonomy.py),
+# ex. {'SAP': ['sap erp', 'sap s/4hana']}
+CV_SKILL_ALIASES = {}
+
+# Liste des candidatures : total affiché approché (comptage plafonné), ex. CV_LIST_COUNT_CAP=1000
+CV_LIST_APPROXIMATE_TOTAL = os.getenv('CV_LIST_APPROXIMATE_TOTAL', 'True').lower() == 'true'
+CV_LIST_COUNT_CAP = int(os.getenv('CV_LIST_COUNT_CAP', '1000'))
+
+# Cache du tableau de bord : durée de fraîcheur, puis fenêtre où une entrée périmée
+# est servie pendant son recalcul en arrière-plan (secondes)
+CV_DASHBOARD_CACHE_SECONDS = int(os.getenv('CV_DASHBOARD_CACHE_SECONDS', '60'))
+CV_DASHBOARD_STALE_SECONDS = int(os.getenv('CV_DASHBOARD_STALE_SECONDS', '600'))
@@ -3,6 +3,7 @@ from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.contrib.auth import get_user_model
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 import jwt
 from django.conf import settings
 
@@ -11,41 +12,62 @@ User = get_user_model()
 class JWTAuthenticationMiddleware:
     """
     Middleware pour l'authentification JWT via les cookies
+
+    Compatible sync et async : sous ASGI les vues asynchrones ne repassent
+    pas par un thread à cause de ce middleware.
     """
-    
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
-    def __call__(self, request):
+    def _user_id(self, request):
+        """Identifiant utilisateur du token en cookie, None si absent ou invalide"""
         # Récupérer le token depuis les cookies
         access_token = request.COOKIES.get('access_token')
-        
-        if access_token:
+
+        if not access_token:
+            return None
+        try:
+            # Valider le token
+            UntypedToken(access_token)
+
+            # Décoder le token pour récupérer l'ID utilisateur
+            payload = jwt.decode(
+                access_token,
+                settings.SECRET_KEY,
+                algorithms=['HS256']
+            )
+            return payload.get('user_id')
+
+        except (InvalidToken, TokenError, jwt.ExpiredSignatureError, jwt.DecodeError):
+            return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        user_id = self._user_id(request)
+        request.user = AnonymousUser()
+        if user_id:
             try:
-                # Valider le token
-                UntypedToken(access_token)
-                
-                # Décoder le token pour récupérer l'ID utilisateur
-                payload = jwt.decode(
-                    access_token, 
-                    settings.SECRET_KEY, 
-                    algorithms=['HS256']
-                )
-                
-                user_id = payload.get('user_id')
-                if user_id:
-                    try:
-                        user = User.objects.get(id=user_id)
-                        request.user = user
-                    except User.DoesNotExist:
-                        request.user = AnonymousUser()
-                else:
-                    request.user = AnonymousUser()
-                    
-            except (InvalidToken, TokenError, jwt.ExpiredSignatureError, jwt.DecodeError):
-                request.user = AnonymousUser()
-        else:
-            request.user = AnonymousUser()
+                request.user = User.objects.get(id=user_id)
+            except User.DoesNotExist:
+                pass
 
         response = self.get_response(request)
         return response
+
+    async def __acall__(self, request):
+        user_id = self._user_id(request)
+        request.user = AnonymousUser()
+        if user_id:
+            try:
+                request.user = await User.objects.aget(id=user_id)
+            except User.DoesNotExist:
+                pass
+
+        return await self.get_response(request)
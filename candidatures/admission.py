@@ -0,0 +1,296 @@
+"""
+Contrôle d'admission des analyses de CV.
+
+Chaque worker compte ses analyses en cours (par priorité) et les traitements
+en cours par étape (extraction, OCR, appels Claude). Quand une limite est
+atteinte, une analyse interactive attend une place quelques secondes, une
+analyse de masse est refusée tout de suite ; un refus devient une réponse
+HTTP 429 avec Retry-After. Les analyses interactives passent toujours avant
+les analyses de masse en attente.
+
+Les vues asynchrones ont leurs propres compteurs et limites (CV_ASYNC_ADMISSION,
+par-dessus CV_ADMISSION) : une analyse qui attend Claude n'y occupe pas de
+thread, un worker ASGI peut donc en garder bien plus en cours.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict
+
+from django.conf import settings
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BULK = 'bulk'
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+
+# Client des requêtes sans recruteur connecté (dépôts anonymes des candidats)
+DEFAULT_TENANT = ''
+
+STAGE_EXTRACT = 'extract'
+STAGE_OCR = 'ocr'
+STAGE_LLM = 'llm'
+
+DEFAULT_LIMITS = {
+    'max_in_flight': 8,
+    'max_queue': 16,
+    # Part maximale des places d'analyse utilisable par les analyses de masse
+    'bulk_max_share': 0.5,
+    'queue_timeout': 10.0,
+    'min_retry_after': 5,
+    # Traitements simultanés par étape au-delà desquels le worker est saturé
+    'stages': {STAGE_EXTRACT: 8, STAGE_OCR: 2, STAGE_LLM: 16},
+}
+
+
+class AdmissionRejected(Exception):
+    """Analyse refusée faute de capacité ; retry_after en secondes"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def analysis_priority(request) -> str:
+    """Priorité demandée (en-tête X-Analysis-Priority ou paramètre priority), interactive par défaut"""
+    priority = request.headers.get('X-Analysis-Priority') or request.GET.get('priority')
+    return priority if priority in PRIORITIES else PRIORITY_INTERACTIVE
+
+
+class _AsyncWaiter:
+    """Analyse asynchrone en file : la place lui est donnée directement, dans l'ordre d'arrivée"""
+
+    def __init__(self, loop):
+        self.granted = False
+        self._loop = loop
+        self.future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class AdmissionController:
+    """Compteurs d'admission partagés par les threads (et la boucle asyncio) d'un worker"""
+
+    def __init__(self, limits: dict = None, async_limits: dict = None):
+        self._limits = limits
+        self._async_limits = async_limits
+        self._cond = threading.Condition()
+        self.in_flight = {priority: 0 for priority in PRIORITIES}
+        self.waiting = {priority: 0 for priority in PRIORITIES}
+        # Analyses des vues asynchrones, comptées à part
+        self.async_in_flight = {priority: 0 for priority in PRIORITIES}
+        self.async_waiting = {priority: 0 for priority in PRIORITIES}
+        self._async_queues: Dict[str, Deque[_AsyncWaiter]] = {priority: deque() for priority in PRIORITIES}
+        self.stage_in_flight: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self._avg_seconds = None
+
+    @property
+    def limits(self) -> dict:
+        limits = dict(DEFAULT_LIMITS)
+        limits.update(self._limits if self._limits is not None else getattr(settings, 'CV_ADMISSION', {}))
+        return limits
+
+    @property
+    def async_limits(self) -> dict:
+        """Limites des vues asynchrones : CV_ASYNC_ADMISSION par-dessus les limites synchrones"""
+        limits = self.limits
+        overrides = dict(
+            self._async_limits if self._async_limits is not None else getattr(settings, 'CV_ASYNC_ADMISSION', {})
+        )
+        limits['stages'] = {**limits['stages'], **overrides.pop('stages', {})}
+        limits.update(overrides)
+        return limits
+
+    def _lane(self, asynchronous: bool) -> tuple[Dict[str, int], Dict[str, int]]:
+        """(en cours, en attente) par priorité, des vues synchrones ou asynchrones"""
+        if asynchronous:
+            return self.async_in_flight, self.async_waiting
+        return self.in_flight, self.waiting
+
+    def _count(self, name: str):
+        self.counters[name] = self.counters.get(name, 0) + 1
+
+    def _saturated_stages(self, limits: dict) -> list[str]:
+        return [
+            stage for stage, limit in limits['stages'].items()
+            if self.stage_in_flight.get(stage, 0) >= limit
+        ]
+
+    def _has_capacity(self, priority: str, limits: dict, asynchronous: bool = False) -> bool:
+        """À appeler sous le verrou"""
+        in_flight, waiting = self._lane(asynchronous)
+        if sum(in_flight.values()) >= limits['max_in_flight'] or self._saturated_stages(limits):
+            return False
+        if priority == PRIORITY_BULK:
+            if waiting[PRIORITY_INTERACTIVE]:
+                return False
+            bulk_slots = max(1, int(limits['max_in_flight'] * limits['bulk_max_share']))
+            return in_flight[PRIORITY_BULK] < bulk_slots
+        return True
+
+    def retry_after(self, asynchronous: bool = False) -> int:
+        """Estimation du délai avant une place libre, à partir de la durée moyenne des analyses"""
+        limits = self.async_limits if asynchronous else self.limits
+        average = self._avg_seconds or limits['min_retry_after']
+        queued = sum(self._lane(asynchronous)[1].values()) + 1
+        estimate = average * queued / max(limits['max_in_flight'], 1)
+        return max(int(limits['min_retry_after']), math.ceil(estimate))
+
+    def queue_time_left(self, queued_at: float, asynchronous: bool = False) -> float:
+        """Reste du délai d'attente (queue_timeout) d'une analyse arrivée à queued_at"""
+        limits = self.async_limits if asynchronous else self.limits
+        return max(0.0, limits['queue_timeout'] - (time.monotonic() - queued_at))
+
+    def _reject(self, priority: str, reason: str, asynchronous: bool = False):
+        self._count(f'rejected_{priority}')
+        raise AdmissionRejected(reason, self.retry_after(asynchronous))
+
+    def _try_enter(self, priority: str, limits: dict, queued: bool, asynchronous: bool = False) -> bool:
+        """Prend une place si possible ; sinon refuse si la file est pleine ou si la demande est de masse"""
+        in_flight, waiting = self._lane(asynchronous)
+        if self._has_capacity(priority, limits, asynchronous):
+            in_flight[priority] += 1
+            self._count(f'admitted_{priority}')
+            return True
+        if queued:
+            return False
+        if priority == PRIORITY_BULK:
+            self._reject(priority, "Capacité d'analyse saturée - analyses de masse différées", asynchronous)
+        if sum(waiting.values()) >= limits['max_queue']:
+            self._reject(priority, "File d'attente des analyses pleine", asynchronous)
+        return False
+
+    @contextmanager
+    def admit(self, priority: str = PRIORITY_INTERACTIVE):
+        """Réserve une place d'analyse pour la durée du bloc ; lève AdmissionRejected sinon"""
+        limits = self.limits
+        with self._cond:
+            if not self._try_enter(priority, limits, queued=False):
+                self.waiting[priority] += 1
+                deadline = time.monotonic() + limits['queue_timeout']
+                try:
+                    while not self._try_enter(priority, limits, queued=True):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject(priority, "Délai d'attente d'une place d'analyse dépassé")
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting[priority] -= 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(priority, time.monotonic() - started)
+
+    @contextmanager
+    def _entered(self, priority: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(priority, time.monotonic() - started, asynchronous=True)
+
+    async def aadmit(self, priority: str = PRIORITY_INTERACTIVE):
+        """
+        Version asynchrone de admit (sans bloquer la boucle), avec les limites
+        des vues asynchrones : retourne le gestionnaire de contexte qui libère la place.
+        """
+        limits = self.async_limits
+        with self._cond:
+            if self._try_enter(priority, limits, queued=False, asynchronous=True):
+                return self._entered(priority)
+            waiter = _AsyncWaiter(asyncio.get_running_loop())
+            self._async_queues[priority].append(waiter)
+            self.async_waiting[priority] += 1
+        try:
+            await asyncio.wait_for(waiter.future, limits['queue_timeout'])
+        except asyncio.TimeoutError:
+            with self._cond:
+                # Place donnée juste à l'échéance : elle est gardée
+                if not waiter.granted:
+                    self._leave_async_queue(waiter, priority)
+                    self._reject(priority, "Délai d'attente d'une place d'analyse dépassé", asynchronous=True)
+        except asyncio.CancelledError:
+            with self._cond:
+                if waiter.granted:
+                    # Place donnée à une requête abandonnée : rendue aux suivantes
+                    self.async_in_flight[priority] -= 1
+                    self._grant_async()
+                else:
+                    self._leave_async_queue(waiter, priority)
+            raise
+        return self._entered(priority)
+
+    def _leave_async_queue(self, waiter: _AsyncWaiter, priority: str):
+        self._async_queues[priority].remove(waiter)
+        self.async_waiting[priority] -= 1
+        # Une analyse de masse bloquée par cette analyse interactive peut passer
+        self._grant_async()
+
+    def _grant_async(self):
+        """
+        À appeler sous le verrou : places libres données aux analyses
+        asynchrones en file, interactives d'abord, chacune dans l'ordre d'arrivée.
+        """
+        if not any(self._async_queues.values()):
+            return
+        limits = self.async_limits
+        for priority in PRIORITIES:
+            queue = self._async_queues[priority]
+            while queue and self._has_capacity(priority, limits, asynchronous=True):
+                waiter = queue.popleft()
+                self.async_waiting[priority] -= 1
+                self.async_in_flight[priority] += 1
+                self._count(f'admitted_{priority}')
+                waiter.grant()
+
+    def _release(self, priority: str, seconds: float, asynchronous: bool = False):
+        with self._cond:
+            self._lane(asynchronous)[0][priority] -= 1
+            # Moyenne mobile exponentielle de la durée d'une analyse
+            self._avg_seconds = seconds if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * seconds
+            self._cond.notify_all()
+            self._grant_async()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Compte un traitement en cours dans une étape (extract, ocr, llm)"""
+        with self._cond:
+            self.stage_in_flight[name] = self.stage_in_flight.get(name, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.stage_in_flight[name] -= 1
+                self._cond.notify_all()
+                self._grant_async()
+
+    def snapshot(self) -> dict:
+        limits = self.limits
+        with self._cond:
+            return {
+                'in_flight': dict(self.in_flight),
+                'queue_depth': dict(self.waiting),
+                'async_in_flight': dict(self.async_in_flight),
+                'async_queue_depth': dict(self.async_waiting),
+                'stages': {
+                    stage: {'in_flight': self.stage_in_flight.get(stage, 0), 'limit': limit}
+                    for stage, limit in limits['stages'].items()
+                },
+                'saturated_stages': self._saturated_stages(limits),
+                'avg_seconds': self._avg_seconds,
+                'retry_after': self.retry_after(),
+                **self.counters,
+            }
+
+
+admission = AdmissionController()
@@ -0,0 +1,196 @@
+"""
+Analyse de CV asynchrone (ASGI).
+
+Mêmes routes et mêmes règles que CVAnalysisService, mais les appels Claude
+passent par le client AsyncAnthropic et les traitements bloquants (preflight,
+extraction, OCR, lecture du stockage) sont déportés dans un pool de threads
+borné ; un worker peut ainsi garder des centaines d'analyses en attente de
+Claude sans mobiliser un thread chacune.
+"""
+import asyncio
+import functools
+import json
+import time
+from typing import Any, Dict, Optional
+
+import anthropic
+from django.conf import settings
+
+from .admission import STAGE_LLM, admission
+from .hedging import ahedged_call, get_executor, hedge_stats
+from .services import (
+    CVAnalysisResponse, CVAnalysisService, PDFPreflight, ROUTE_OCR, ROUTE_PDF_DIRECT, ROUTE_TEXT,
+    SpeculationCancelled, _prompt_chars, analysis_from_candidature, api_key_configured, merge_section_analyses,
+)
+
+
+class AsyncCVAnalysisService(CVAnalysisService):
+    """Service d'analyse de CV avec Claude, pour les vues asynchrones"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aclient = anthropic.AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """
+        Exécute un traitement bloquant dans le pool d'extraction. Le pool est
+        borné (CV_ASYNC_EXTRACTION_WORKERS) : au-delà, les extractions attendent.
+        """
+        executor = get_executor('extraction', getattr(settings, 'CV_ASYNC_EXTRACTION_WORKERS', 4))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def _acreate_message(self, **kwargs):
+        """Appel asynchrone à l'API Messages, avec la même comptabilité que _create_message"""
+        if self.cancelled.is_set():
+            raise SpeculationCancelled("Route spéculative abandonnée")
+        with admission.stage(STAGE_LLM):
+            response = await ahedged_call(
+                lambda: self.aclient.messages.create(**kwargs), _prompt_chars(kwargs['messages']), kwargs['model']
+            )
+        self.last_usage = getattr(response, 'usage', None)
+        self.call_usages.append(self.last_usage)
+        self.usage_log.append((kwargs['model'], self.last_usage))
+        return response
+
+    async def aanalyze_cv_with_ai(self, cv_text: str) -> CVAnalysisResponse:
+        """Version asynchrone de analyze_cv_with_ai (formulaire texte)"""
+        if not api_key_configured():
+            print("Mode test activé - génération de données factices")
+            return self._mock_analysis_response(cv_text)
+        try:
+            return await self._arequest_text_analysis(cv_text)
+        except Exception as e:
+            print(f"Erreur Claude: {str(e)}")
+            print("Fallback vers mode factice")
+            return self._mock_analysis_response(cv_text)
+
+    async def aanalyze_cv_from_bytes(self, file_content: bytes, filename: str = None,
+                                     previous=None) -> tuple[CVAnalysisResponse, str]:
+        """Version asynchrone de analyze_cv_from_bytes"""
+        preflight = await self.run_blocking(self.preflight, file_content)
+        routes = self._start_analysis(preflight, previous)
+
+        if self.speculative_candidate(preflight, routes):
+            result = await self._arun_speculative(file_content, preflight, filename)
+            if result is not None:
+                return result
+            routes = [route for route in routes if route not in (ROUTE_TEXT, ROUTE_PDF_DIRECT)]
+
+        for route in routes:
+            self.call_usages = []
+            self.use_model(self.model_router.select(route, preflight, self.last_language))
+            started = time.monotonic()
+            try:
+                analysis = await self._arun_route(route, file_content, preflight, filename)
+            except Exception as e:
+                self._record_stats(route, time.monotonic() - started, False)
+                print(f"Route {route} échouée: {str(e)[:100]}")
+                continue
+            self._record_stats(route, time.monotonic() - started, True)
+            self.last_route = route
+            if self.reused_previous:
+                return analysis, previous.model_version
+            return analysis, self.model_version
+
+        # Inatteignable : la route factice ne lève pas
+        raise ValueError("Aucune route d'analyse n'a abouti")
+
+    async def _arun_speculative(self, file_content: bytes, preflight: PDFPreflight,
+                                filename: str = None) -> Optional[tuple[CVAnalysisResponse, str]]:
+        """Routes texte et PDF direct en concurrence, chacune sur sa copie du service ; la perdante est annulée"""
+        hedge_stats.incr('speculative')
+        self.call_usages = []
+        self.use_model(self.model_router.select(ROUTE_PDF_DIRECT, preflight, self.last_language))
+        started = time.monotonic()
+        tasks = {}
+        for route in (ROUTE_TEXT, ROUTE_PDF_DIRECT):
+            route_service = self._fork_route(route)
+            task = asyncio.ensure_future(route_service._arun_route(route, file_content, preflight, filename))
+            tasks[task] = route_service
+        winner = None
+        pending = set(tasks)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    print(f"Route spéculative {tasks[task].last_route} échouée: {str(task.exception())[:100]}")
+                    continue
+                winner = task
+                break
+
+        for task, route_service in tasks.items():
+            if task is not winner:
+                # Une extraction déjà lancée dans le pool continue : le drapeau bloque ses appels Claude
+                route_service.cancelled.set()
+                task.cancel()
+                task.add_done_callback(functools.partial(self._asettle_route, route_service))
+
+        if winner is None:
+            self._record_stats(ROUTE_TEXT, time.monotonic() - started, False)
+            return None
+        route_service = tasks[winner]
+        self._adopt_route(route_service)
+        hedge_stats.incr(f'speculative_{route_service.last_route}_wins')
+        self._record_stats(route_service.last_route, time.monotonic() - started, True)
+        self.last_route = route_service.last_route
+        print(f"Route spéculative retenue: {self.last_route}")
+        if self.reused_previous:
+            return winner.result(), self.previous.model_version
+        return winner.result(), self.model_version
+
+    def _asettle_route(self, route_service: CVAnalysisService, task=None):
+        """Callback de la boucle : l'enregistrement éventuel (ORM) part dans le pool d'extraction"""
+        executor = get_executor('extraction', getattr(settings, 'CV_ASYNC_EXTRACTION_WORKERS', 4))
+        executor.submit(self._settle_route, route_service)
+
+    async def _arun_route(self, route: str, file_content: bytes, preflight: PDFPreflight,
+                          filename: str = None) -> CVAnalysisResponse:
+        if route == ROUTE_TEXT:
+            cv_text = await self.run_blocking(self._extract_route_text, file_content, preflight)
+            return await self._aanalyze_text_incremental(cv_text, filename)
+        if route == ROUTE_OCR:
+            cv_text = await self.run_blocking(self._extract_ocr_text, file_content)
+            return await self._aanalyze_text_route(cv_text, filename)
+        if route == ROUTE_PDF_DIRECT:
+            return await self._arequest_pdf_analysis(file_content)
+        return self._mock_route_response(filename)
+
+    async def _aanalyze_text_incremental(self, cv_text: str, filename: str = None) -> CVAnalysisResponse:
+        mode, changed_sections, removed = self._incremental_plan(cv_text)
+        if mode == 'skip':
+            return analysis_from_candidature(self.previous)
+        if mode == 'partial':
+            prompt = self.create_incremental_prompt(
+                analysis_from_candidature(self.previous), changed_sections, removed
+            )
+            return self._parse_analysis(await self._acreate_message(**self._text_message_kwargs(prompt)))
+        return await self._aanalyze_text_route(cv_text, filename)
+
+    async def _aanalyze_text_route(self, cv_text: str, filename: str = None) -> CVAnalysisResponse:
+        if not api_key_configured():
+            return self._mock_analysis_response(cv_text, filename)
+        return await self._arequest_text_analysis(cv_text)
+
+    async def _arequest_text_analysis(self, cv_text: str) -> CVAnalysisResponse:
+        condensed = self.sectionizer.condense(cv_text)
+        print(f"Texte condensé: {len(condensed)}/{len(cv_text)} caractères")
+        if self._use_sectioned_analysis(condensed):
+            texts = self._section_group_texts(cv_text)
+            partials = await asyncio.gather(*(
+                self._arequest_section_group(group, text) for group, text in texts.items()
+            ))
+            return merge_section_analyses(list(partials))
+
+        prompt = self.create_analysis_prompt(condensed)
+        print(f"Appel à Claude avec le modèle: {self.model}")
+        return self._parse_analysis(await self._acreate_message(**self._text_message_kwargs(prompt)))
+
+    async def _arequest_section_group(self, group: str, sections_text: str) -> Dict[str, Any]:
+        response = await self._acreate_message(
+            **self._text_message_kwargs(self.create_section_prompt(group, sections_text), max_tokens=1500)
+        )
+        return json.loads(response.content[0].text)
+
+    async def _arequest_pdf_analysis(self, file_content: bytes) -> CVAnalysisResponse:
+        return self._parse_analysis(await self._acreate_message(**self._pdf_message_kwargs(file_content)))
@@ -0,0 +1,238 @@
+"""
+Budget journalier des appels Claude.
+
+Chaque analyse enregistre sa consommation (AnalysisUsage : tokens d'entrée,
+de sortie, de cache et coût calculé). Le budget porte sur les 24 dernières
+heures glissantes, globalement (CV_DAILY_BUDGET_USD) et par client
+(CV_TENANT_DAILY_BUDGET_USD) :
+- au-delà de CV_BUDGET_DEFER_RATIO du budget, les analyses non urgentes
+  (masse, re-scoring) sont différées ;
+- budget atteint, toutes les analyses sont refusées jusqu'à ce que la
+  fenêtre glissante libère de la marge.
+Un budget à 0 désactive la limite correspondante. Les dépôts anonymes (sans
+recruteur connecté, client DEFAULT_TENANT) forment un seul client, limité par
+CV_ANONYMOUS_DAILY_BUDGET_USD (à défaut CV_TENANT_DAILY_BUDGET_USD).
+Retry-After est calculé sur la fenêtre qui a refusé l'analyse (globale ou du
+client) : délai avant que sa dépense repasse sous le seuil dépassé.
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .admission import DEFAULT_TENANT, AdmissionRejected
+
+# Dollars par million de tokens (entrée, sortie), par famille de modèle
+DEFAULT_PRICING = {
+    'haiku': (0.80, 4.00),
+    'sonnet': (3.00, 15.00),
+    'opus': (15.00, 75.00),
+}
+# Écriture et lecture du cache de prompt, relatives au tarif d'entrée
+CACHE_WRITE_FACTOR = 1.25
+CACHE_READ_FACTOR = 0.1
+BUDGET_WINDOW = timedelta(hours=24)
+
+
+def model_pricing(model: str) -> Tuple[float, float]:
+    """Tarif (entrée, sortie) d'un modèle : nom exact puis famille, CV_LLM_PRICING prioritaire"""
+    pricing = {**DEFAULT_PRICING, **getattr(settings, 'CV_LLM_PRICING', {})}
+    if model in pricing:
+        return pricing[model]
+    for family, prices in pricing.items():
+        if family in model:
+            return prices
+    return DEFAULT_PRICING['sonnet']
+
+
+def usage_cost(model: str, input_tokens: int = 0, output_tokens: int = 0,
+               cache_creation_tokens: int = 0, cache_read_tokens: int = 0) -> Decimal:
+    input_price, output_price = model_pricing(model)
+    dollars = (
+        input_tokens * input_price
+        + output_tokens * output_price
+        + cache_creation_tokens * input_price * CACHE_WRITE_FACTOR
+        + cache_read_tokens * input_price * CACHE_READ_FACTOR
+    ) / 1_000_000
+    return Decimal(str(round(dollars, 6)))
+
+
+def summarize_usage(usage_log: Iterable) -> Dict[str, Dict[str, int]]:
+    """Tokens cumulés par modèle à partir des (modèle, usage) d'un service"""
+    totals: Dict[str, Dict[str, int]] = {}
+    for model, usage in usage_log:
+        if usage is None:
+            continue
+        entry = totals.setdefault(model, {
+            'calls': 0, 'input_tokens': 0, 'output_tokens': 0,
+            'cache_creation_tokens': 0, 'cache_read_tokens': 0,
+        })
+        entry['calls'] += 1
+        entry['input_tokens'] += getattr(usage, 'input_tokens', 0) or 0
+        entry['output_tokens'] += getattr(usage, 'output_tokens', 0) or 0
+        entry['cache_creation_tokens'] += getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        entry['cache_read_tokens'] += getattr(usage, 'cache_read_input_tokens', 0) or 0
+    return totals
+
+
+def record_usage(service, tenant: str = '', priority: str = 'normal', candidature=None) -> list:
+    """
+    Enregistre la consommation d'une analyse (une ligne par modèle appelé).
+    Une route spéculative perdante qui se termine plus tard est enregistrée
+    avec le même contexte (voir CVAnalysisService._settle_route).
+    """
+    from .models import AnalysisUsage
+
+    with service.usage_lock:
+        usage_log, service.usage_log = service.usage_log, []
+        service.usage_context = (tenant, priority, candidature)
+    rows = [
+        AnalysisUsage(
+            candidature=candidature,
+            tenant=tenant,
+            priority=priority,
+            model=model,
+            route=service.last_route or '',
+            cost=usage_cost(model, **{k: v for k, v in tokens.items() if k != 'calls'}),
+            **tokens,
+        )
+        for model, tokens in summarize_usage(usage_log).items()
+    ]
+    if rows:
+        AnalysisUsage.objects.bulk_create(rows)
+        budget.invalidate()
+    return rows
+
+
+async def arecord_usage(service, tenant: str = '', priority: str = 'normal', candidature=None) -> list:
+    return await sync_to_async(record_usage)(service, tenant, priority, candidature)
+
+
+class DailyBudget:
+    """Dépense glissante sur 24 h, mise en cache quelques secondes par worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[float, Decimal]] = {}
+        self._counters: Dict[str, int] = {}
+
+    def limit(self, tenant: str = None) -> Decimal:
+        """Budget global (tenant None), des dépôts anonymes ou d'un client"""
+        if tenant is None:
+            return Decimal(str(getattr(settings, 'CV_DAILY_BUDGET_USD', 0)))
+        if tenant == DEFAULT_TENANT and getattr(settings, 'CV_ANONYMOUS_DAILY_BUDGET_USD', None) is not None:
+            return Decimal(str(settings.CV_ANONYMOUS_DAILY_BUDGET_USD))
+        return Decimal(str(getattr(settings, 'CV_TENANT_DAILY_BUDGET_USD', 0)))
+
+    def _window(self, tenant: str = None):
+        from .models import AnalysisUsage
+
+        usages = AnalysisUsage.objects.filter(created_at__gte=timezone.now() - BUDGET_WINDOW)
+        return usages if tenant is None else usages.filter(tenant=tenant)
+
+    def spend(self, tenant: str = None) -> Decimal:
+        key = '*' if tenant is None else f't:{tenant}'
+        ttl = getattr(settings, 'CV_BUDGET_CACHE_SECONDS', 5)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached[0] < ttl:
+                return cached[1]
+        total = self._window(tenant).aggregate(total=Sum('cost'))['total'] or Decimal('0')
+        with self._lock:
+            self._cache[key] = (time.monotonic(), total)
+        return total
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _ratio(self, tenant: str = None) -> float:
+        limit = self.limit(tenant)
+        return float(self.spend(tenant) / limit) if limit > 0 else 0.0
+
+    def usage_ratio(self, tenant: str = DEFAULT_TENANT) -> float:
+        """Part consommée du budget le plus contraignant (global ou client)"""
+        return self._binding(tenant)[0]
+
+    def _binding(self, tenant: str) -> Tuple[float, Optional[str]]:
+        """(ratio, fenêtre) du budget le plus contraignant ; fenêtre None pour le budget global"""
+        return max((self._ratio(), None), (self._ratio(tenant), tenant), key=lambda item: item[0])
+
+    def retry_after(self, tenant: str = None, threshold: float = 1.0) -> int:
+        """
+        Secondes avant que la dépense de la fenêtre (globale si tenant est None)
+        repasse sous threshold × budget, les plus anciennes dépenses sortant en premier.
+        """
+        excess = self.spend(tenant) - self.limit(tenant) * Decimal(str(threshold))
+        freed = Decimal('0')
+        usages = self._window(tenant).order_by('created_at').values_list('created_at', 'cost')
+        for created_at, cost in usages.iterator():
+            freed += cost
+            if freed > excess:
+                return max(60, int((created_at + BUDGET_WINDOW - timezone.now()).total_seconds()))
+        return 60
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def note_credit_error(self):
+        """Crédit Anthropic épuisé : l'analyse a basculé en mode factice"""
+        self._count('credit_errors')
+
+    def check(self, tenant: str = DEFAULT_TENANT, urgent: bool = True):
+        """Lève AdmissionRejected si l'analyse doit être différée ou refusée"""
+        ratio, window = self._binding(tenant)
+        scope = "d'analyse" if window is None else "du client"
+        if ratio >= 1.0:
+            self._count('refused')
+            raise AdmissionRejected(f"Budget journalier {scope} atteint", self.retry_after(window))
+        defer_ratio = getattr(settings, 'CV_BUDGET_DEFER_RATIO', 0.8)
+        if not urgent and ratio >= defer_ratio:
+            self._count('deferred')
+            raise AdmissionRejected(
+                f"Budget journalier {scope} presque atteint - analyses non urgentes différées",
+                self.retry_after(window, defer_ratio),
+            )
+
+    async def acheck(self, tenant: str = DEFAULT_TENANT, urgent: bool = True):
+        await sync_to_async(self.check)(tenant, urgent)
+
+    def allows(self, tenant: str = DEFAULT_TENANT, urgent: bool = False) -> bool:
+        try:
+            self.check(tenant, urgent)
+        except AdmissionRejected:
+            return False
+        return True
+
+    def snapshot(self, tenant: Optional[str] = None) -> dict:
+        tenants = [
+            {
+                'tenant': row['tenant'],
+                'spend': float(row['total'] or 0),
+                'limit': float(self.limit(row['tenant'])),
+                'ratio': self._ratio(row['tenant']),
+            }
+            for row in self._window().values('tenant').annotate(total=Sum('cost')).order_by('-total')
+            if tenant is None or row['tenant'] == tenant
+        ]
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'window_hours': int(BUDGET_WINDOW.total_seconds() // 3600),
+            'spend': float(self.spend()),
+            'limit': float(self.limit()),
+            'ratio': self._ratio(),
+            'defer_ratio': getattr(settings, 'CV_BUDGET_DEFER_RATIO', 0.8),
+            'tenants': tenants,
+            **counters,
+        }
+
+
+budget = DailyBudget()
@@ -0,0 +1,249 @@
+"""
+Maîtrise de la latence de queue des appels Claude.
+
+- Requête couverte (hedged) : si un appel dépasse le p95 observé, un doublon
+  est lancé et la première réponse gagne ; l'autre est abandonnée.
+- Exécution spéculative : pour un document limite, l'analyse PDF directe
+  démarre en même temps que l'extraction de texte.
+
+Un appel HTTP déjà parti ne peut pas être interrompu : le perdant est
+abandonné (son résultat est ignoré) et sa consommation comptée comme
+gaspillage. Les doublons sont plafonnés en proportion des requêtes.
+
+Le délai avant doublon court à partir du démarrage effectif de l'appel : le
+temps passé dans la file du pool n'est pas de la latence de l'API, et un
+pool saturé ne lance pas de doublon.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Optional
+
+from django.conf import settings
+
+from .admission import STAGE_LLM, admission
+
+
+class LatencyWindow:
+    """Dernières durées observées, pour estimer un percentile glissant"""
+
+    def __init__(self, size: int = 200):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(min_samples, 1):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+class HedgeStats:
+    """Compteurs des requêtes couvertes et des exécutions spéculatives"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            data: Dict[str, float] = dict(self._counters)
+        hedged = data.get('hedged', 0)
+        data['hedge_rate'] = hedged / data['requests'] if data.get('requests') else 0.0
+        data['hedge_hit_rate'] = data.get('hedge_wins', 0) / hedged if hedged else 0.0
+        speculative = data.get('speculative', 0)
+        data['speculative_direct_rate'] = data.get('speculative_pdf_direct_wins', 0) / speculative if speculative else 0.0
+        return data
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+# Une fenêtre de latence par modèle : les p95 d'un petit et d'un grand modèle diffèrent
+_message_latencies: Dict[str, LatencyWindow] = {}
+_message_latencies_lock = threading.Lock()
+hedge_stats = HedgeStats()
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+# Threads du pool 'hedge' occupés par un appel
+_hedge_busy = 0
+_hedge_busy_lock = threading.Lock()
+
+
+def get_executor(name: str = 'hedge', max_workers: int = None) -> ThreadPoolExecutor:
+    """
+    Pool de threads partagé, créé au premier usage. Les routes spéculatives
+    ('speculative') et les appels couverts ('hedge') ont chacun le leur : une
+    route spéculative qui couvre son appel ne peut pas bloquer son propre pool.
+    """
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=max_workers or hedge_pool_size(),
+                thread_name_prefix=f'cv-{name}',
+            )
+        return _executors[name]
+
+
+def hedge_pool_size() -> int:
+    """CV_HEDGE_MAX_WORKERS, à défaut la limite d'appels Claude simultanés (étape llm de CV_ADMISSION)"""
+    return getattr(settings, 'CV_HEDGE_MAX_WORKERS', 0) or admission.limits['stages'][STAGE_LLM]
+
+
+def hedge_worker_free() -> bool:
+    with _hedge_busy_lock:
+        return _hedge_busy < hedge_pool_size()
+
+
+def _run_busy(func: Callable, running: threading.Event):
+    """Exécutée par un thread du pool 'hedge' : signale le démarrage effectif de l'appel"""
+    global _hedge_busy
+    with _hedge_busy_lock:
+        _hedge_busy += 1
+    running.set()
+    try:
+        return func()
+    finally:
+        with _hedge_busy_lock:
+            _hedge_busy -= 1
+
+
+def message_latency(key: str = '') -> LatencyWindow:
+    with _message_latencies_lock:
+        return _message_latencies.setdefault(key, LatencyWindow())
+
+
+def hedge_allowed(prompt_chars: int) -> bool:
+    """Garde-fous de coût : taille du prompt et part maximale de requêtes doublées"""
+    if prompt_chars > getattr(settings, 'CV_HEDGE_MAX_PROMPT_CHARS', 40000):
+        return False
+    requests = hedge_stats.get('requests')
+    return hedge_stats.get('hedged') < getattr(settings, 'CV_HEDGE_MAX_RATIO', 0.1) * max(requests, 1)
+
+
+def _record_wasted(future):
+    """Consommation d'un appel perdant, lorsqu'il finit par répondre"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    usage = getattr(future.result(), 'usage', None)
+    hedge_stats.incr('wasted_input_tokens', getattr(usage, 'input_tokens', 0) or 0)
+    hedge_stats.incr('wasted_output_tokens', getattr(usage, 'output_tokens', 0) or 0)
+
+
+def hedged_call(func: Callable, prompt_chars: int = 0, key: str = ''):
+    """
+    Exécute func() ; au-delà du p95 des appels précédents, lance un doublon et
+    retourne la première réponse réussie. Sans historique suffisant, l'appel
+    est simple. `key` sépare les historiques de latence (nom du modèle).
+    """
+    started = time.monotonic()
+    hedge_stats.incr('requests')
+    latencies = message_latency(key)
+    delay = latencies.percentile(
+        getattr(settings, 'CV_HEDGE_PERCENTILE', 0.95), getattr(settings, 'CV_HEDGE_MIN_SAMPLES', 20)
+    )
+    if not getattr(settings, 'CV_HEDGE_ENABLED', False) or delay is None:
+        result = func()
+        latencies.add(time.monotonic() - started)
+        return result
+
+    executor = get_executor('hedge', hedge_pool_size())
+    running = threading.Event()
+    primary = executor.submit(_run_busy, func, running)
+    # Le temps passé dans la file du pool ne compte ni dans le délai ni dans la latence
+    running.wait()
+    started = time.monotonic()
+    done, _ = wait([primary], timeout=delay)
+    hedge_now = not done and hedge_allowed(prompt_chars)
+    if hedge_now and not hedge_worker_free():
+        # Pool saturé : le doublon attendrait lui aussi dans la file
+        hedge_stats.incr('hedge_skipped_busy')
+        hedge_now = False
+    if not hedge_now:
+        result = primary.result()
+        latencies.add(time.monotonic() - started)
+        return result
+
+    hedge_stats.incr('hedged')
+    print(f"Appel Claude au-delà du p95 ({delay:.1f}s) - requête couverte lancée")
+    hedge = executor.submit(_run_busy, func, threading.Event())
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            for loser in pending:
+                loser.cancel()
+                loser.add_done_callback(_record_wasted)
+            hedge_stats.incr('hedge_wins' if future is hedge else 'primary_wins')
+            latencies.add(time.monotonic() - started)
+            return future.result()
+    raise error
+
+
+async def ahedged_call(factory: Callable[[], Awaitable], prompt_chars: int = 0, key: str = ''):
+    """
+    Version asynchrone de hedged_call : `factory` crée la coroutine de l'appel.
+    Ici l'appel perdant est réellement annulé (requête HTTP interrompue).
+    """
+    started = time.monotonic()
+    hedge_stats.incr('requests')
+    latencies = message_latency(key)
+    delay = latencies.percentile(
+        getattr(settings, 'CV_HEDGE_PERCENTILE', 0.95), getattr(settings, 'CV_HEDGE_MIN_SAMPLES', 20)
+    )
+    if not getattr(settings, 'CV_HEDGE_ENABLED', False) or delay is None:
+        result = await factory()
+        latencies.add(time.monotonic() - started)
+        return result
+
+    primary = asyncio.ensure_future(factory())
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done or not hedge_allowed(prompt_chars):
+        result = await primary
+        latencies.add(time.monotonic() - started)
+        return result
+
+    hedge_stats.incr('hedged')
+    print(f"Appel Claude au-delà du p95 ({delay:.1f}s) - requête couverte lancée")
+    hedge = asyncio.ensure_future(factory())
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                error = task.exception()
+                continue
+            for loser in pending:
+                loser.cancel()
+                hedge_stats.incr('cancelled')
+            hedge_stats.incr('hedge_wins' if task is hedge else 'primary_wins')
+            latencies.add(time.monotonic() - started)
+            return task.result()
+    raise error
@@ -0,0 +1,75 @@
+"""
+Détection rapide de la langue d'un CV (français, anglais, espagnol) à partir
+des mots-outils les plus fréquents, sans dépendance externe. Sert à choisir
+les modèles Tesseract à charger et la variante du prompt.
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict
+
+# Mots-outils propres à chaque langue (sans accents, les textes sont normalisés)
+STOPWORDS = {
+    'fr': {
+        'le', 'la', 'les', 'des', 'du', 'une', 'et', 'est', 'en', 'au', 'aux', 'pour', 'avec', 'dans',
+        'sur', 'par', 'qui', 'que', 'ou', 'mes', 'ses', 'chez', 'depuis', 'annee', 'annees', 'ans',
+        'experience', 'competences', 'formation', 'langues', 'centres', 'interet', 'poste', 'stage',
+    },
+    'en': {
+        'the', 'and', 'of', 'to', 'in', 'for', 'with', 'on', 'at', 'by', 'from', 'is', 'as', 'an',
+        'my', 'years', 'year', 'experience', 'skills', 'education', 'languages', 'interests', 'work',
+        'developed', 'managed', 'team', 'university', 'present',
+    },
+    'es': {
+        'el', 'los', 'las', 'del', 'y', 'en', 'para', 'con', 'por', 'una', 'un', 'que', 'como', 'mis',
+        'desde', 'anos', 'experiencia', 'habilidades', 'formacion', 'idiomas', 'intereses', 'trabajo',
+        'equipo', 'universidad', 'actualidad', 'gestion',
+    },
+}
+
+# Jeux de langues Tesseract correspondants
+TESSERACT_LANGS = {'fr': 'fra', 'en': 'eng', 'es': 'spa'}
+
+UNKNOWN = ''
+
+
+@dataclass
+class LanguageDetection:
+    language: str = UNKNOWN
+    confidence: float = 0.0
+    source: str = ''
+    scores: Dict[str, int] = field(default_factory=dict)
+
+    def reliable(self, min_confidence: float = 0.6) -> bool:
+        return bool(self.language) and self.confidence >= min_confidence
+
+
+def _words(text: str) -> list[str]:
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    normalized = ''.join(c for c in normalized if not unicodedata.combining(c))
+    return re.findall(r'[a-z]+', normalized)
+
+
+def detect_language(text: str, source: str = 'text', max_chars: int = 4000) -> LanguageDetection:
+    """
+    Langue majoritaire d'un texte. La confiance est la part des mots-outils
+    reconnus qui appartiennent à la langue retenue.
+    """
+    words = _words(text[:max_chars])
+    scores = {language: 0 for language in STOPWORDS}
+    for word in words:
+        for language, stopwords in STOPWORDS.items():
+            if word in stopwords:
+                scores[language] += 1
+    total = sum(scores.values())
+    if total < 5:
+        return LanguageDetection(source=source, scores=scores)
+    language = max(scores, key=scores.get)
+    return LanguageDetection(language, scores[language] / total, source, scores)
+
+
+def tesseract_lang(detection: LanguageDetection, default: str, min_confidence: float = 0.6) -> str:
+    """Jeu de langues Tesseract minimal pour une détection fiable, `default` sinon"""
+    if detection.reliable(min_confidence) and detection.language in TESSERACT_LANGS:
+        return TESSERACT_LANGS[detection.language]
+    return default
@@ -0,0 +1,55 @@
+"""
+Lecture allégée de la liste des candidatures.
+
+La carte (widgets/candidature_card.html) n'affiche qu'une dizaine de champs :
+la liste les lit avec .values() au lieu de charger des modèles complets, ce
+qui évite de transférer et de désérialiser experiences, education, summary,
+fit_scores, etc. Chaque ligne devient un CandidatureSummary en lecture seule.
+"""
+from dataclasses import dataclass, fields
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+from uuid import UUID
+
+# Colonnes lues par la liste : exactement celles de la carte
+LIST_FIELDS = (
+    'id', 'first_name', 'last_name', 'headline', 'status', 'fit_score_overall',
+    'years_experience', 'skills_primary', 'created_at', 'email', 'resume',
+)
+
+
+@dataclass(frozen=True)
+class CandidatureSummary:
+    """Candidature telle qu'affichée dans la liste"""
+    id: UUID
+    first_name: str
+    last_name: str
+    headline: str
+    status: str
+    fit_score_overall: Optional[Decimal]
+    years_experience: Decimal
+    skills_primary: list
+    created_at: datetime
+    email: str
+    resume: str
+    search_rank: Optional[float] = None
+
+    @property
+    def pk(self) -> UUID:
+        return self.id
+
+    @classmethod
+    def from_row(cls, row: dict) -> 'CandidatureSummary':
+        names = {field.name for field in fields(cls)}
+        return cls(**{name: value for name, value in row.items() if name in names})
+
+
+def list_rows(queryset):
+    """Projection .values() de la liste (search_rank conservé pour une recherche)"""
+    names = LIST_FIELDS + (('search_rank',) if 'search_rank' in queryset.query.annotations else ())
+    return queryset.values(*names)
+
+
+def summarize(rows) -> list[CandidatureSummary]:
+    return [CandidatureSummary.from_row(row) for row in rows]
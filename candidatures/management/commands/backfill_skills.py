@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from candidatures.models import Candidature
+from candidatures.skills import sync_candidature_skills
+
+
+class Command(BaseCommand):
+    help = "Remplit la table des compétences normalisées (Skill / CandidatureSkill) à partir des listes JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Candidatures synchronisées par lot")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être positif")
+
+        queryset = Candidature.objects.only('id', 'skills_primary', 'skills_secondary').order_by('id')
+        total = queryset.count()
+        done = 0
+        batch = []
+        for candidature in queryset.iterator(chunk_size=options['batch_size']):
+            batch.append(candidature)
+            if len(batch) >= options['batch_size']:
+                sync_candidature_skills(batch)
+                done += len(batch)
+                batch = []
+                self.stdout.write(f"{done}/{total} candidature(s)")
+        sync_candidature_skills(batch)
+        done += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Terminé : {done} candidature(s) synchronisée(s)"))
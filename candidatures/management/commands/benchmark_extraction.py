@@ -0,0 +1,94 @@
+import difflib
+import re
+import statistics
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from candidatures.services import EXTRACTION_BACKENDS, get_extraction_backend
+
+
+def text_similarity(reference: str, candidate: str) -> float:
+    """Similarité (0-1) entre deux textes, calculée sur les mots normalisés"""
+    ref_words = re.findall(r'\w+', reference.lower())
+    cand_words = re.findall(r'\w+', candidate.lower())
+    if not ref_words and not cand_words:
+        return 1.0
+    return difflib.SequenceMatcher(None, ref_words, cand_words, autojunk=False).ratio()
+
+
+class Command(BaseCommand):
+    help = "Compare la vitesse et la qualité des backends d'extraction PDF sur un corpus de CV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help="Dossier contenant les PDF (parcouru récursivement)")
+        parser.add_argument('--backends', nargs='+', default=None,
+                            help="Backends à comparer (défaut : tous ceux installés)")
+        parser.add_argument('--reference', default='pdfminer',
+                            help="Backend servant de référence pour la similarité")
+        parser.add_argument('--repeat', type=int, default=1, help="Nombre de passes par document")
+        parser.add_argument('--timeout', type=float, default=None, help="Timeout par document (secondes)")
+        parser.add_argument('--min-similarity', type=float, default=0.95,
+                            help="Similarité moyenne minimale pour recommander un backend")
+
+    def handle(self, *args, **options):
+        files = sorted(Path(options['corpus']).rglob('*.pdf'))
+        if not files:
+            raise CommandError(f"Aucun PDF trouvé dans {options['corpus']}")
+
+        names = options['backends'] or list(EXTRACTION_BACKENDS)
+        reference_name = options['reference']
+        if reference_name not in names:
+            names.insert(0, reference_name)
+        backends = {name: get_extraction_backend(name) for name in names}
+
+        results = {name: {'times': [], 'similarities': [], 'errors': 0} for name in names}
+        for path in files:
+            content = path.read_bytes()
+            texts = {}
+            for name, backend in backends.items():
+                durations = []
+                try:
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        texts[name] = backend.extract(content, timeout=options['timeout'])
+                        durations.append(time.perf_counter() - started)
+                except Exception as e:
+                    results[name]['errors'] += 1
+                    self.stderr.write(f"{path.name} [{name}] : {e}")
+                    continue
+                results[name]['times'].append(min(durations))
+
+            reference_text = texts.get(reference_name)
+            if reference_text is None:
+                continue
+            for name, text in texts.items():
+                results[name]['similarities'].append(text_similarity(reference_text, text))
+
+        self.stdout.write(f"{len(files)} document(s), référence : {reference_name}\n")
+        self.stdout.write(f"{'backend':<16}{'moy. (ms)':>12}{'p95 (ms)':>12}{'total (s)':>12}{'similarité':>12}{'erreurs':>10}")
+        candidates = []
+        for name in names:
+            data = results[name]
+            times = data['times']
+            if not times:
+                self.stdout.write(f"{name:<16}{'-':>12}{'-':>12}{'-':>12}{'-':>12}{data['errors']:>10}")
+                continue
+            ordered = sorted(times)
+            p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+            similarity = statistics.mean(data['similarities']) if data['similarities'] else 0.0
+            self.stdout.write(
+                f"{name:<16}{statistics.mean(times) * 1000:>12.1f}{p95 * 1000:>12.1f}"
+                f"{sum(times):>12.2f}{similarity:>12.3f}{data['errors']:>10}"
+            )
+            if similarity >= options['min_similarity'] and not data['errors']:
+                candidates.append((sum(times), name))
+
+        if candidates:
+            best = min(candidates)[1]
+            self.stdout.write(self.style.SUCCESS(
+                f"\nBackend recommandé : {best} (CV_EXTRACTION_BACKEND={best})"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING("\nAucun backend n'atteint la similarité minimale"))
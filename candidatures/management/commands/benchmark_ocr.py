@@ -0,0 +1,80 @@
+import statistics
+import time
+from dataclasses import replace
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from candidatures.ocr import OCR_AVAILABLE, PYTESSERACT_AVAILABLE, TESSEROCR_AVAILABLE, OCROptions, ocr_pdf_pages
+
+from .benchmark_extraction import text_similarity
+
+
+class Command(BaseCommand):
+    help = "Compare l'OCR historique et le pipeline prétraitement + DPI adaptatif sur un corpus de CV scannés"
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help="Dossier contenant les PDF scannés (parcouru récursivement)")
+        parser.add_argument('--ground-truth', default=None,
+                            help="Dossier des transcriptions de référence <nom>.txt (défaut : à côté des PDF)")
+
+    def handle(self, *args, **options):
+        if not OCR_AVAILABLE:
+            raise CommandError("pdf2image et pytesseract sont requis")
+        files = sorted(Path(options['corpus']).rglob('*.pdf'))
+        if not files:
+            raise CommandError(f"Aucun PDF trouvé dans {options['corpus']}")
+
+        configurations = {
+            'historique': replace(OCROptions.legacy(), engine='pytesseract' if PYTESSERACT_AVAILABLE else 'auto'),
+            'pipeline': OCROptions.from_settings(),
+        }
+        if TESSEROCR_AVAILABLE and PYTESSERACT_AVAILABLE:
+            # Même pipeline, un moteur par configuration, pour mesurer le coût des sous-processus
+            configurations['pipeline'] = replace(configurations['pipeline'], engine='tesserocr')
+            configurations['pipeline (cli)'] = replace(configurations['pipeline'], engine='pytesseract')
+        results = {name: {'times': [], 'confidences': [], 'similarities': [], 'retries': 0, 'errors': 0}
+                   for name in configurations}
+
+        for path in files:
+            truth_dir = Path(options['ground_truth']) if options['ground_truth'] else path.parent
+            truth_path = truth_dir / f"{path.stem}.txt"
+            truth = truth_path.read_text(encoding='utf-8') if truth_path.exists() else None
+            content = path.read_bytes()
+
+            for name, ocr_options in configurations.items():
+                data = results[name]
+                started = time.perf_counter()
+                try:
+                    pages = ocr_pdf_pages(content, ocr_options)
+                except Exception as e:
+                    data['errors'] += 1
+                    self.stderr.write(f"{path.name} [{name}] : {e}")
+                    continue
+                data['times'].append(time.perf_counter() - started)
+                data['confidences'].extend(page['confidence'] for page in pages)
+                data['retries'] += sum(1 for page in pages if page['dpi'] != ocr_options.base_dpi)
+                if truth is not None:
+                    text = '\n\n'.join(page['text'] for page in pages)
+                    data['similarities'].append(text_similarity(truth, text))
+
+        self.stdout.write(f"{len(files)} document(s)\n")
+        self.stdout.write(
+            f"{'configuration':<16}{'moy. (s)':>10}{'total (s)':>11}{'confiance':>11}"
+            f"{'exactitude':>12}{'nouv. essais':>14}{'erreurs':>9}"
+        )
+        for name, data in results.items():
+            times = data['times']
+            if not times:
+                self.stdout.write(f"{name:<16}{'-':>10}{'-':>11}{'-':>11}{'-':>12}{'-':>14}{data['errors']:>9}")
+                continue
+            confidence = statistics.mean(data['confidences']) if data['confidences'] else 0.0
+            accuracy = f"{statistics.mean(data['similarities']):.3f}" if data['similarities'] else '-'
+            self.stdout.write(
+                f"{name:<16}{statistics.mean(times):>10.2f}{sum(times):>11.2f}{confidence:>11.1f}"
+                f"{accuracy:>12}{data['retries']:>14}{data['errors']:>9}"
+            )
+        if not any(data['similarities'] for data in results.values()):
+            self.stdout.write(self.style.WARNING(
+                "\nAucune transcription de référence : l'exactitude n'est pas mesurée (confiance Tesseract seule)"
+            ))
@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from candidatures.models import Candidature
+from candidatures.taxonomy import SKILL_ALIASES, SkillCanonicalizer
+
+# Variantes typiques renvoyées par Claude, utilisées si la base est vide
+SAMPLE_SKILLS = [
+    ['JS', 'Javascript', 'React.js', 'Node.js', 'HTML5', 'CSS3', 'Git'],
+    ['Python 3', 'Django', 'DRF', 'Postgres', 'Docker', 'k8s', 'AWS'],
+    ['javascript (ES6)', 'ReactJS', 'TypeScript', 'Next.js', 'Tailwind', 'CI/CD'],
+    ['Java', 'Spring Boot', 'MySQL', 'Kubernetes', 'Méthodes agiles', 'Scrum'],
+    ['C#', '.NET Core', 'Azure', 'SQL', 'Power BI', 'Excel', 'Photoshop'],
+    ['Machine learning', 'Pyhton', 'Pandas', 'Kuberntes', 'Gestion de projets'],
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Mesure le coût de la canonicalisation des compétences par CV (en microsecondes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000, help="Nombre de CV lus en base")
+        parser.add_argument('--repeat', type=int, default=3, help="Passes sur le corpus (cache chaud)")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat doit être positif")
+
+        corpus = [
+            (primary or []) + (secondary or [])
+            for primary, secondary in Candidature.objects.values_list(
+                'skills_primary', 'skills_secondary'
+            )[:options['limit']]
+        ]
+        corpus = [skills for skills in corpus if skills] or SAMPLE_SKILLS
+
+        started = time.perf_counter()
+        canonicalizer = SkillCanonicalizer(SKILL_ALIASES)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        def measure(engine):
+            durations = []
+            for skills in corpus:
+                started = time.perf_counter()
+                engine.canonical_list(skills)
+                durations.append((time.perf_counter() - started) * 1_000_000)
+            return durations
+
+        cold = measure(canonicalizer)
+        warm = []
+        for _ in range(options['repeat']):
+            warm.extend(measure(canonicalizer))
+
+        labels = sum(len(skills) for skills in corpus)
+        distinct = len({label for skills in corpus for label in skills})
+        self.stdout.write(f"{len(corpus)} CV, {labels} compétences ({distinct} distinctes), "
+                          f"moteur construit en {build_ms:.1f} ms")
+        self.stdout.write(f"{'cache':<8}{'moy. (µs/CV)':>14}{'p50':>10}{'p95':>10}{'max':>10}")
+        for name, durations in (('froid', cold), ('chaud', warm)):
+            self.stdout.write(
+                f"{name:<8}{statistics.mean(durations):>14.1f}{percentile(durations, 0.5):>10.1f}"
+                f"{percentile(durations, 0.95):>10.1f}{max(durations):>10.1f}"
+            )
+        info = canonicalizer.canonical.cache_info()
+        self.stdout.write(f"Cache : {info.hits} succès, {info.misses} calculs")
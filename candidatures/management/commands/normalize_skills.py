@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from candidatures.models import Candidature, Skill
+from candidatures.search import build_search_document
+from candidatures.skills import sync_candidature_skills
+from candidatures.taxonomy import get_canonicalizer
+
+
+class Command(BaseCommand):
+    help = "Remplace les compétences des candidatures existantes par leur nom canonique"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Candidatures lues puis écrites par lot")
+        parser.add_argument('--dry-run', action='store_true', help="Affiche les changements sans les enregistrer")
+
+    def write_batch(self, batch):
+        Candidature.objects.bulk_update(batch, ['skills_primary', 'skills_secondary', 'search_document'])
+        sync_candidature_skills(batch)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être positif")
+
+        canonicalizer = get_canonicalizer()
+        scanned = changed = 0
+        batch = []
+        for candidature in Candidature.objects.order_by('id').iterator(chunk_size=options['batch_size']):
+            scanned += 1
+            primary = canonicalizer.canonical_list(candidature.skills_primary)
+            secondary = canonicalizer.canonical_list(candidature.skills_secondary, exclude=primary)
+            if primary == candidature.skills_primary and secondary == candidature.skills_secondary:
+                continue
+            changed += 1
+            if options['dry_run']:
+                self.stdout.write(f"{candidature.id} : {candidature.skills_primary} -> {primary}")
+                continue
+            candidature.skills_primary, candidature.skills_secondary = primary, secondary
+            # bulk_update ne passe pas par save() : document de recherche recalculé ici
+            candidature.search_document = build_search_document(candidature)
+            batch.append(candidature)
+            if len(batch) >= options['batch_size']:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+
+        # Variantes fusionnées : les compétences qui n'ont plus de candidature disparaissent
+        orphans = 0
+        if not options['dry_run']:
+            orphans, _ = Skill.objects.annotate(links=Count('candidature_links')).filter(links=0).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"{scanned} candidature(s) lue(s), {changed} normalisée(s), {orphans} compétence(s) orpheline(s) supprimée(s)"
+        ))
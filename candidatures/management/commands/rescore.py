@@ -0,0 +1,161 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+from candidatures.budget import budget, record_usage
+from candidatures.models import AnalysisUsage, Candidature, PriorityChoices
+from candidatures.scheduling import scheduler
+from candidatures.search import build_search_document
+from candidatures.services import (
+    CVAnalysisService, api_key_configured, create_candidature_from_analysis, current_model_versions,
+)
+from candidatures.skills import sync_candidature_skills
+from dashboard.cache import bump_generation
+from dashboard.rollup import rebuild_daily_stats
+
+# Champs réécrits par un re-scoring (le statut, la priorité et le CV restent inchangés)
+RESCORED_FIELDS = [
+    'first_name', 'last_name', 'headline', 'summary', 'years_experience', 'experiences',
+    'skills_primary', 'skills_secondary', 'languages', 'education_highest', 'education',
+    'interests', 'locations_preferred', 'salary_expectation_min', 'salary_expectation_max',
+    'availability_date', 'work_authorization', 'fit_score_overall', 'fit_scores',
+    'model_version', 'analyzed_at', 'detected_language', 'language_confidence', 'search_document',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Ré-analyse les candidatures dont la version de modèle ou de prompt est périmée, "
+        "à partir du texte des pages en cache (sans ré-extraction)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Nombre maximal de candidatures à traiter")
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help="Candidatures lues puis écrites (bulk_update) par lot")
+        parser.add_argument('--concurrency', type=int, default=2, help="Analyses simultanées dans un lot")
+        parser.add_argument('--tenant', default=None, help="Limiter à un client (entreprise)")
+        parser.add_argument('--throttle', type=float, default=1.0, help="Pause entre deux lots (secondes)")
+        parser.add_argument('--max-live-per-minute', type=int, default=5,
+                            help="Au-delà de ce nombre d'analyses en ligne par minute, le re-scoring attend")
+        parser.add_argument('--dry-run', action='store_true', help="Compte les candidatures à re-scorer sans les analyser")
+
+    def stale_queryset(self, tenant: str = None):
+        """Candidatures périmées ayant des pages en cache, par priorité puis ancienneté"""
+        queryset = (
+            Candidature.objects.exclude(model_version__in=current_model_versions())
+            .exclude(page_fingerprints=[])
+            .annotate(priority_rank=Case(
+                When(priority=PriorityChoices.HIGH, then=Value(0)),
+                When(priority=PriorityChoices.NORMAL, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            ))
+            .order_by('priority_rank', 'created_at', 'id')
+        )
+        return queryset if tenant is None else queryset.filter(tenant=tenant)
+
+    def live_load(self) -> int:
+        """Analyses en ligne (hors masse et re-scoring) de la dernière minute, tous workers confondus"""
+        return AnalysisUsage.objects.filter(
+            created_at__gte=timezone.now() - timedelta(minutes=1)
+        ).exclude(priority=PriorityChoices.LOW).count()
+
+    def wait_for_capacity(self, options):
+        """Cède la place au trafic en ligne et au budget journalier"""
+        while True:
+            if self.live_load() >= options['max_live_per_minute']:
+                reason = "trafic en ligne"
+            elif not budget.allows(options['tenant'] or '', urgent=False):
+                reason = "budget journalier"
+            else:
+                return
+            self.stdout.write(f"Pause ({reason})...")
+            time.sleep(max(options['throttle'], 1.0) * 10)
+
+    def rescore(self, candidature):
+        """Analyse une candidature ; retourne les champs mis à jour ou None"""
+        close_old_connections()
+        try:
+            with scheduler.permit(PriorityChoices.LOW.value, candidature.tenant):
+                service = CVAnalysisService()
+                result = service.analyze_cached_text(candidature)
+                record_usage(service, candidature.tenant, PriorityChoices.LOW.value, candidature)
+            if result is None:
+                return None
+            analysis, model_version = result
+            data = create_candidature_from_analysis(analysis, model_version, candidature.cv_url)
+            data.update(service.extraction_metadata())
+            return data
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--batch-size et --concurrency doivent être positifs")
+
+        queryset = self.stale_queryset(options['tenant'])
+        total = queryset.count()
+        self.stdout.write(f"{total} candidature(s) à re-scorer (versions actuelles : "
+                          f"{', '.join(sorted(current_model_versions()))})")
+        if options['dry_run'] or not total:
+            return
+        if not api_key_configured():
+            raise CommandError("ANTHROPIC_API_KEY non configurée : le re-scoring écrirait des analyses factices")
+
+        limit = options['limit'] or total
+        done = failed = skipped = 0
+        # Échecs et pages absentes du cache : exclus pour ne pas être repris en boucle
+        excluded = set()
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                while done + failed + skipped < limit:
+                    self.wait_for_capacity(options)
+                    size = min(options['batch_size'], limit - done - failed - skipped)
+                    batch = list(queryset.exclude(id__in=excluded)[:size])
+                    if not batch:
+                        break
+
+                    updated = []
+                    for candidature, future in [(c, executor.submit(self.rescore, c)) for c in batch]:
+                        try:
+                            data = future.result()
+                        except Exception as e:
+                            failed += 1
+                            excluded.add(candidature.id)
+                            self.stderr.write(f"{candidature.id} : {e}")
+                            continue
+                        if data is None:
+                            skipped += 1
+                            excluded.add(candidature.id)
+                            continue
+                        for name in RESCORED_FIELDS:
+                            if name in data:
+                                setattr(candidature, name, data[name])
+                        # bulk_update ne passe pas par save() : document de recherche recalculé ici
+                        candidature.search_document = build_search_document(candidature)
+                        updated.append(candidature)
+
+                    # Un lot est écrit en une fois : une interruption ne perd que le lot en cours
+                    Candidature.objects.bulk_update(updated, RESCORED_FIELDS)
+                    sync_candidature_skills(updated)
+                    # bulk_update n'émet pas post_save : agrégat journalier et cache du tableau de bord mis à jour ici
+                    rebuild_daily_stats({timezone.localdate(c.created_at) for c in updated})
+                    bump_generation()
+                    done += len(updated)
+                    rate = done / (time.monotonic() - started)
+                    self.stdout.write(f"{done}/{limit} re-scorée(s), {skipped} sans cache, "
+                                      f"{failed} échec(s) - {rate:.2f}/s")
+                    time.sleep(options['throttle'])
+        except KeyboardInterrupt:
+            self.stdout.write("Interrompu : relancer la commande reprend les candidatures restantes")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé : {done} re-scorée(s), {skipped} sans cache, {failed} échec(s)"
+        ))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidatures', '0003_candidature_cv_url_candidature_education_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('text', models.TextField(blank=True)),
+                ('backend', models.CharField(help_text="Backend d'extraction utilisé", max_length=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Page extraite',
+                'verbose_name_plural': 'Pages extraites',
+            },
+        ),
+        migrations.AddField(
+            model_name='candidature',
+            name='page_fingerprints',
+            field=models.JSONField(blank=True, default=list, help_text="Empreinte de chaque page du PDF, dans l'ordre (voir ExtractedPage)"),
+        ),
+        migrations.AddField(
+            model_name='candidature',
+            name='section_fingerprints',
+            field=models.JSONField(blank=True, default=dict, help_text='Empreinte de chaque section logique du texte extrait'),
+        ),
+    ]
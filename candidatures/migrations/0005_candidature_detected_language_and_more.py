@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidatures', '0004_extractedpage_candidature_page_fingerprints_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidature',
+            name='detected_language',
+            field=models.CharField(blank=True, default='', help_text='Code langue détecté sur la première page (fr, en, es), vide si indéterminé', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='candidature',
+            name='language_confidence',
+            field=models.FloatField(blank=True, help_text='Confiance de la détection de langue (0-1)', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidatures', '0005_candidature_detected_language_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidature',
+            name='tenant',
+            field=models.CharField(blank=True, db_index=True, default='', help_text="Client à l'origine de l'analyse (entreprise du recruteur), vide sinon", max_length=255),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidatures', '0006_candidature_tenant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant', models.CharField(blank=True, default='', max_length=255)),
+                ('priority', models.CharField(choices=[('low', 'Basse'), ('normal', 'Normale'), ('high', 'Haute')], default='normal', max_length=10)),
+                ('model', models.CharField(max_length=100)),
+                ('route', models.CharField(blank=True, max_length=20)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('input_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('cache_creation_tokens', models.PositiveIntegerField(default=0)),
+                ('cache_read_tokens', models.PositiveIntegerField(default=0)),
+                ('cost', models.DecimalField(decimal_places=6, default=0, help_text='Coût calculé en dollars (tarifs CV_LLM_PRICING)', max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('candidature', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usages', to='candidatures.candidature')),
+            ],
+            options={
+                'verbose_name': "Consommation d'analyse",
+                'verbose_name_plural': "Consommations d'analyse",
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='candidature_created_9e6be2_idx'), models.Index(fields=['tenant', 'created_at'], name='candidature_tenant_43425e_idx')],
+            },
+        ),
+    ]
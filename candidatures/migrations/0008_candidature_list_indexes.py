@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidatures', '0007_analysisusage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='candidature',
+            index=models.Index(fields=['-created_at'], name='cand_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidature',
+            index=models.Index(fields=['status', '-created_at'], name='cand_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidature',
+            index=models.Index(fields=['email', '-created_at'], name='cand_email_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidature',
+            index=models.Index(fields=['fit_score_overall'], name='cand_fit_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidature',
+            index=models.Index(fields=['years_experience'], name='cand_years_exp_idx'),
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:49
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Copie figée de candidatures.search au moment de la migration : le module peut évoluer
+FTS_TABLE = 'candidatures_search'
+PG_SEARCH_VECTOR = "(to_tsvector('french', search_document) || to_tsvector('english', search_document))"
+PG_SEARCH_INDEX = 'cand_search_gin_idx'
+
+
+def normalize_search_text(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+def build_search_document(candidature) -> str:
+    parts = [
+        candidature.first_name, candidature.last_name, candidature.email,
+        candidature.headline, candidature.summary,
+        ' '.join(candidature.skills_primary or []), ' '.join(candidature.skills_secondary or []),
+    ]
+    for experience in candidature.experiences or []:
+        if isinstance(experience, dict):
+            parts.extend([experience.get('company') or '', experience.get('position') or ''])
+    return normalize_search_text(' '.join(str(part) for part in parts if part))
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        candidature_id UNINDEXED, document, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON candidatures_candidature BEGIN
+        INSERT INTO {FTS_TABLE}(candidature_id, document) VALUES (NEW.id, NEW.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF search_document ON candidatures_candidature BEGIN
+        DELETE FROM {FTS_TABLE} WHERE candidature_id = OLD.id;
+        INSERT INTO {FTS_TABLE}(candidature_id, document) VALUES (NEW.id, NEW.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON candidatures_candidature BEGIN
+        DELETE FROM {FTS_TABLE} WHERE candidature_id = OLD.id;
+    END""",
+    f"INSERT INTO {FTS_TABLE}(candidature_id, document) SELECT id, search_document FROM candidatures_candidature",
+]
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+POSTGRESQL_FORWARD = [
+    f"CREATE INDEX IF NOT EXISTS {PG_SEARCH_INDEX} ON candidatures_candidature USING GIN ({PG_SEARCH_VECTOR})",
+]
+POSTGRESQL_BACKWARD = [f"DROP INDEX IF EXISTS {PG_SEARCH_INDEX}"]
+
+
+def fill_search_documents(apps, schema_editor):
+    Candidature = apps.get_model('candidatures', 'Candidature')
+    batch = []
+    for candidature in Candidature.objects.iterator(chunk_size=500):
+        candidature.search_document = build_search_document(candidature)
+        batch.append(candidature)
+        if len(batch) >= 500:
+            Candidature.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    Candidature.objects.bulk_update(batch, ['search_document'])
+
+
+def _sqlite_has_fts5(connection) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any('FTS5' in row[0] for row in cursor.fetchall())
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and _sqlite_has_fts5(connection):
+        statements = SQLITE_FORWARD
+    elif connection.vendor == 'postgresql':
+        statements = POSTGRESQL_FORWARD
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRESQL_BACKWARD}
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidatures', '0008_candidature_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidature',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, help_text="Noms, titre, résumé, compétences et expériences normalisés, recalculé à l'enregistrement"),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidatures', '0009_candidature_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Skill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Nom canonique (minuscules, sans accents)', max_length=100, unique=True)),
+                ('label', models.CharField(help_text='Libellé affiché', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Compétence',
+                'verbose_name_plural': 'Compétences',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CandidatureSkill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.PositiveSmallIntegerField(choices=[(1, 'Secondaire'), (2, 'Principale')], default=2)),
+                ('candidature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skill_links', to='candidatures.candidature')),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidature_links', to='candidatures.skill')),
+            ],
+            options={
+                'verbose_name': 'Compétence de candidature',
+                'verbose_name_plural': 'Compétences de candidature',
+                'indexes': [models.Index(fields=['skill', 'candidature'], name='cand_skill_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('candidature', 'skill'), name='unique_candidature_skill')],
+            },
+        ),
+    ]
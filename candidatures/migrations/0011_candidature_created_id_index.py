@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidatures', '0010_skill_candidatureskill'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='candidature',
+            name='cand_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='candidature',
+            index=models.Index(fields=['-created_at', '-id'], name='cand_created_idx'),
+        ),
+    ]
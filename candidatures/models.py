@@ -1,6 +1,11 @@
 from django.db import models
 import uuid
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .search import build_search_document
+
+
+# Champs dont dérivent les liens CandidatureSkill (skills.py)
+SKILL_FIELDS = ('skills_primary', 'skills_secondary')
 
 
 class WorkAuthorizationChoices(models.TextChoices):
@@ -120,6 +125,13 @@ class Candidature(models.Model):
         choices=PriorityChoices.choices,
         default=PriorityChoices.NORMAL
     )
+    tenant = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        db_index=True,
+        help_text="Client à l'origine de l'analyse (entreprise du recruteur), vide sinon"
+    )
     
     # Évaluation & scoring
     fit_score_overall = models.DecimalField(
@@ -139,6 +151,39 @@ class Candidature(models.Model):
         help_text="Version du modèle IA utilisé pour scorer"
     )
     
+    # Empreintes du document analysé (ré-analyse incrémentale)
+    page_fingerprints = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Empreinte de chaque page du PDF, dans l'ordre (voir ExtractedPage)"
+    )
+    section_fingerprints = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Empreinte de chaque section logique du texte extrait"
+    )
+    
+    # Langue détectée du CV (choix OCR et prompt)
+    detected_language = models.CharField(
+        max_length=8,
+        blank=True,
+        default='',
+        help_text="Code langue détecté sur la première page (fr, en, es), vide si indéterminé"
+    )
+    language_confidence = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Confiance de la détection de langue (0-1)"
+    )
+    
+    # Recherche plein texte (voir search.py)
+    search_document = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        help_text="Noms, titre, résumé, compétences et expériences normalisés, recalculé à l'enregistrement"
+    )
+    
     # Métadonnées
     analyzed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -146,8 +191,154 @@ class Candidature(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        # Chemins d'accès de CandidatureListView et du dashboard (filtre puis tri par date décroissante)
+        indexes = [
+            # id départage les dates égales : ordre exact de la pagination par curseur (pagination.py)
+            models.Index(fields=['-created_at', '-id'], name='cand_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='cand_status_created_idx'),
+            models.Index(fields=['email', '-created_at'], name='cand_email_created_idx'),
+            models.Index(fields=['fit_score_overall'], name='cand_fit_score_idx'),
+            models.Index(fields=['years_experience'], name='cand_years_exp_idx'),
+        ]
         verbose_name = "Candidature"
         verbose_name_plural = "Candidatures"
     
     def __str__(self):
         return f"{self.headline} - {self.status}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Compétences lues en base : save() ne resynchronise les liens que si elles ont changé
+        if SKILL_FIELDS[0] in field_names and SKILL_FIELDS[1] in field_names:
+            instance._loaded_skills = instance._skills_state()
+        return instance
+
+    def _skills_state(self) -> tuple:
+        return tuple(list(getattr(self, name) or []) for name in SKILL_FIELDS)
+
+    def _skills_changed(self) -> bool:
+        loaded = getattr(self, '_loaded_skills', None)
+        return loaded is None or loaded != self._skills_state()
+
+    def save(self, *args, **kwargs):
+        self.search_document = build_search_document(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'search_document'}
+        super().save(*args, **kwargs)
+        if (update_fields is None or set(SKILL_FIELDS) & set(update_fields)) and self._skills_changed():
+            from .skills import sync_candidature_skills
+            sync_candidature_skills([self])
+            self._loaded_skills = self._skills_state()
+
+
+class ExtractedPage(models.Model):
+    """
+    Texte extrait d'une page de PDF, adressé par l'empreinte de la page.
+    Une page inchangée lors d'un nouvel upload n'est pas ré-extraite.
+    """
+    fingerprint = models.CharField(max_length=64, unique=True)
+    text = models.TextField(blank=True)
+    backend = models.CharField(max_length=30, help_text="Backend d'extraction utilisé")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Page extraite"
+        verbose_name_plural = "Pages extraites"
+    
+    def __str__(self):
+        return f"{self.fingerprint[:12]} ({self.backend})"
+
+
+class Skill(models.Model):
+    """Compétence canonique, partagée par toutes les candidatures"""
+    name = models.CharField(max_length=100, unique=True, help_text="Nom canonique (minuscules, sans accents)")
+    label = models.CharField(max_length=100, help_text="Libellé affiché")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Compétence"
+        verbose_name_plural = "Compétences"
+    
+    def __str__(self):
+        return self.label
+
+
+class SkillWeightChoices(models.IntegerChoices):
+    SECONDARY = 1, 'Secondaire'
+    PRIMARY = 2, 'Principale'
+
+
+class CandidatureSkill(models.Model):
+    """
+    Compétence d'une candidature (table normalisée des listes skills_primary
+    et skills_secondary, synchronisée à l'enregistrement) : permet des filtres
+    indexés par compétence.
+    """
+    candidature = models.ForeignKey(Candidature, on_delete=models.CASCADE, related_name='skill_links')
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='candidature_links')
+    weight = models.PositiveSmallIntegerField(
+        choices=SkillWeightChoices.choices,
+        default=SkillWeightChoices.PRIMARY
+    )
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['candidature', 'skill'], name='unique_candidature_skill'),
+        ]
+        indexes = [
+            models.Index(fields=['skill', 'candidature'], name='cand_skill_lookup_idx'),
+        ]
+        verbose_name = "Compétence de candidature"
+        verbose_name_plural = "Compétences de candidature"
+    
+    def __str__(self):
+        return f"{self.skill} ({self.get_weight_display()})"
+
+
+class AnalysisUsage(models.Model):
+    """
+    Consommation d'une analyse auprès de Claude (tokens et coût calculé).
+    Une ligne par modèle appelé ; sert au budget journalier (voir budget.py).
+    """
+    candidature = models.ForeignKey(
+        Candidature,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='usages'
+    )
+    tenant = models.CharField(max_length=255, blank=True, default='')
+    priority = models.CharField(
+        max_length=10,
+        choices=PriorityChoices.choices,
+        default=PriorityChoices.NORMAL
+    )
+    model = models.CharField(max_length=100)
+    route = models.CharField(max_length=20, blank=True)
+    calls = models.PositiveIntegerField(default=0)
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    cache_creation_tokens = models.PositiveIntegerField(default=0)
+    cache_read_tokens = models.PositiveIntegerField(default=0)
+    cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=6,
+        default=0,
+        help_text="Coût calculé en dollars (tarifs CV_LLM_PRICING)"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['tenant', 'created_at']),
+        ]
+        verbose_name = "Consommation d'analyse"
+        verbose_name_plural = "Consommations d'analyse"
+    
+    def __str__(self):
+        return f"{self.model} - {self.input_tokens}/{self.output_tokens} tokens ({self.cost} $)"
@@ -0,0 +1,368 @@
+"""
+OCR des CV scannés : rastérisation (poppler), prétraitement des images et
+passage à Tesseract, avec une résolution adaptative par page.
+"""
+import os
+import threading
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from .language import detect_language, tesseract_lang
+
+try:
+    from pdf2image import convert_from_bytes
+    PDF2IMAGE_AVAILABLE = True
+except ImportError:
+    PDF2IMAGE_AVAILABLE = False
+
+try:
+    import pytesseract
+    import platform
+
+    # Configuration du chemin Tesseract pour Windows
+    if platform.system() == "Windows":
+        # Chemins courants d'installation de Tesseract sur Windows
+        possible_paths = [
+            r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+            r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+            r"C:\laragon\bin\tesseract\tesseract.exe",
+            r"C:\tools\tesseract\tesseract.exe"
+        ]
+
+        for path in possible_paths:
+            if os.path.exists(path):
+                pytesseract.pytesseract.tesseract_cmd = path
+                break
+
+    PYTESSERACT_AVAILABLE = True
+except ImportError:
+    PYTESSERACT_AVAILABLE = False
+
+# Moteur Tesseract en mémoire (libtesseract), sans sous-processus par page
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+OCR_AVAILABLE = PDF2IMAGE_AVAILABLE and (PYTESSERACT_AVAILABLE or TESSEROCR_AVAILABLE)
+
+
+@dataclass
+class OCROptions:
+    """Paramètres de l'OCR, passés explicitement au processus de la sandbox"""
+
+    lang: str = 'fra+eng'
+    psm: int = 6
+    # 'auto' : tesserocr si installé, sinon pytesseract
+    engine: str = 'auto'
+    base_dpi: int = 150
+    retry_dpi: int = 300
+    # Une page dont la confiance moyenne est inférieure est refaite à retry_dpi
+    min_confidence: float = 70.0
+    grayscale: bool = True
+    preprocess: bool = True
+    adaptive_dpi: bool = True
+    max_pixels: int = 2500 * 3500
+    deskew_max_angle: float = 5.0
+    # Sonde de langue sur la première page (basse résolution) pour réduire `lang`
+    # au seul modèle nécessaire quand plusieurs langues sont configurées
+    detect_language: bool = True
+    probe_dpi: int = 75
+    probe_lang: str = 'eng'
+    language_min_confidence: float = 0.6
+
+    @classmethod
+    def from_settings(cls) -> 'OCROptions':
+        from django.conf import settings
+        return cls(**getattr(settings, 'CV_OCR_OPTIONS', {}))
+
+    @classmethod
+    def legacy(cls) -> 'OCROptions':
+        """Comportement historique : 150 DPI couleur, sans prétraitement ni nouvel essai"""
+        return cls(grayscale=False, preprocess=False, adaptive_dpi=False, detect_language=False)
+
+
+def otsu_threshold(image: Image.Image) -> int:
+    """Seuil de binarisation d'Otsu calculé sur l'histogramme d'une image en niveaux de gris"""
+    histogram = image.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_background = weight_background = 0
+    best_threshold, best_variance = 127, 0.0
+    for threshold, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += threshold * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = threshold, variance
+    return best_threshold
+
+
+def binarize(image: Image.Image) -> Image.Image:
+    threshold = otsu_threshold(image)
+    return image.point(lambda value: 255 if value > threshold else 0)
+
+
+def estimate_skew(image: Image.Image, max_angle: float = 5.0, step: float = 0.5) -> float:
+    """
+    Angle d'inclinaison du texte, par profil de projection : l'angle qui
+    maximise la variance des moyennes de lignes aligne les lignes de texte.
+    Calculé sur une vignette pour rester de l'ordre de quelques millisecondes.
+    """
+    thumbnail = image.copy()
+    thumbnail.thumbnail((600, 600))
+    thumbnail = ImageOps.invert(binarize(thumbnail))
+    best_angle, best_score = 0.0, -1.0
+    steps = int(max_angle / step)
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        rotated = thumbnail.rotate(angle, resample=Image.NEAREST, fillcolor=0)
+        # Moyenne de chaque ligne de pixels en une seule opération C
+        profile = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+        mean = sum(profile) / len(profile)
+        score = sum((value - mean) ** 2 for value in profile)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def crop_margins(image: Image.Image, padding: int = 10) -> Image.Image:
+    """Supprime les marges blanches (les pixels quasi blancs sont ignorés)"""
+    mask = ImageOps.invert(image).point(lambda value: 255 if value > 40 else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = bbox
+    return image.crop((
+        max(left - padding, 0), max(top - padding, 0),
+        min(right + padding, image.width), min(bottom + padding, image.height),
+    ))
+
+
+def preprocess_page(image: Image.Image, options: OCROptions) -> Image.Image:
+    """Niveaux de gris, réduction des pages trop grandes, redressement, recadrage et binarisation"""
+    image = image.convert('L')
+    pixels = image.width * image.height
+    if pixels > options.max_pixels:
+        ratio = (options.max_pixels / pixels) ** 0.5
+        image = image.resize((int(image.width * ratio), int(image.height * ratio)), Image.LANCZOS)
+    if options.deskew_max_angle:
+        angle = estimate_skew(image, options.deskew_max_angle)
+        if angle:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    image = crop_margins(image)
+    return binarize(image)
+
+
+class OCREngine:
+    """Reconnaissance d'une image de page : retourne le texte et la confiance moyenne (0-100)"""
+
+    name = 'base'
+
+    def check(self):
+        """Lève une ValueError si le moteur n'est pas utilisable"""
+
+    def recognize(self, image: Image.Image, lang: str, psm: int) -> tuple[str, float]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PytesseractEngine(OCREngine):
+    """Binaire tesseract lancé à chaque page (modèles rechargés, PNG temporaire)"""
+
+    name = 'pytesseract'
+
+    def check(self):
+        try:
+            pytesseract.get_tesseract_version()
+        except Exception as e:
+            raise ValueError(f"Tesseract non trouvé: {str(e)}. Téléchargez et installez Tesseract depuis https://github.com/UB-Mannheim/tesseract/wiki")
+
+    def recognize(self, image, lang, psm):
+        data = pytesseract.image_to_data(
+            image, lang=lang, config=f'--psm {psm}', output_type=pytesseract.Output.DICT
+        )
+        lines: dict = {}
+        confidences = []
+        for i, word in enumerate(data['text']):
+            confidence = float(data['conf'][i])
+            if confidence < 0 or not word.strip():
+                continue
+            confidences.append(confidence)
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append(word)
+        text = '\n'.join(' '.join(words) for words in lines.values())
+        mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return text, mean_confidence
+
+
+class TesserocrEngine(OCREngine):
+    """
+    libtesseract chargée dans le processus : une API par jeu de langues,
+    initialisée une seule fois, qui reçoit directement le buffer de pixels.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self):
+        self._apis = {}
+        self._lock = threading.Lock()
+
+    def _api(self, lang: str, psm: int):
+        key = (lang, psm)
+        if key not in self._apis:
+            try:
+                self._apis[key] = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+            except RuntimeError as e:
+                raise ValueError(f"Initialisation de Tesseract impossible ({lang}): {e}")
+        return self._apis[key]
+
+    def recognize(self, image, lang, psm):
+        if image.mode not in ('L', 'RGB'):
+            image = image.convert('L')
+        bytes_per_pixel = 1 if image.mode == 'L' else 3
+        with self._lock:
+            api = self._api(lang, psm)
+            api.SetImageBytes(image.tobytes(), image.width, image.height,
+                              bytes_per_pixel, image.width * bytes_per_pixel)
+            text = api.GetUTF8Text()
+            confidence = float(api.MeanTextConf())
+        return text, confidence
+
+    def close(self):
+        with self._lock:
+            for api in self._apis.values():
+                api.End()
+            self._apis.clear()
+
+
+OCR_ENGINES = {
+    'pytesseract': PytesseractEngine,
+    'tesserocr': TesserocrEngine,
+}
+
+# Un moteur par nom et par processus : les modèles de langue restent chargés
+# entre les pages et entre les CV traités par le même processus (enfant
+# réutilisé de la sandbox, voir CV_SANDBOX_POOLS, ou worker hors sandbox).
+_engines: dict = {}
+_engines_lock = threading.Lock()
+
+
+def get_ocr_engine(name: str = 'auto') -> OCREngine:
+    if name == 'auto':
+        name = 'tesserocr' if TESSEROCR_AVAILABLE else 'pytesseract'
+    if name not in OCR_ENGINES:
+        raise ValueError(f"Moteur OCR inconnu: {name} (disponibles : {', '.join(OCR_ENGINES)})")
+    if name == 'tesserocr' and not TESSEROCR_AVAILABLE:
+        print("tesserocr non installé - repli sur pytesseract")
+        name = 'pytesseract'
+    with _engines_lock:
+        if name not in _engines:
+            _engines[name] = OCR_ENGINES[name]()
+        return _engines[name]
+
+
+def ocr_image(image: Image.Image, options: OCROptions, engine: OCREngine = None) -> tuple[str, float]:
+    """Texte et confiance moyenne (0-100) d'une image"""
+    engine = engine or get_ocr_engine(options.engine)
+    return engine.recognize(image, options.lang, options.psm)
+
+
+def _rasterize(file_content: bytes, dpi: int, options: OCROptions,
+               page: Optional[int] = None) -> list[Image.Image]:
+    kwargs = {'dpi': dpi, 'grayscale': options.grayscale}
+    if page is not None:
+        kwargs.update(first_page=page, last_page=page)
+    return convert_from_bytes(file_content, **kwargs)
+
+
+def probe_language(image: Image.Image, options: OCROptions, engine: OCREngine) -> OCROptions:
+    """
+    OCR rapide de la première page à basse résolution, avec un seul modèle,
+    pour détecter la langue et ne charger ensuite que le modèle correspondant.
+    """
+    ratio = options.probe_dpi / options.base_dpi
+    probe = image.convert('L')
+    if ratio < 1:
+        probe = probe.resize((int(probe.width * ratio), int(probe.height * ratio)), Image.BILINEAR)
+    text, _ = engine.recognize(probe, options.probe_lang, options.psm)
+    detection = detect_language(text, source='ocr_probe')
+    lang = tesseract_lang(detection, options.lang, options.language_min_confidence)
+    print(f"Langue détectée: {detection.language or 'inconnue'} ({detection.confidence:.2f}) - OCR en {lang}")
+    return replace(options, lang=lang)
+
+
+def ocr_pdf_pages(file_content: bytes, options: OCROptions = None) -> list[dict]:
+    """
+    Rasterise le PDF et le passe à Tesseract page par page. Retourne, pour
+    chaque page, le texte, la confiance moyenne et la résolution retenue.
+    """
+    options = options or OCROptions()
+    print("Test de disponibilité Tesseract...")
+    engine = get_ocr_engine(options.engine)
+    engine.check()
+    print(f"Tesseract trouvé et fonctionnel (moteur {engine.name})")
+
+    print("Conversion PDF en images...")
+    # Convertir PDF en images avec gestion d'erreur poppler
+    try:
+        images = _rasterize(file_content, options.base_dpi, options)
+        print(f"Conversion réussie: {len(images)} page(s) à {options.base_dpi} DPI")
+    except Exception as e:
+        raise ValueError(f"Erreur conversion PDF: {str(e)}. Poppler-utils requis pour convertir PDF en images.")
+
+    if options.detect_language and '+' in options.lang and images:
+        options = probe_language(images[0], options, engine)
+
+    pages = []
+    print(f"Traitement OCR de {len(images)} page(s)...")
+
+    # Traiter chaque page avec OCR
+    for i, image in enumerate(images):
+        try:
+            if options.preprocess:
+                image = preprocess_page(image, options)
+            text, confidence = ocr_image(image, options, engine)
+            dpi = options.base_dpi
+
+            # Confiance faible : nouvel essai à plus haute résolution pour cette page seulement
+            if options.adaptive_dpi and confidence < options.min_confidence and options.retry_dpi > options.base_dpi:
+                print(f"Page {i+1}: confiance {confidence:.0f} - nouvel essai à {options.retry_dpi} DPI")
+                retry_image = _rasterize(file_content, options.retry_dpi, options, page=i + 1)[0]
+                if options.preprocess:
+                    retry_image = preprocess_page(retry_image, options)
+                retry_text, retry_confidence = ocr_image(retry_image, options, engine)
+                if retry_confidence > confidence:
+                    text, confidence, dpi = retry_text, retry_confidence, options.retry_dpi
+
+            print(f"Page {i+1}: {len(text)} caractères extraits (confiance {confidence:.0f}, {dpi} DPI)")
+            pages.append({'page': i + 1, 'text': text.strip(), 'confidence': confidence, 'dpi': dpi})
+        except Exception as e:
+            print(f"Erreur OCR page {i+1}: {str(e)}")
+            continue
+
+    return pages
+
+
+def ocr_pdf_bytes(file_content: bytes, options: OCROptions = None) -> str:
+    """Texte OCR du PDF complet (exécuté dans la sandbox)"""
+    pages = ocr_pdf_pages(file_content, options)
+    final_text = '\n\n'.join(page['text'] for page in pages if page['text'])
+
+    if not final_text.strip():
+        raise ValueError("OCR n'a pas pu extraire de texte du PDF scanné")
+
+    print(f"OCR réussi: {len(final_text)} caractères extraits au total")
+    return final_text
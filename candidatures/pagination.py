@@ -0,0 +1,138 @@
+"""
+Pagination par curseur (keyset) des listes de candidatures.
+
+Au lieu d'un OFFSET, chaque page repart de la dernière ligne affichée :
+WHERE (created_at, id) < (curseur) ORDER BY created_at DESC, id DESC LIMIT n.
+Le coût d'une page ne dépend pas de sa profondeur et aucun COUNT(*) n'est
+nécessaire. Les curseurs sont signés (opaques et non falsifiables). Pour une
+recherche, la pertinence (search_rank) devient la première clé.
+"""
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Optional, Sequence
+
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+
+CURSOR_SALT = 'candidatures.pagination'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+# Clés de tri (toutes décroissantes) et conversion des valeurs lues dans un curseur
+KEY_PARSERS: dict[str, Callable] = {
+    'search_rank': float,
+    'created_at': datetime.fromisoformat,
+    'id': uuid.UUID,
+}
+DEFAULT_KEYS = ('created_at', 'id')
+
+
+def _key_value(obj, key):
+    """Valeur d'une clé de tri sur un modèle ou une ligne .values()"""
+    return obj[key] if isinstance(obj, dict) else getattr(obj, key)
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
+    keys: Sequence[str] = field(default_factory=lambda: DEFAULT_KEYS)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """Pages de `per_page` lignes d'un queryset trié par `keys` décroissantes"""
+
+    def __init__(self, queryset, per_page: int = 30, keys: Sequence[str] = DEFAULT_KEYS):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = tuple(keys)
+
+    def encode(self, obj, direction: str) -> str:
+        return signing.dumps(
+            {'d': direction, 'k': [_serialize(_key_value(obj, key)) for key in self.keys]},
+            salt=CURSOR_SALT, compress=True,
+        )
+
+    def decode(self, cursor: str):
+        """(direction, valeurs) ; None si le curseur est absent, falsifié ou d'une autre liste"""
+        if not cursor:
+            return None
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            values = data['k']
+            if data['d'] not in (NEXT, PREVIOUS) or len(values) != len(self.keys):
+                return None
+            return data['d'], [KEY_PARSERS[key](value) for key, value in zip(self.keys, values)]
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+
+    def _after(self, values, lookup: str) -> Q:
+        """Comparaison lexicographique : (k1, k2, ...) < (v1, v2, ...) pour lookup='lt'"""
+        condition = Q()
+        for position, key in enumerate(self.keys):
+            step = Q(**{f'{key}__{lookup}': values[position]})
+            for previous, value in zip(self.keys[:position], values[:position]):
+                step &= Q(**{previous: value})
+            condition |= step
+        # Borne sur la première clé hors du OR : parcours d'index par intervalle, sans tri
+        return Q(**{f'{self.keys[0]}__{lookup}e': values[0]}) & condition
+
+    def page(self, cursor: str = None) -> KeysetPage:
+        decoded = self.decode(cursor)
+        descending = [f'-{key}' for key in self.keys]
+        if decoded is None:
+            rows = list(self.queryset.order_by(*descending)[:self.per_page + 1])
+            more_after, more_before = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        elif decoded[0] == NEXT:
+            rows = list(self.queryset.filter(self._after(decoded[1], 'lt')).order_by(*descending)[:self.per_page + 1])
+            more_after, more_before = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        else:
+            # Page précédente : on remonte dans l'ordre croissant puis on inverse
+            rows = list(self.queryset.filter(self._after(decoded[1], 'gt')).order_by(*self.keys)[:self.per_page + 1])
+            more_after, more_before = True, len(rows) > self.per_page
+            rows = list(reversed(rows[:self.per_page]))
+
+        return KeysetPage(
+            object_list=rows,
+            next_cursor=self.encode(rows[-1], NEXT) if rows and more_after else None,
+            previous_cursor=self.encode(rows[0], PREVIOUS) if rows and more_before else None,
+            keys=self.keys,
+        )
+
+
+def approximate_count(queryset, cap: int = 1000, filtered: bool = True) -> tuple[int, bool]:
+    """
+    Total affichable sans COUNT(*) complet : (valeur, exact). Sur PostgreSQL,
+    une liste non filtrée lit l'estimation du planificateur ; sinon le
+    comptage s'arrête à `cap` lignes.
+    """
+    if not filtered and connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0]), False
+    count = queryset.order_by()[:cap + 1].count()
+    return min(count, cap), count <= cap
@@ -0,0 +1,313 @@
+"""
+Exécution supervisée des traitements PDF (pdfminer, poppler, tesseract).
+
+Le traitement tourne dans un processus enfant soumis à des limites de temps
+CPU, de temps réel et d'espace d'adressage ; en cas de dépassement l'enfant
+est tué et une SandboxLimitExceeded est levée, sans affecter le worker.
+
+Pour les types configurés dans CV_SANDBOX_POOLS (extraction et OCR), les
+enfants sont réutilisés d'un traitement à l'autre : pas de démarrage de
+processus par étape du preflight et de l'extraction, et l'état chargé (API
+tesserocr et ses modèles de langue) survit entre les CV. Les limites s'appliquent à chaque
+traitement ; un enfant qui en dépasse une est tué puis remplacé, et chaque
+enfant est recyclé après max_jobs traitements.
+"""
+import multiprocessing
+import queue
+import signal
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+from .admission import admission
+
+try:
+    import resource
+    RLIMITS_AVAILABLE = True
+except ImportError:  # Windows : seul le temps réel est limité
+    RLIMITS_AVAILABLE = False
+
+
+class SandboxLimitExceeded(ValueError):
+    """Le traitement a dépassé une limite (cpu, wall, memory) ou a planté (crash)"""
+
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+@dataclass
+class SandboxLimits:
+    cpu_seconds: int = 30
+    wall_seconds: float = 60
+    memory_mb: int = 1024
+
+
+class SandboxStats:
+    """Nombre d'exécutions et de dépassements par type de traitement"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, kind: str, outcome: str):
+        with self._lock:
+            stats = self._stats.setdefault(kind, {})
+            stats[outcome] = stats.get(outcome, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {kind: dict(stats) for kind, stats in self._stats.items()}
+
+
+sandbox_stats = SandboxStats()
+
+
+def get_limits(kind: str) -> SandboxLimits:
+    """Limites configurées pour un type de traitement ('extract', 'ocr')"""
+    configured = getattr(settings, 'CV_SANDBOX_LIMITS', {}).get(kind, {})
+    return SandboxLimits(**configured)
+
+
+def _apply_rlimits(limits: SandboxLimits):
+    if not RLIMITS_AVAILABLE:
+        return
+    # Hérité par les sous-processus (pdftoppm, tesseract)
+    resource.setrlimit(resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + 1))
+    memory = limits.memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def _apply_job_rlimits(limits: SandboxLimits):
+    """Limites d'un traitement dans un enfant réutilisé : le temps CPU déjà consommé n'est pas décompté"""
+    if not RLIMITS_AVAILABLE:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime) + limits.cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    memory = limits.memory_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        memory = min(memory, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (memory, hard))
+
+
+def _child_main(conn, func: Callable, args: tuple, kwargs: dict, limits: SandboxLimits):
+    try:
+        _apply_rlimits(limits)
+        result = func(*args, **kwargs)
+        conn.send(('ok', result))
+    except MemoryError:
+        conn.send(('memory', f"Mémoire insuffisante (limite {limits.memory_mb} Mo)"))
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def _worker_main(conn):
+    """Boucle d'un enfant réutilisé : un traitement à la fois, jusqu'à None ou fermeture du tube"""
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        except Exception as e:
+            # Traitement non désérialisable (fonction introuvable...) : l'enfant reste utilisable
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+            continue
+        if job is None:
+            return
+        func, args, kwargs, limits = job
+        try:
+            _apply_job_rlimits(limits)
+            conn.send(('ok', func(*args, **kwargs)))
+        except MemoryError:
+            conn.send(('memory', f"Mémoire insuffisante (limite {limits.memory_mb} Mo)"))
+            return
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+# Codes de sortie d'un enfant tué par RLIMIT_CPU (SIGXCPU à la limite souple, SIGKILL à la limite dure)
+_CPU_LIMIT_EXITCODES = {-getattr(signal, 'SIGXCPU', 0), -getattr(signal, 'SIGKILL', 0)} - {0}
+
+
+def _context():
+    method = getattr(settings, 'CV_SANDBOX_START_METHOD', None)
+    if method is None:
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def run_sandboxed(kind: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    Exécute func(*args, **kwargs) dans un processus limité et retourne son résultat.
+    `func` doit être une fonction de module (sérialisable) ; ses erreurs sont
+    relancées en ValueError, les dépassements en SandboxLimitExceeded.
+    """
+    with admission.stage(kind):
+        if not getattr(settings, 'CV_SANDBOX_ENABLED', True):
+            return func(*args, **kwargs)
+        pool = get_pool(kind)
+        if pool is not None:
+            return pool.run(func, args, kwargs)
+        return _run_in_child(kind, func, args, kwargs)
+
+
+def _run_in_child(kind: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+    limits = get_limits(kind)
+    ctx = _context()
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child_main, args=(child_conn, func, args, kwargs, limits), daemon=True)
+    process.start()
+    child_conn.close()
+
+    try:
+        if not parent_conn.poll(limits.wall_seconds):
+            process.kill()
+            sandbox_stats.record(kind, 'wall')
+            raise SandboxLimitExceeded('wall', f"Traitement {kind} interrompu après {limits.wall_seconds}s")
+        try:
+            status, payload = parent_conn.recv()
+        except EOFError:
+            process.join(5)
+            raise _child_died(kind, process, limits)
+    finally:
+        parent_conn.close()
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+    return _outcome(kind, status, payload)
+
+
+def _child_died(kind: str, process, limits: SandboxLimits) -> SandboxLimitExceeded:
+    if process.exitcode in _CPU_LIMIT_EXITCODES:
+        sandbox_stats.record(kind, 'cpu')
+        return SandboxLimitExceeded('cpu', f"Traitement {kind} interrompu après {limits.cpu_seconds}s CPU")
+    sandbox_stats.record(kind, 'crash')
+    return SandboxLimitExceeded('crash', f"Le traitement {kind} s'est arrêté (code {process.exitcode})")
+
+
+def _outcome(kind: str, status: str, payload: Any) -> Any:
+    if status == 'ok':
+        sandbox_stats.record(kind, 'ok')
+        return payload
+    if status == 'memory':
+        sandbox_stats.record(kind, 'memory')
+        raise SandboxLimitExceeded('memory', payload)
+    sandbox_stats.record(kind, 'error')
+    raise ValueError(payload)
+
+
+class SandboxWorker:
+    """Enfant réutilisé pour les traitements d'un type ; remplacé après un dépassement ou max_jobs traitements"""
+
+    def __init__(self, kind: str, max_jobs: int = 100):
+        self.kind = kind
+        self.max_jobs = max_jobs
+        self.process = None
+        self.conn = None
+        self.jobs = 0
+
+    def _start(self):
+        ctx = _context()
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        sandbox_stats.record(self.kind, 'started')
+
+    def stop(self, kill: bool = False):
+        if self.process is None:
+            return
+        if not kill:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = self.conn = None
+
+    def run(self, func: Callable, args: tuple, kwargs: dict) -> Any:
+        limits = get_limits(self.kind)
+        if self.process is None or not self.process.is_alive():
+            self.stop(kill=True)
+            self._start()
+        self.conn.send((func, args, kwargs, limits))
+        if not self.conn.poll(limits.wall_seconds):
+            self.stop(kill=True)
+            sandbox_stats.record(self.kind, 'wall')
+            raise SandboxLimitExceeded('wall', f"Traitement {self.kind} interrompu après {limits.wall_seconds}s")
+        try:
+            status, payload = self.conn.recv()
+        except EOFError:
+            self.process.join(5)
+            error = _child_died(self.kind, self.process, limits)
+            self.stop(kill=True)
+            raise error
+        self.jobs += 1
+        if status == 'memory' or self.jobs >= self.max_jobs:
+            self.stop()
+        return _outcome(self.kind, status, payload)
+
+
+class SandboxPool:
+    """Enfants réutilisés d'un type de traitement, partagés par les threads du worker"""
+
+    def __init__(self, kind: str, processes: int, max_jobs: int = 100):
+        # Pile : l'enfant le plus récemment utilisé (modèles déjà chargés) est repris en premier
+        self._idle = queue.LifoQueue()
+        for _ in range(processes):
+            self._idle.put(SandboxWorker(kind, max_jobs))
+
+    def run(self, func: Callable, args: tuple, kwargs: dict) -> Any:
+        worker = self._idle.get()
+        try:
+            return worker.run(func, args, kwargs)
+        finally:
+            self._idle.put(worker)
+
+    def stop(self):
+        """Arrête les enfants inoccupés"""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            worker.stop()
+
+
+_pools: Dict[str, SandboxPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(kind: str) -> Optional[SandboxPool]:
+    """Pool d'enfants réutilisés du type (CV_SANDBOX_POOLS), None pour un enfant par traitement"""
+    configured = getattr(settings, 'CV_SANDBOX_POOLS', {}).get(kind)
+    if not configured or configured.get('processes', 0) < 1:
+        return None
+    with _pools_lock:
+        if kind not in _pools:
+            _pools[kind] = SandboxPool(kind, configured['processes'], configured.get('max_jobs', 100))
+        return _pools[kind]
+
+
+def stop_pools():
+    """Arrête et oublie tous les pools (tests, rechargement de la configuration)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.stop()
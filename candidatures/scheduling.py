@@ -0,0 +1,280 @@
+"""
+Ordonnancement des analyses : priorité puis partage équitable pondéré entre
+clients (entreprise du recruteur).
+
+Le nombre d'analyses exécutées en même temps est borné ; les suivantes
+attendent leur tour. À chaque place libérée :
+1. une analyse qui attend depuis plus de max_wait passe en premier (anti-famine) ;
+2. sinon on prend la classe de priorité la plus haute qui a des analyses en attente ;
+3. dans cette classe, le client au plus petit temps virtuel est servi et son
+   temps virtuel avance de 1/poids (file équitable pondérée) : l'import de
+   5 000 CV d'un client ne retarde pas les candidatures d'un autre.
+
+La classe de priorité est celle de la candidature (Candidature.priority, fixée
+par un recruteur) ; pour un nouveau candidat, elle découle du mode d'analyse
+(interactive : normale, masse : basse).
+
+L'état est propre au processus : chaque worker ordonnance ses propres analyses,
+sans coordination entre workers. La concurrence totale vaut donc
+workers × CV_SCHEDULER_CONCURRENCY et l'équité entre clients est garantie par
+worker ; la répartition entre workers reste celle du serveur (gunicorn, uvicorn).
+Les vues asynchrones ont leur propre ordonnanceur (async_scheduler,
+CV_ASYNC_SCHEDULER_CONCURRENCY) : leurs analyses n'occupent pas de thread.
+Les limites globales sont le budget journalier (base de données) et les
+en-têtes Retry-After du contrôle d'admission. L'attente d'un tour est bornée
+par le reste du délai d'attente de l'admission : au-delà, l'analyse quitte la
+file et la requête reçoit elle aussi un 429.
+"""
+import asyncio
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .admission import DEFAULT_TENANT, PRIORITY_BULK, AdmissionRejected
+from .hedging import LatencyWindow
+from .models import Candidature, PriorityChoices
+
+# Classes d'ordonnancement : les priorités de Candidature
+PRIORITY_RANKS = {PriorityChoices.HIGH.value: 0, PriorityChoices.NORMAL.value: 1, PriorityChoices.LOW.value: 2}
+
+
+def scheduling_priority(admission_priority: str, candidature_priority: str = None) -> str:
+    """
+    Priorité de la candidature si le candidat en a déjà une ; sinon une analyse
+    interactive (candidat en ligne) passe avant une analyse de masse.
+    """
+    if candidature_priority in PRIORITY_RANKS:
+        return candidature_priority
+    return PriorityChoices.LOW.value if admission_priority == PRIORITY_BULK else PriorityChoices.NORMAL.value
+
+
+def candidature_priority(request) -> Optional[str]:
+    """Priorité de la dernière candidature du candidat en attente d'analyse, None si c'est sa première"""
+    pending = request.session.get('pending_candidature') or {}
+    if not pending.get('email'):
+        return None
+    return (
+        Candidature.objects.filter(email=pending['email'])
+        .order_by('-created_at').values_list('priority', flat=True).first()
+    )
+
+
+async def acandidature_priority(request) -> Optional[str]:
+    return await sync_to_async(candidature_priority)(request)
+
+
+def request_tenant(request) -> str:
+    """Client d'une requête : entreprise du recruteur connecté, '' sinon"""
+    user = getattr(request, 'user', None)
+    profil = getattr(user, 'profil_recruteur', None) if getattr(user, 'is_authenticated', False) else None
+    return profil.entreprise if profil else DEFAULT_TENANT
+
+
+async def arequest_tenant(request) -> str:
+    return await sync_to_async(request_tenant)(request)
+
+
+class _Waiter:
+    def __init__(self, priority: str, tenant: str, seq: int, loop=None):
+        self.priority = priority
+        self.tenant = tenant
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self._loop = loop
+        self._event = threading.Event() if loop is None else None
+        self._future = loop.create_future() if loop is not None else None
+
+    def grant(self):
+        self.granted = True
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self._future.done():
+            self._future.set_result(True)
+
+
+class FairScheduler:
+    """Distributeur de places d'analyse, partagé par les threads d'un worker (état en mémoire, par processus)"""
+
+    def __init__(self, concurrency: int = None, setting: str = 'CV_SCHEDULER_CONCURRENCY', default: int = 4):
+        self._concurrency = concurrency
+        self._setting = setting
+        self._default = default
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._queues: Dict[str, Dict[str, deque]] = {}
+        self._vtime: Dict[str, float] = {}
+        self._clock = 0.0
+        self.running = 0
+        self._wait_times: Dict[str, LatencyWindow] = {}
+        self._run_times: Dict[str, LatencyWindow] = {}
+        self._counters: Dict[str, int] = {}
+
+    @property
+    def concurrency(self) -> int:
+        return self._concurrency or getattr(settings, self._setting, self._default)
+
+    def weight(self, tenant: str) -> float:
+        return getattr(settings, 'CV_SCHEDULER_TENANT_WEIGHTS', {}).get(tenant, 1.0)
+
+    def _count(self, name: str):
+        self._counters[name] = self._counters.get(name, 0) + 1
+
+    def _pending(self):
+        for tenant, queues in self._queues.items():
+            for priority, queue in queues.items():
+                if queue:
+                    yield tenant, priority, queue
+
+    def _enqueue(self, waiter: _Waiter):
+        queues = self._queues.setdefault(waiter.tenant, {})
+        if not any(queues.values()):
+            # Un client qui redevient actif ne récupère pas le temps où il était absent
+            self._vtime[waiter.tenant] = max(self._vtime.get(waiter.tenant, 0.0), self._clock)
+        queues.setdefault(waiter.priority, deque()).append(waiter)
+        self._count(f'submitted_{waiter.priority}')
+
+    def _select(self) -> Optional[_Waiter]:
+        pending = list(self._pending())
+        if not pending:
+            return None
+        oldest_tenant, oldest_priority, oldest_queue = min(pending, key=lambda item: item[2][0].seq)
+        max_wait = getattr(settings, 'CV_SCHEDULER_MAX_WAIT', 60)
+        if time.monotonic() - oldest_queue[0].enqueued_at > max_wait:
+            self._count('promoted')
+            tenant, queue = oldest_tenant, oldest_queue
+        else:
+            best_rank = min(PRIORITY_RANKS.get(priority, 1) for _, priority, _ in pending)
+            candidates = [item for item in pending if PRIORITY_RANKS.get(item[1], 1) == best_rank]
+            tenant, _, queue = min(candidates, key=lambda item: (self._vtime.get(item[0], 0.0), item[2][0].seq))
+        self._clock = self._vtime.get(tenant, 0.0)
+        self._vtime[tenant] = self._clock + 1.0 / self.weight(tenant)
+        return queue.popleft()
+
+    def _dispatch(self):
+        """À appeler sous le verrou"""
+        while self.running < self.concurrency:
+            waiter = self._select()
+            if waiter is None:
+                return
+            self.running += 1
+            self._wait_times.setdefault(waiter.priority, LatencyWindow()).add(
+                time.monotonic() - waiter.enqueued_at
+            )
+            waiter.grant()
+
+    def _remove(self, waiter: _Waiter) -> bool:
+        queue = self._queues.get(waiter.tenant, {}).get(waiter.priority)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            return True
+        return False
+
+    def _retry_after(self) -> int:
+        """À appeler sous le verrou : durée médiane d'une analyse × analyses en file / places"""
+        medians = [runs.percentile(0.5) for runs in self._run_times.values()]
+        average = max([median for median in medians if median is not None], default=0.0)
+        queued = sum(len(queue) for _, _, queue in self._pending()) + 1
+        minimum = getattr(settings, 'CV_ADMISSION', {}).get('min_retry_after', 5)
+        return max(int(minimum), math.ceil(average * queued / max(self.concurrency, 1)))
+
+    def _expire(self, waiter: _Waiter):
+        """À appeler sous le verrou : l'analyse n'a pas eu son tour à temps"""
+        self._remove(waiter)
+        self._count('expired')
+        raise AdmissionRejected("Délai d'attente d'un tour d'analyse dépassé", self._retry_after())
+
+    def _release(self, priority: str, started: float):
+        with self._lock:
+            self.running -= 1
+            self._run_times.setdefault(priority, LatencyWindow()).add(time.monotonic() - started)
+            self._count(f'completed_{priority}')
+            self._dispatch()
+
+    @contextmanager
+    def permit(self, priority: str = 'normal', tenant: str = DEFAULT_TENANT, timeout: Optional[float] = None):
+        """Attend son tour (au plus `timeout` s, sinon AdmissionRejected) puis occupe une place pendant le bloc"""
+        waiter = _Waiter(priority, tenant, next(self._seq))
+        with self._lock:
+            self._enqueue(waiter)
+            self._dispatch()
+        if not waiter._event.wait(timeout):
+            with self._lock:
+                if not waiter.granted:
+                    self._expire(waiter)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(priority, started)
+
+    async def apermit(self, priority: str = 'normal', tenant: str = DEFAULT_TENANT,
+                      timeout: Optional[float] = None):
+        """Version asynchrone de permit : retourne le gestionnaire de contexte qui libère la place"""
+        waiter = _Waiter(priority, tenant, next(self._seq), asyncio.get_running_loop())
+        with self._lock:
+            self._enqueue(waiter)
+            self._dispatch()
+        try:
+            await asyncio.wait_for(waiter._future, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if not waiter.granted:
+                    self._expire(waiter)
+        except asyncio.CancelledError:
+            with self._lock:
+                if not self._remove(waiter) and waiter.granted:
+                    self.running -= 1
+                    self._dispatch()
+            raise
+        return self._held(priority)
+
+    @contextmanager
+    def _held(self, priority: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(priority, started)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            queued: Dict[str, Dict[str, int]] = {}
+            for tenant, priority, queue in self._pending():
+                queued.setdefault(tenant or '(aucun)', {})[priority] = len(queue)
+            classes = {}
+            for priority in PRIORITY_RANKS:
+                waits = self._wait_times.get(priority)
+                runs = self._run_times.get(priority)
+                classes[priority] = {
+                    'submitted': self._counters.get(f'submitted_{priority}', 0),
+                    'completed': self._counters.get(f'completed_{priority}', 0),
+                    'wait_p50_seconds': waits.percentile(0.5) if waits else None,
+                    'wait_p95_seconds': waits.percentile(0.95) if waits else None,
+                    'run_p95_seconds': runs.percentile(0.95) if runs else None,
+                }
+            return {
+                'pid': os.getpid(),
+                'concurrency': self.concurrency,
+                'running': self.running,
+                'queued': queued,
+                'classes': classes,
+                'promoted': self._counters.get('promoted', 0),
+                'expired': self._counters.get('expired', 0),
+            }
+
+
+scheduler = FairScheduler()
+async_scheduler = FairScheduler(setting='CV_ASYNC_SCHEDULER_CONCURRENCY', default=100)
@@ -0,0 +1,95 @@
+"""
+Recherche plein texte des candidatures.
+
+Chaque candidature porte un document de recherche (Candidature.search_document)
+recalculé à l'enregistrement : noms, titre, résumé, compétences, entreprises
+et postes des expériences, en minuscules et sans accents. Il est indexé :
+- SQLite : table FTS5 candidatures_search, tenue à jour par des triggers ;
+- PostgreSQL : index GIN sur to_tsvector('french') || to_tsvector('english').
+Les résultats sont classés par pertinence (bm25 / ts_rank). Sans index
+disponible, la recherche se replie sur un LIKE sur le document.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'candidatures_search'
+PG_SEARCH_VECTOR = (
+    "(to_tsvector('french', candidatures_candidature.search_document)"
+    " || to_tsvector('english', candidatures_candidature.search_document))"
+)
+PG_SEARCH_INDEX = 'cand_search_gin_idx'
+
+
+def normalize_search_text(text: str) -> str:
+    """Minuscules, sans accents : 'Développeur' et 'developpeur' sont équivalents"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+def search_terms(query: str) -> list[str]:
+    """Mots de la requête, tels que saisis (le filtre par compétences, lui, passe par les alias)"""
+    return re.findall(r'\w+', normalize_search_text(query))
+
+
+def build_search_document(candidature) -> str:
+    """Texte indexé d'une candidature"""
+    parts = [
+        candidature.first_name, candidature.last_name, candidature.email,
+        candidature.headline, candidature.summary,
+        ' '.join(candidature.skills_primary or []), ' '.join(candidature.skills_secondary or []),
+    ]
+    for experience in candidature.experiences or []:
+        if isinstance(experience, dict):
+            parts.extend([experience.get('company') or '', experience.get('position') or ''])
+    return normalize_search_text(' '.join(str(part) for part in parts if part))
+
+
+def fts_available() -> bool:
+    """La table FTS5 existe (créée par la migration si SQLite a été compilé avec FTS5)"""
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def _fts_query(terms: list[str]) -> str:
+    """Tous les termes, le dernier en préfixe (recherche pendant la saisie)"""
+    return ' '.join(f'"{term}"' + ('*' if i == len(terms) - 1 else '') for i, term in enumerate(terms))
+
+
+def _pg_query(terms: list[str]) -> str:
+    return ' & '.join(f'{term}:*' if i == len(terms) - 1 else term for i, term in enumerate(terms))
+
+
+def search_candidatures(queryset, query: str):
+    """Filtre un queryset de candidatures et l'annote de search_rank (plus grand = plus pertinent)"""
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    if connection.vendor == 'sqlite' and fts_available():
+        match = _fts_query(terms)
+        queryset = queryset.filter(RawSQL(
+            f"candidatures_candidature.id IN (SELECT candidature_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)",
+            (match,), output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            # bm25 est négatif : plus il est petit, plus le document est pertinent
+            f"(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND candidature_id = candidatures_candidature.id)",
+            (match,), output_field=FloatField(),
+        ))
+    elif connection.vendor == 'postgresql':
+        tsquery = _pg_query(terms)
+        pg_query = "(to_tsquery('french', %s) || to_tsquery('english', %s))"
+        queryset = queryset.filter(RawSQL(
+            f"{PG_SEARCH_VECTOR} @@ {pg_query}", (tsquery, tsquery), output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f"ts_rank({PG_SEARCH_VECTOR}, {pg_query})", (tsquery, tsquery), output_field=FloatField(),
+        ))
+    else:
+        for term in terms:
+            queryset = queryset.filter(search_document__contains=term)
+        return queryset.annotate(search_rank=RawSQL('0', (), output_field=FloatField()))
+    return queryset.order_by(F('search_rank').desc(nulls_last=True), '-created_at')
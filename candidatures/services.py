@@ -1,37 +1,49 @@
+import copy
+import functools
+import hashlib
 import os
-from io import BytesIO
-from typing import Dict, Any, Optional
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass, field, replace
+from io import BytesIO, StringIO
+from typing import Dict, Any, Iterable, Optional
 from pathlib import Path
 from django.conf import settings
-from pdfminer.high_level import extract_text
+from django.db import close_old_connections
+from pdfminer.converter import PDFLayoutAnalyzer, TextConverter
+from pdfminer.layout import LAParams, LTChar, LTContainer
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import PDFStream, resolve1
 from pydantic import BaseModel, Field, field_validator
 import anthropic
+from .admission import STAGE_LLM, admission
+from .budget import budget, record_usage
+from .hedging import LatencyWindow, get_executor, hedge_stats, hedged_call
+from .language import LanguageDetection, detect_language, tesseract_lang
+from .ocr import OCR_AVAILABLE, OCROptions, ocr_pdf_bytes
+from .sandbox import SandboxLimitExceeded, run_sandboxed
+from .taxonomy import get_canonicalizer
 import json
 from decimal import Decimal
 from datetime import datetime
+# Backends d'extraction optionnels
 try:
-    from pdf2image import convert_from_bytes
-    import pytesseract
-    import platform
-    
-    # Configuration du chemin Tesseract pour Windows
-    if platform.system() == "Windows":
-        # Chemins courants d'installation de Tesseract sur Windows
-        possible_paths = [
-            r"C:\Program Files\Tesseract-OCR\tesseract.exe",
-            r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
-            r"C:\laragon\bin\tesseract\tesseract.exe",
-            r"C:\tools\tesseract\tesseract.exe"
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                pytesseract.pytesseract.tesseract_cmd = path
-                break
-    
-    OCR_AVAILABLE = True
+    import pypdfium2
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
 except ImportError:
-    OCR_AVAILABLE = False
+    PYMUPDF_AVAILABLE = False
 
 
 class CVAnalysisResponse(BaseModel):
@@ -73,19 +85,819 @@ class CVAnalysisResponse(BaseModel):
         return v
 
 
+class ExtractionTimeout(ValueError):
+    """Le backend d'extraction a dépassé le temps alloué au document"""
+
+
+class SpeculationCancelled(ValueError):
+    """Route spéculative abandonnée : l'autre route a déjà abouti"""
+
+
+class PDFTextBackend:
+    """
+    Interface d'un backend d'extraction de texte PDF.
+
+    Les backends travaillent page par page pour pouvoir respecter une
+    échéance (vérifiée entre deux pages) et n'extraire qu'un sous-ensemble
+    de pages.
+    """
+
+    name = ''
+
+    def iter_pages(self, file_content: bytes, page_numbers: Optional[Iterable[int]] = None) -> Iterable[str]:
+        raise NotImplementedError
+
+    def extract_pages(self, file_content: bytes, page_numbers: Optional[Iterable[int]] = None,
+                      timeout: Optional[float] = None) -> list[str]:
+        """Retourne le texte de chaque page, en levant ExtractionTimeout au-delà de `timeout` secondes"""
+        deadline = time.monotonic() + timeout if timeout else None
+        pages = []
+        for text in self.iter_pages(file_content, page_numbers):
+            pages.append(text)
+            if deadline and time.monotonic() > deadline:
+                raise ExtractionTimeout(
+                    f"Extraction {self.name} interrompue après {len(pages)} page(s) ({timeout}s)"
+                )
+        return pages
+
+    def extract(self, file_content: bytes, timeout: Optional[float] = None) -> str:
+        return '\n\x0c'.join(self.extract_pages(file_content, timeout=timeout))
+
+
+class PDFMinerBackend(PDFTextBackend):
+    """pdfminer avec l'analyse de mise en page par défaut (comportement historique)"""
+
+    name = 'pdfminer'
+
+    def get_laparams(self) -> Optional[LAParams]:
+        return LAParams()
+
+    def iter_pages(self, file_content, page_numbers=None):
+        rsrcmgr = PDFResourceManager(caching=True)
+        output = StringIO()
+        device = TextConverter(rsrcmgr, output, laparams=self.get_laparams())
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        pagenos = set(page_numbers) if page_numbers is not None else None
+        try:
+            for page in PDFPage.get_pages(BytesIO(file_content), pagenos=pagenos):
+                interpreter.process_page(page)
+                yield output.getvalue().rstrip('\x0c')
+                output.seek(0)
+                output.truncate(0)
+        finally:
+            device.close()
+
+
+class PDFMinerFastBackend(PDFMinerBackend):
+    """pdfminer sans tri hiérarchique des blocs (boxes_flow=None), le poste coûteux sur les CV multi-colonnes"""
+
+    name = 'pdfminer_fast'
+
+    def get_laparams(self):
+        return LAParams(boxes_flow=None, detect_vertical=False)
+
+
+class _RawTextConverter(PDFLayoutAnalyzer):
+    """Émet les caractères dans l'ordre du flux, en insérant espaces et retours à la ligne d'après leur position"""
+
+    def __init__(self, rsrcmgr):
+        super().__init__(rsrcmgr, pageno=1, laparams=None)
+        self.text = ''
+
+    def _iter_chars(self, item):
+        if isinstance(item, LTChar):
+            yield item
+        elif isinstance(item, LTContainer):
+            for child in item:
+                yield from self._iter_chars(child)
+
+    def receive_layout(self, ltpage):
+        parts = []
+        previous = None
+        for char in self._iter_chars(ltpage):
+            if previous is not None:
+                if abs(char.y0 - previous.y0) > max(char.height, 1) * 0.5:
+                    parts.append('\n')
+                elif char.x0 - previous.x1 > max(char.width, 1) * 0.25 and parts[-1] != ' ':
+                    parts.append(' ')
+            parts.append(char.get_text())
+            previous = char
+        self.text = ''.join(parts)
+
+
+class PDFMinerRawBackend(PDFTextBackend):
+    """pdfminer sans aucune analyse de mise en page : le plus rapide, ordre de lecture du flux PDF"""
+
+    name = 'pdfminer_raw'
+
+    def iter_pages(self, file_content, page_numbers=None):
+        rsrcmgr = PDFResourceManager(caching=True)
+        device = _RawTextConverter(rsrcmgr)
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        pagenos = set(page_numbers) if page_numbers is not None else None
+        for page in PDFPage.get_pages(BytesIO(file_content), pagenos=pagenos):
+            interpreter.process_page(page)
+            yield device.text
+
+
+class PDFiumBackend(PDFTextBackend):
+    """pypdfium2 (binding de PDFium), si installé"""
+
+    name = 'pdfium'
+
+    def iter_pages(self, file_content, page_numbers=None):
+        document = pypdfium2.PdfDocument(file_content)
+        try:
+            indexes = page_numbers if page_numbers is not None else range(len(document))
+            for index in sorted(indexes):
+                if index >= len(document):
+                    break
+                textpage = document[index].get_textpage()
+                yield textpage.get_text_range()
+        finally:
+            document.close()
+
+
+class PyMuPDFBackend(PDFTextBackend):
+    """PyMuPDF (MuPDF), si installé"""
+
+    name = 'pymupdf'
+
+    def iter_pages(self, file_content, page_numbers=None):
+        document = fitz.open(stream=file_content, filetype='pdf')
+        try:
+            indexes = page_numbers if page_numbers is not None else range(document.page_count)
+            for index in sorted(indexes):
+                if index >= document.page_count:
+                    break
+                yield document[index].get_text()
+        finally:
+            document.close()
+
+
+EXTRACTION_BACKENDS: Dict[str, type] = {
+    PDFMinerBackend.name: PDFMinerBackend,
+    PDFMinerFastBackend.name: PDFMinerFastBackend,
+    PDFMinerRawBackend.name: PDFMinerRawBackend,
+}
+if PDFIUM_AVAILABLE:
+    EXTRACTION_BACKENDS[PDFiumBackend.name] = PDFiumBackend
+if PYMUPDF_AVAILABLE:
+    EXTRACTION_BACKENDS[PyMuPDFBackend.name] = PyMuPDFBackend
+
+
+def get_extraction_backend(name: str = None) -> PDFTextBackend:
+    """Instancie le backend demandé (par défaut settings.CV_EXTRACTION_BACKEND)"""
+    name = name or getattr(settings, 'CV_EXTRACTION_BACKEND', PDFMinerBackend.name)
+    try:
+        return EXTRACTION_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Backend d'extraction inconnu ou non installé: {name}")
+
+
+# Routes possibles pour analyser un CV PDF
+ROUTE_TEXT = 'text'          # extraction pdfminer puis analyse du texte
+ROUTE_OCR = 'ocr'            # OCR Tesseract puis analyse du texte
+ROUTE_PDF_DIRECT = 'pdf_direct'  # PDF envoyé tel quel à Claude
+ROUTE_MOCK = 'mock'          # données factices (dernier recours)
+
+
+@dataclass
+class PDFPreflight:
+    """Faits mesurés à moindre coût sur un PDF avant de choisir une route"""
+
+    size_bytes: int
+    page_count: int = 0
+    pages_with_fonts: int = 0
+    pages_with_images: int = 0
+    sample_text: str = ''
+    sampled_pages: int = 0
+    parse_error: Optional[str] = None
+    page_fingerprints: list[str] = field(default_factory=list)
+    # Texte déjà connu (cache ou échantillon), indexé par empreinte de page
+    page_texts: Dict[str, str] = field(default_factory=dict)
+    pages_extracted: int = 0
+
+    @property
+    def has_text_layer(self) -> bool:
+        return self.pages_with_fonts > 0
+
+    @property
+    def chars_per_page(self) -> float:
+        """Densité de texte mesurée sur les pages échantillonnées"""
+        if not self.sampled_pages:
+            return 0.0
+        return len(self.sample_text.strip()) / self.sampled_pages
+
+
+def page_fingerprint(page: PDFPage, backend_name: str) -> str:
+    """
+    Empreinte d'une page calculée sur ses flux de contenu et ses polices,
+    sans extraction : deux pages identiques donnent le même texte.
+    """
+    digest = hashlib.sha256(backend_name.encode())
+    for stream in page.contents:
+        stream = resolve1(stream)
+        if isinstance(stream, PDFStream):
+            digest.update(stream.get_data())
+    resources = resolve1(page.resources) or {}
+    fonts = resolve1(resources.get('Font')) or {}
+    for name in sorted(fonts, key=str):
+        font = resolve1(fonts[name]) or {}
+        digest.update(f"{name}:{font.get('BaseFont')}".encode())
+        to_unicode = resolve1(font.get('ToUnicode'))
+        if isinstance(to_unicode, PDFStream):
+            digest.update(to_unicode.get_data())
+    return digest.hexdigest()
+
+
+def inspect_pdf(file_content: bytes, backend_name: str) -> PDFPreflight:
+    """
+    Inspecte la structure du PDF (pages, polices, images) et calcule
+    l'empreinte de chaque page, sans extraire le texte.
+    """
+    preflight = PDFPreflight(size_bytes=len(file_content))
+    try:
+        parser = PDFParser(BytesIO(file_content))
+        document = PDFDocument(parser)
+        for page in PDFPage.create_pages(document):
+            preflight.page_count += 1
+            preflight.page_fingerprints.append(page_fingerprint(page, backend_name))
+            resources = resolve1(page.resources) or {}
+            if resolve1(resources.get('Font')):
+                preflight.pages_with_fonts += 1
+            xobjects = resolve1(resources.get('XObject')) or {}
+            for xobject in xobjects.values():
+                xobject = resolve1(xobject)
+                if isinstance(xobject, PDFStream) and getattr(xobject.get('Subtype'), 'name', None) == 'Image':
+                    preflight.pages_with_images += 1
+                    break
+    except Exception as e:
+        preflight.parse_error = str(e)
+    return preflight
+
+
+def extract_pages_with_backend(backend_name: str, file_content: bytes,
+                               page_numbers: Optional[list[int]] = None,
+                               timeout: Optional[float] = None) -> list[str]:
+    """Point d'entrée (sérialisable) de l'extraction, exécuté dans la sandbox"""
+    return get_extraction_backend(backend_name).extract_pages(file_content, page_numbers, timeout)
+
+
+def preflight_pdf(file_content: bytes, sample_pages: int = 1, backend: PDFTextBackend = None,
+                  store: 'PageTextStore' = None) -> PDFPreflight:
+    """
+    Inspecte la structure du PDF (pages, polices, images) sans l'extraire
+    entièrement, puis échantillonne le texte des premières pages.
+    Avec un `store`, les pages déjà extraites ne sont pas ré-extraites.
+    L'analyse du PDF et l'extraction tournent dans la sandbox.
+    """
+    backend = backend or get_extraction_backend()
+    try:
+        preflight = run_sandboxed('extract', inspect_pdf, file_content, backend.name)
+    except SandboxLimitExceeded as e:
+        preflight = PDFPreflight(size_bytes=len(file_content), parse_error=str(e))
+    if preflight.parse_error:
+        return preflight
+
+    # Pas de police sur aucune page : inutile de lancer pdfminer, c'est un scan
+    if preflight.has_text_layer and sample_pages > 0:
+        try:
+            if store is not None:
+                preflight.page_texts = store.load(preflight.page_fingerprints)
+            sample = preflight.page_fingerprints[:sample_pages]
+            missing = [i for i, fp in enumerate(sample) if fp not in preflight.page_texts]
+            if missing:
+                extracted = dict(zip(
+                    [sample[i] for i in missing],
+                    run_sandboxed('extract', extract_pages_with_backend, backend.name, file_content, missing),
+                ))
+                preflight.page_texts.update(extracted)
+                preflight.pages_extracted = len(extracted)
+                if store is not None:
+                    store.save(extracted, backend.name)
+            preflight.sample_text = '\n\x0c'.join(preflight.page_texts.get(fp, '') for fp in sample)
+            preflight.sampled_pages = len(sample)
+        except Exception as e:
+            preflight.parse_error = str(e)
+    return preflight
+
+
+class PageTextStore:
+    """Cache persistant du texte extrait, page par page (modèle ExtractedPage)"""
+
+    def load(self, fingerprints: Iterable[str]) -> Dict[str, str]:
+        from .models import ExtractedPage
+        return dict(
+            ExtractedPage.objects.filter(fingerprint__in=set(fingerprints)).values_list('fingerprint', 'text')
+        )
+
+    def save(self, texts: Dict[str, str], backend_name: str):
+        from .models import ExtractedPage
+        ExtractedPage.objects.bulk_create(
+            [ExtractedPage(fingerprint=fp, text=text, backend=backend_name) for fp, text in texts.items()],
+            ignore_conflicts=True,
+        )
+
+
+class StatsCounter:
+    """Compteurs simples partagés par le processus (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+# Travail évité grâce aux empreintes : pages non ré-extraites, analyses sautées ou partielles
+incremental_stats = StatsCounter()
+
+
+# Catégories de sections et mots-clés de titres (normalisés : minuscules, sans accents)
+SECTION_HEADER = 'header'
+SECTION_EXPERIENCE = 'experience'
+SECTION_EDUCATION = 'education'
+SECTION_SKILLS = 'skills'
+SECTION_LANGUAGES = 'languages'
+SECTION_INTERESTS = 'interests'
+SECTION_OTHER = 'other'
+
+SECTION_KEYWORDS: Dict[str, tuple] = {
+    SECTION_HEADER: ('profil', 'profile', 'resume', 'summary', 'a propos', 'about', 'objectif',
+                     'contact', 'coordonnees', 'perfil'),
+    SECTION_EXPERIENCE: ('experience', 'experiences', 'parcours', 'emploi', 'employment', 'work history',
+                         'professional experience', 'experiencia'),
+    SECTION_EDUCATION: ('formation', 'formations', 'education', 'etudes', 'diplomes', 'academic',
+                        'educacion', 'formacion'),
+    SECTION_SKILLS: ('competences', 'skills', 'technologies', 'outils', 'stack', 'technical skills',
+                     'habilidades', 'conocimientos'),
+    SECTION_LANGUAGES: ('langues', 'languages', 'langue', 'idiomas'),
+    SECTION_INTERESTS: ('centres d\'interet', 'centres d interet', 'interets', 'interests', 'loisirs',
+                        'hobbies', 'aficiones'),
+    SECTION_OTHER: ('projets', 'projects', 'portfolio', 'publications', 'references', 'certifications',
+                    'benevolat', 'volunteering', 'proyectos', 'referencias'),
+}
+
+_HEADING_KEYWORDS = tuple(kw for keywords in SECTION_KEYWORDS.values() for kw in keywords)
+
+
+def _match_keyword(key: str, keywords: Iterable[str]) -> bool:
+    return any(key == kw or key.startswith(kw + ' ') for kw in keywords)
+
+
+def normalize_heading(line: str) -> str:
+    """Minuscules, sans accents ni ponctuation finale : clé stable d'un titre de section"""
+    text = unicodedata.normalize('NFKD', line).encode('ascii', 'ignore').decode('ascii')
+    text = re.sub(r'[\s:|•\-–_]+$', '', text.strip().lower())
+    return re.sub(r'\s+', ' ', text)
+
+
+def is_section_heading(line: str) -> bool:
+    """Heuristique : ligne courte en capitales, ou correspondant à un titre de section connu"""
+    stripped = line.strip().rstrip(':').strip()
+    if not stripped or len(stripped) > 40 or len(stripped.split()) > 5:
+        return False
+    if _match_keyword(normalize_heading(stripped), _HEADING_KEYWORDS):
+        return True
+    letters = [c for c in stripped if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters)
+
+
+def split_sections(cv_text: str) -> list[tuple[str, str]]:
+    """
+    Découpe le texte du CV en sections (clé de titre normalisée, contenu).
+    Le texte précédant le premier titre (nom, contact) forme la section '_header'.
+    """
+    sections = []
+    current_key, current_lines = '_header', []
+    seen: Dict[str, int] = {}
+    for line in cv_text.replace('\x0c', '\n').splitlines():
+        if is_section_heading(line):
+            if current_lines or current_key != '_header':
+                sections.append((current_key, '\n'.join(current_lines).strip()))
+            key = normalize_heading(line) or '_section'
+            seen[key] = seen.get(key, 0) + 1
+            current_key = key if seen[key] == 1 else f"{key}#{seen[key]}"
+            current_lines = []
+        else:
+            current_lines.append(line)
+    sections.append((current_key, '\n'.join(current_lines).strip()))
+    return sections
+
+
+def section_fingerprints(sections: list[tuple[str, str]]) -> Dict[str, str]:
+    """Empreinte de chaque section, insensible aux espaces et à la casse"""
+    return {
+        key: hashlib.sha256(re.sub(r'\s+', ' ', body).strip().lower().encode()).hexdigest()[:16]
+        for key, body in sections
+    }
+
+
+class CVSectionizer:
+    """
+    Regroupe les sections du CV par catégorie et plafonne chacune d'elles
+    (settings.CV_SECTION_CAPS, en caractères) pour borner le texte envoyé à Claude.
+    Les listes longues sans intérêt pour l'analyse (publications, portfolio,
+    références) tombent dans 'other', fortement plafonnée.
+    """
+
+    DEFAULT_CAPS = {
+        SECTION_HEADER: 1500,
+        SECTION_EXPERIENCE: 8000,
+        SECTION_EDUCATION: 3000,
+        SECTION_SKILLS: 2000,
+        SECTION_LANGUAGES: 500,
+        SECTION_INTERESTS: 500,
+        SECTION_OTHER: 1000,
+    }
+
+    def __init__(self, caps: Dict[str, int] = None):
+        self.caps = dict(self.DEFAULT_CAPS)
+        self.caps.update(caps if caps is not None else getattr(settings, 'CV_SECTION_CAPS', {}))
+
+    def classify(self, heading_key: str) -> str:
+        """Catégorie d'une section d'après sa clé de titre normalisée"""
+        if heading_key == '_header':
+            return SECTION_HEADER
+        base = heading_key.split('#')[0]
+        for category, keywords in SECTION_KEYWORDS.items():
+            if _match_keyword(base, keywords):
+                return category
+        return SECTION_OTHER
+
+    def sectionize(self, cv_text: str) -> Dict[str, str]:
+        """Texte de chaque catégorie, dans l'ordre d'apparition, sans plafond"""
+        grouped: Dict[str, list[str]] = {}
+        for key, body in split_sections(cv_text):
+            if body:
+                grouped.setdefault(self.classify(key), []).append(body)
+        return {category: '\n\n'.join(bodies) for category, bodies in grouped.items()}
+
+    def cap(self, category: str, text: str) -> str:
+        """Tronque une section à son plafond, sur une fin de ligne"""
+        limit = self.caps.get(category)
+        if limit is None or len(text) <= limit:
+            return text
+        truncated = text[:limit]
+        if '\n' in truncated:
+            truncated = truncated[:truncated.rfind('\n')]
+        return truncated + '\n[...]'
+
+    def condense(self, cv_text: str, categories: Iterable[str] = None) -> str:
+        """Texte plafonné, section par section, limité aux catégories demandées"""
+        sections = self.sectionize(cv_text)
+        wanted = list(categories) if categories is not None else list(self.DEFAULT_CAPS)
+        parts = []
+        for category in wanted:
+            text = sections.get(category)
+            if not text:
+                continue
+            body = self.cap(category, text)
+            parts.append(body if category == SECTION_HEADER else f"## {category.upper()}\n{body}")
+        return '\n\n'.join(parts)
+
+
+# Analyse en appels parallèles : champs de CVAnalysisResponse demandés pour chaque groupe de sections
+SECTION_GROUPS = {
+    'profile': {
+        'sections': (SECTION_HEADER, SECTION_EXPERIENCE, SECTION_OTHER),
+        'schema': """  "first_name": "string (prénom du candidat)",
+  "last_name": "string (nom de famille du candidat)",
+  "headline": "string (titre professionnel accrocheur)",
+  "summary": "string (résumé en 2-3 phrases du profil et parcours du candidat)",
+  "years_experience": float,
+  "experiences": [
+    {"start_date": "2020-01", "end_date": "2024-03", "company": "Nom de l'entreprise", "position": "Poste occupé", "location": "Ville", "description": "Description des responsabilités"}
+  ],
+  "locations_preferred": ["Paris", "Remote"],
+  "salary_expectation_min": int_ou_null,
+  "salary_expectation_max": int_ou_null,
+  "availability_date": "YYYY-MM-DD_ou_null",
+  "work_authorization": "EU|Visa|No",
+  "fit_scores": {"experience": float_0_100, "culture": float_0_100}""",
+    },
+    'education': {
+        'sections': (SECTION_HEADER, SECTION_EDUCATION, SECTION_LANGUAGES),
+        'schema': """  "education_highest": "string (ex: Master Informatique)",
+  "education": [
+    {"start_date": "2016-09", "end_date": "2018-06", "school": "Nom de l'école", "degree": "Diplôme obtenu", "field": "Domaine d'étude", "location": "Ville"}
+  ],
+  "languages": [{"fr": "C2"}, {"en": "B2"}],
+  "fit_scores": {"education": float_0_100}""",
+    },
+    'skills': {
+        'sections': (SECTION_HEADER, SECTION_SKILLS, SECTION_INTERESTS, SECTION_EXPERIENCE),
+        'schema': """  "skills_primary": ["skill1", "skill2", "skill3"],
+  "skills_secondary": ["skill4", "skill5"],
+  "interests": ["sport", "lecture", "voyages"],
+  "fit_scores": {"skills": float_0_100}""",
+    },
+}
+
+
+def merge_section_analyses(partials: list[Dict[str, Any]]) -> CVAnalysisResponse:
+    """Fusionne les réponses partielles ; le score global est la moyenne des scores détaillés"""
+    merged: Dict[str, Any] = {}
+    fit_scores: Dict[str, float] = {}
+    for partial in partials:
+        fit_scores.update(partial.pop('fit_scores', {}) or {})
+        partial.pop('fit_score_overall', None)
+        merged.update(partial)
+    merged['fit_scores'] = fit_scores
+    merged['fit_score_overall'] = round(sum(fit_scores.values()) / len(fit_scores), 1) if fit_scores else 0.0
+    return CVAnalysisResponse(**merged)
+
+
+def analysis_from_candidature(candidature) -> CVAnalysisResponse:
+    """Reconstruit l'analyse stockée sur une candidature (ré-analyse évitée)"""
+    return CVAnalysisResponse(
+        first_name=candidature.first_name,
+        last_name=candidature.last_name,
+        headline=candidature.headline,
+        summary=candidature.summary,
+        years_experience=float(candidature.years_experience),
+        experiences=candidature.experiences,
+        skills_primary=candidature.skills_primary,
+        skills_secondary=candidature.skills_secondary,
+        languages=candidature.languages,
+        education_highest=candidature.education_highest,
+        education=candidature.education,
+        interests=candidature.interests,
+        locations_preferred=candidature.locations_preferred,
+        salary_expectation_min=candidature.salary_expectation_min,
+        salary_expectation_max=candidature.salary_expectation_max,
+        availability_date=candidature.availability_date.isoformat() if candidature.availability_date else None,
+        work_authorization=candidature.work_authorization,
+        fit_score_overall=float(candidature.fit_score_overall or 0),
+        fit_scores=candidature.fit_scores,
+    )
+
+
+class RouteStats:
+    """Statistiques de latence et de coût (tokens) par route, partagées par le processus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, float]] = {}
+        self._latencies: Dict[str, LatencyWindow] = {}
+
+    def record(self, route: str, seconds: float, success: bool,
+               input_tokens: int = 0, output_tokens: int = 0):
+        with self._lock:
+            if success:
+                self._latencies.setdefault(route, LatencyWindow()).add(seconds)
+            stats = self._routes.setdefault(route, {
+                'count': 0, 'success': 0, 'failure': 0, 'total_seconds': 0.0,
+                'max_seconds': 0.0, 'input_tokens': 0, 'output_tokens': 0,
+            })
+            stats['count'] += 1
+            stats['success' if success else 'failure'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['input_tokens'] += input_tokens
+            stats['output_tokens'] += output_tokens
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            result = {}
+            for route, stats in self._routes.items():
+                data = dict(stats)
+                data['avg_seconds'] = stats['total_seconds'] / stats['count'] if stats['count'] else 0.0
+                latencies = self._latencies.get(route)
+                data['p50_seconds'] = latencies.percentile(0.5) if latencies else None
+                data['p95_seconds'] = latencies.percentile(0.95) if latencies else None
+                result[route] = data
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._latencies.clear()
+
+
+route_stats = RouteStats()
+# Mêmes statistiques par couple route:modèle (routage des modèles)
+model_stats = RouteStats()
+
+
+def api_key_configured() -> bool:
+    """Vrai si une vraie clé Anthropic est configurée (sinon mode test)"""
+    return bool(settings.ANTHROPIC_API_KEY) and settings.ANTHROPIC_API_KEY != 'your-anthropic-api-key-here'
+
+
+class CVRouter:
+    """
+    Choisit l'ordre des routes d'analyse à partir du preflight.
+
+    Politiques (settings.CV_ROUTING_POLICY) :
+    - 'auto' : texte si dense, sinon OCR pour les scans courts et PDF direct au-delà
+    - 'cost' : minimise les tokens envoyés à Claude (OCR avant PDF direct)
+    - 'latency' : minimise le temps de réponse (PDF direct avant OCR)
+    """
+
+    POLICIES = ('auto', 'cost', 'latency')
+
+    def __init__(self, policy: str = None):
+        self.policy = policy or getattr(settings, 'CV_ROUTING_POLICY', 'auto')
+        if self.policy not in self.POLICIES:
+            raise ValueError(f"Politique de routage inconnue: {self.policy}")
+        self.min_chars_per_page = getattr(settings, 'CV_ROUTING_MIN_CHARS_PER_PAGE', 200)
+        self.ocr_max_pages = getattr(settings, 'CV_ROUTING_OCR_MAX_PAGES', 2)
+        self.direct_max_pages = getattr(settings, 'CV_ROUTING_DIRECT_MAX_PAGES', 100)
+        self.direct_max_bytes = getattr(settings, 'CV_ROUTING_DIRECT_MAX_BYTES', 32 * 1024 * 1024)
+
+    def text_viable(self, preflight: PDFPreflight) -> bool:
+        return (preflight.parse_error is None and preflight.has_text_layer
+                and preflight.chars_per_page >= self.min_chars_per_page)
+
+    def ocr_viable(self, preflight: PDFPreflight) -> bool:
+        return OCR_AVAILABLE and preflight.parse_error is None and preflight.page_count > 0
+
+    def direct_viable(self, preflight: PDFPreflight) -> bool:
+        return (api_key_configured()
+                and preflight.size_bytes <= self.direct_max_bytes
+                and preflight.page_count <= self.direct_max_pages)
+
+    def plan(self, preflight: PDFPreflight) -> list[str]:
+        """Retourne les routes à essayer, de la moins chère à la plus chère"""
+        routes = []
+        if self.text_viable(preflight):
+            routes.append(ROUTE_TEXT)
+
+        if self.policy == 'cost':
+            fallbacks = [ROUTE_OCR, ROUTE_PDF_DIRECT]
+        elif self.policy == 'latency':
+            fallbacks = [ROUTE_PDF_DIRECT, ROUTE_OCR]
+        elif preflight.page_count and preflight.page_count <= self.ocr_max_pages:
+            fallbacks = [ROUTE_OCR, ROUTE_PDF_DIRECT]
+        else:
+            fallbacks = [ROUTE_PDF_DIRECT, ROUTE_OCR]
+
+        for route in fallbacks:
+            if route == ROUTE_OCR and self.ocr_viable(preflight):
+                routes.append(route)
+            elif route == ROUTE_PDF_DIRECT and self.direct_viable(preflight):
+                routes.append(route)
+
+        routes.append(ROUTE_MOCK)
+        return routes
+
+
+MODEL_SMALL = 'small'
+MODEL_LARGE = 'large'
+
+
+class ModelRouter:
+    """
+    Choisit le modèle Claude d'une analyse à partir du preflight et de la route.
+
+    Budgets (settings.CV_MODEL_BUDGET) :
+    - 'quality' : toujours le grand modèle
+    - 'balanced' : petit modèle pour les CV texte courts, structurés et en français/anglais
+    - 'latency' : petit modèle pour toute la route texte, grand pour les scans et le PDF direct
+    """
+
+    BUDGETS = ('quality', 'balanced', 'latency')
+
+    def __init__(self, budget: str = None):
+        self.budget = budget or getattr(settings, 'CV_MODEL_BUDGET', 'balanced')
+        if self.budget not in self.BUDGETS:
+            raise ValueError(f"Budget de modèle inconnu: {self.budget}")
+        self.models = {
+            MODEL_SMALL: getattr(settings, 'CV_MODEL_SMALL', settings.ANTHROPIC_MODEL),
+            MODEL_LARGE: getattr(settings, 'CV_MODEL_LARGE', settings.ANTHROPIC_MODEL),
+        }
+        self.small_max_pages = getattr(settings, 'CV_MODEL_SMALL_MAX_PAGES', 2)
+        self.small_min_sections = getattr(settings, 'CV_MODEL_SMALL_MIN_SECTIONS', 2)
+        self.small_languages = getattr(settings, 'CV_MODEL_SMALL_LANGUAGES', ('fr', 'en'))
+
+    def tier(self, route: str, preflight: PDFPreflight, language: LanguageDetection = None) -> str:
+        if self.budget == 'quality' or route != ROUTE_TEXT:
+            return MODEL_LARGE
+        if self.budget == 'latency':
+            return MODEL_SMALL
+        if preflight.page_count > self.small_max_pages:
+            return MODEL_LARGE
+        headings = sum(1 for line in preflight.sample_text.splitlines() if is_section_heading(line))
+        if headings < self.small_min_sections:
+            return MODEL_LARGE
+        if (language is None or language.language not in self.small_languages
+                or not language.reliable(getattr(settings, 'CV_LANGUAGE_MIN_CONFIDENCE', 0.6))):
+            return MODEL_LARGE
+        return MODEL_SMALL
+
+    def select(self, route: str, preflight: PDFPreflight, language: LanguageDetection = None) -> str:
+        """Nom du modèle Anthropic à utiliser"""
+        return self.models[self.tier(route, preflight, language)]
+
+
+def _prompt_chars(messages: list) -> int:
+    """Taille approximative d'une requête (texte et documents encodés)"""
+    total = 0
+    for message in messages:
+        content = message['content']
+        if isinstance(content, str):
+            total += len(content)
+            continue
+        for block in content:
+            total += len(block.get('text') or block.get('source', {}).get('data', ''))
+    return total
+
+
+# Version des prompts d'analyse, enregistrée dans Candidature.model_version : à
+# incrémenter quand les prompts changent pour que `manage.py rescore` reprenne les anciennes analyses
+PROMPT_VERSION = 'v1.0'
+
+
+# model_version des analyses factices (sans clé API ou après une erreur Claude) :
+# jamais dans current_model_versions, donc toujours reprises par `manage.py rescore`
+MOCK_MODEL_VERSION = 'mock'
+
+
+def model_version_for(model: str) -> str:
+    return f"claude-{model}-{PROMPT_VERSION}"
+
+
+def current_model_versions() -> set[str]:
+    """Versions produites par la configuration actuelle (petit et grand modèle)"""
+    return {model_version_for(model) for model in ModelRouter().models.values()}
+
+
+# Introduction du prompt d'analyse selon la langue détectée du CV ; le schéma
+# JSON attendu et la langue des champs rédigés (headline, summary) ne changent pas
+ANALYSIS_PROMPT_INTROS = {
+    'fr': "Tu es un analyste RH expert. Analyse ce CV et extrais les informations suivantes au format JSON strict.",
+    'en': (
+        "You are an expert HR analyst. The CV below is written in English. Analyse it and extract the "
+        "following information as strict JSON. Keep company names, job titles, schools and skills as "
+        "written in the CV; write headline, summary and descriptions in French."
+    ),
+    'es': (
+        "Eres un analista de RR. HH. experto. El CV siguiente está redactado en español. Analízalo y extrae "
+        "la siguiente información en formato JSON estricto. Conserva los nombres de empresas, puestos, "
+        "escuelas y competencias tal como aparecen en el CV; redacta headline, summary y descripciones en francés."
+    ),
+}
+
+
 class CVAnalysisService:
     """Service d'analyse de CV avec Claude"""
     
-    def __init__(self):
+    def __init__(self, router: CVRouter = None, model_router: ModelRouter = None):
         self.client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-        self.model = settings.ANTHROPIC_MODEL
-        self.model_version = f"claude-{self.model}-v1.0"
+        self.mock_used = False
+        self.use_model(settings.ANTHROPIC_MODEL)
+        self.router = router or CVRouter()
+        self.model_router = model_router or ModelRouter()
+        self.extraction_backend = get_extraction_backend()
+        self.page_store = PageTextStore()
+        self.previous = None
+        self.reused_previous = False
+        self.last_section_fingerprints = {}
+        self.last_usage = None
+        self.call_usages = []
+        # (modèle, usage) de tous les appels de l'analyse, y compris les routes abandonnées
+        self.usage_log = []
+        self.sectionizer = CVSectionizer()
+        self.last_route = None
+        self.last_preflight = None
+        self.last_text = None
+        self.last_language = LanguageDetection()
+        # Annulation coopérative d'une route spéculative perdante (vérifiée avant chaque appel)
+        self.cancelled = threading.Event()
+        # Protège usage_log : une route perdante peut y ajouter sa consommation après coup
+        self.usage_lock = threading.Lock()
+        # (client, priorité, candidature) du dernier record_usage
+        self.usage_context = None
+        self.usage_settled = False
     
+    def use_model(self, model: str):
+        """Modèle des prochains appels ; model_version est enregistré sur la candidature"""
+        self.model = model
+
+    @property
+    def model_version(self) -> str:
+        return MOCK_MODEL_VERSION if self.mock_used else model_version_for(self.model)
+
     def extract_text_from_pdf(self, file_content: bytes) -> str:
         """Extrait le texte d'un fichier PDF"""
         try:
             # Essayer d'abord l'extraction de texte normale
-            text = extract_text(BytesIO(file_content))
+            text = '\n\x0c'.join(run_sandboxed(
+                'extract', extract_pages_with_backend, self.extraction_backend.name, file_content,
+                None, getattr(settings, 'CV_EXTRACTION_TIMEOUT', None),
+            ))
             
             # Vérifier si le texte extrait est vide ou ne contient que des espaces
             if text and text.strip():
@@ -97,60 +909,40 @@ class CVAnalysisService:
             raise ValueError("PDF_SCANNED")  # Signal spécial pour utiliser Claude directement
             
         except Exception as e:
-            if str(e) == "PDF_SCANNED":
+            if str(e) == "PDF_SCANNED" or isinstance(e, (ExtractionTimeout, SandboxLimitExceeded)):
                 raise e  # Re-raise le signal
             raise ValueError(f"Erreur lors de l'extraction du PDF: {str(e)}")
     
     def extract_text_with_ocr(self, file_content: bytes) -> str:
-        """Extrait le texte d'un PDF scanné avec OCR"""
+        """Extrait le texte d'un PDF scanné avec OCR (dans la sandbox)"""
         try:
-            print("Test de disponibilité Tesseract...")
-            # Test de Tesseract
-            try:
-                pytesseract.get_tesseract_version()
-                print("Tesseract trouvé et fonctionnel")
-            except Exception as e:
-                raise ValueError(f"Tesseract non trouvé: {str(e)}. Téléchargez et installez Tesseract depuis https://github.com/UB-Mannheim/tesseract/wiki")
-            
-            print("Conversion PDF en images...")
-            # Convertir PDF en images avec gestion d'erreur poppler
-            try:
-                images = convert_from_bytes(file_content, dpi=150)  # Réduit la résolution pour plus de rapidité
-                print(f"Conversion réussie: {len(images)} page(s)")
-            except Exception as e:
-                raise ValueError(f"Erreur conversion PDF: {str(e)}. Poppler-utils requis pour convertir PDF en images.")
-            
-            extracted_text = []
-            print(f"Traitement OCR de {len(images)} page(s)...")
-            
-            # Traiter chaque page avec OCR
-            for i, image in enumerate(images):
-                print(f"OCR page {i+1}/{len(images)}...")
-                try:
-                    # Utiliser Tesseract pour extraire le texte
-                    text = pytesseract.image_to_string(image, lang='fra+eng', config='--psm 6')
-                    if text.strip():
-                        extracted_text.append(text.strip())
-                        print(f"Page {i+1}: {len(text)} caractères extraits")
-                except Exception as e:
-                    print(f"Erreur OCR page {i+1}: {str(e)}")
-                    continue
-            
-            final_text = '\n\n'.join(extracted_text)
-            
-            if not final_text.strip():
-                raise ValueError("OCR n'a pas pu extraire de texte du PDF scanné")
-            
-            print(f"OCR réussi: {len(final_text)} caractères extraits au total")
-            return final_text
-            
+            return run_sandboxed('ocr', ocr_pdf_bytes, file_content, self.ocr_options())
         except Exception as e:
             raise ValueError(f"Erreur OCR: {str(e)}. Utilisez le formulaire texte à la place.")
     
+    def ocr_options(self) -> OCROptions:
+        """Options OCR ; si la langue est déjà connue, seul son modèle Tesseract est chargé"""
+        options = OCROptions.from_settings()
+        if self.language_reliable():
+            options = replace(options, lang=tesseract_lang(self.last_language, options.lang), detect_language=False)
+        return options
+
+    def language_reliable(self) -> bool:
+        return self.last_language.reliable(getattr(settings, 'CV_LANGUAGE_MIN_CONFIDENCE', 0.6))
+
+    def detect_cv_language(self, text: str, source: str):
+        """Détecte la langue sur la première page si elle n'est pas encore connue"""
+        if getattr(settings, 'CV_LANGUAGE_DETECTION', True) and not self.language_reliable():
+            self.last_language = detect_language(text.split('\x0c', 1)[0], source)
+            print(f"Langue détectée ({source}): {self.last_language.language or 'inconnue'} "
+                  f"({self.last_language.confidence:.2f})")
+
     def create_analysis_prompt(self, cv_text: str) -> str:
         """Crée le prompt pour l'analyse du CV"""
+        language = self.last_language.language if self.language_reliable() else 'fr'
+        intro = ANALYSIS_PROMPT_INTROS.get(language, ANALYSIS_PROMPT_INTROS['fr'])
         return f"""
-Tu es un analyste RH expert. Analyse ce CV et extrais les informations suivantes au format JSON strict.
+{intro}
 
 CONTRAINTES IMPORTANTES:
 - Réponds UNIQUEMENT en JSON valide, sans texte additionnel
@@ -211,12 +1003,38 @@ JSON ATTENDU:
             return self._mock_analysis_response("CV PDF scanné - analyse factice")
             
         try:
-            import base64
+            return self._request_pdf_analysis(file_content)
             
-            # Encoder le PDF en base64
-            pdf_base64 = base64.b64encode(file_content).decode('utf-8')
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Réponse Claude invalide (JSON): {str(e)}")
+        except Exception as e:
+            error_msg = str(e)
+            print(f"Erreur Claude PDF direct: {error_msg}")
             
-            prompt = f"""
+            if "credit balance is too low" in error_msg or "insufficient_quota" in error_msg:
+                print("Problème de crédits - fallback vers mode factice")
+                budget.note_credit_error()
+                return self._mock_analysis_response("PDF non analysable - mode test")
+            elif "not valid" in error_msg.lower() or "invalid" in error_msg.lower():
+                print("PDF invalide - fallback vers mode factice")
+                return self._mock_analysis_response("PDF invalide - analyse factice basée sur le nom du fichier")
+            else:
+                print("Autre erreur PDF - fallback vers mode factice") 
+                return self._mock_analysis_response("PDF non analysable - données factices générées")
+
+    def _request_pdf_analysis(self, file_content: bytes) -> CVAnalysisResponse:
+        """Appel Claude avec le PDF en pièce jointe, sans fallback (lève en cas d'erreur)"""
+        response = self._create_message(**self._pdf_message_kwargs(file_content))
+        return self._parse_analysis(response)
+
+    def _pdf_message_kwargs(self, file_content: bytes) -> Dict[str, Any]:
+        """Paramètres de l'appel Messages pour l'analyse directe du PDF"""
+        import base64
+        
+        # Encoder le PDF en base64
+        pdf_base64 = base64.b64encode(file_content).decode('utf-8')
+        
+        prompt = f"""
 Tu es un analyste RH expert. Analyse ce CV PDF et extrais les informations suivantes au format JSON strict.
 
 CONTRAINTES IMPORTANTES:
@@ -267,96 +1085,55 @@ JSON ATTENDU:
   }}
 }}
 """
-            
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                temperature=0.3,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "document",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "application/pdf",
-                                    "data": pdf_base64
-                                }
+        
+        return dict(
+            model=self.model,
+            max_tokens=2000,
+            temperature=0.3,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
+                        {
+                            "type": "document",
+                            "source": {
+                                "type": "base64",
+                                "media_type": "application/pdf",
+                                "data": pdf_base64
                             }
-                        ]
-                    }
-                ]
-            )
-            
-            content = response.content[0].text
-            
-            # Parse le JSON
-            analysis_data = json.loads(content)
-            
-            # Valide avec Pydantic
-            return CVAnalysisResponse(**analysis_data)
-            
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Réponse Claude invalide (JSON): {str(e)}")
-        except Exception as e:
-            error_msg = str(e)
-            print(f"Erreur Claude PDF direct: {error_msg}")
-            
-            if "credit balance is too low" in error_msg or "insufficient_quota" in error_msg:
-                print("Problème de crédits - fallback vers mode factice")
-                return self._mock_analysis_response("PDF non analysable - mode test")
-            elif "not valid" in error_msg.lower() or "invalid" in error_msg.lower():
-                print("PDF invalide - fallback vers mode factice")
-                return self._mock_analysis_response("PDF invalide - analyse factice basée sur le nom du fichier")
-            else:
-                print("Autre erreur PDF - fallback vers mode factice") 
-                return self._mock_analysis_response("PDF non analysable - données factices générées")
+                        }
+                    ]
+                }
+            ]
+        )
+
+    def _parse_analysis(self, response) -> CVAnalysisResponse:
+        """Parse le JSON de la réponse Claude puis valide avec Pydantic"""
+        content = response.content[0].text
+        print(f"Réponse Claude reçue: {len(content)} caractères")
+        
+        if not content.strip():
+            raise ValueError("Réponse Claude vide")
+        
+        analysis_data = json.loads(content)
+        return CVAnalysisResponse(**analysis_data)
 
     def analyze_cv_with_ai(self, cv_text: str) -> CVAnalysisResponse:
         """Analyse le CV avec Claude et retourne les données structurées"""
         # Mode test - retourne des données factices si pas de clé API ou clé API invalide
-        if not settings.ANTHROPIC_API_KEY or settings.ANTHROPIC_API_KEY == 'your-anthropic-api-key-here':
+        if not api_key_configured():
             print("Mode test activé - génération de données factices")
             return self._mock_analysis_response(cv_text)
             
         try:
-            prompt = self.create_analysis_prompt(cv_text)
-            print(f"Appel à Claude avec le modèle: {self.model}")
-            
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                temperature=0.3,
-                messages=[
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ]
-            )
-            
-            content = response.content[0].text
-            print(f"Réponse Claude reçue: {len(content)} caractères")
-            print(f"Début de la réponse: {content[:200]}...")
-            
-            if not content.strip():
-                print("Réponse Claude vide - utilisation du mode factice")
-                return self._mock_analysis_response(cv_text)
-            
-            # Parse le JSON
-            analysis_data = json.loads(content)
-            
-            # Valide avec Pydantic
-            return CVAnalysisResponse(**analysis_data)
+            return self._request_text_analysis(cv_text)
             
         except json.JSONDecodeError as e:
             print(f"Erreur JSON: {str(e)}")
-            print(f"Contenu reçu: '{content}'")
             print("Fallback vers mode factice")
             return self._mock_analysis_response(cv_text)
         except Exception as e:
@@ -366,6 +1143,7 @@ JSON ATTENDU:
             
             if "credit balance is too low" in error_msg or "insufficient_quota" in error_msg:
                 print("Problème de crédits détecté - fallback vers mode factice")
+                budget.note_credit_error()
                 return self._mock_analysis_response(cv_text)
             elif "model" in error_msg.lower() and "not found" in error_msg.lower():
                 print(f"Modèle {self.model} non trouvé - fallback vers mode factice")
@@ -373,10 +1151,111 @@ JSON ATTENDU:
             else:
                 print("Autre erreur - fallback vers mode factice")
                 return self._mock_analysis_response(cv_text)
+
+    def _request_text_analysis(self, cv_text: str) -> CVAnalysisResponse:
+        """
+        Appel Claude sur le texte du CV, sans fallback (lève en cas d'erreur).
+        Le texte est d'abord condensé par section ; un CV très long est
+        analysé en appels parallèles (un par groupe de sections).
+        """
+        condensed = self.sectionizer.condense(cv_text)
+        print(f"Texte condensé: {len(condensed)}/{len(cv_text)} caractères")
+        if self._use_sectioned_analysis(condensed):
+            return self._request_sectioned_analysis(cv_text)
+        
+        prompt = self.create_analysis_prompt(condensed)
+        print(f"Appel à Claude avec le modèle: {self.model}")
+        
+        response = self._create_message(**self._text_message_kwargs(prompt))
+        return self._parse_analysis(response)
+
+    def _use_sectioned_analysis(self, condensed: str) -> bool:
+        return (getattr(settings, 'CV_SECTION_PARALLEL', False)
+                and len(condensed) >= getattr(settings, 'CV_SECTION_PARALLEL_MIN_CHARS', 12000))
+
+    def _text_message_kwargs(self, prompt: str, max_tokens: int = 2000) -> Dict[str, Any]:
+        """Paramètres de l'appel Messages pour un prompt texte"""
+        return dict(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=0.3,
+            messages=[
+                {
+                    "role": "user", 
+                    "content": prompt
+                }
+            ]
+        )
+
+    def create_section_prompt(self, group: str, sections_text: str) -> str:
+        """Prompt limité aux champs d'un groupe de sections (analyse parallèle)"""
+        return f"""
+Tu es un analyste RH expert. Voici un extrait d'un CV (sections : {', '.join(SECTION_GROUPS[group]['sections'])}).
+Extrais UNIQUEMENT les champs ci-dessous au format JSON strict.
+
+CONTRAINTES IMPORTANTES:
+- Réponds UNIQUEMENT en JSON valide, sans texte additionnel
+- Tous les scores doivent être entre 0 et 100
+
+EXTRAIT DU CV:
+{sections_text}
+
+JSON ATTENDU:
+{{
+{SECTION_GROUPS[group]['schema']}
+}}
+"""
+
+    def _request_section_group(self, group: str, sections_text: str) -> Dict[str, Any]:
+        response = self._create_message(
+            **self._text_message_kwargs(self.create_section_prompt(group, sections_text), max_tokens=1500)
+        )
+        return json.loads(response.content[0].text)
+
+    def _request_sectioned_analysis(self, cv_text: str) -> CVAnalysisResponse:
+        """Un appel Claude par groupe de sections, en parallèle, puis fusion des résultats"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        texts = self._section_group_texts(cv_text)
+        print(f"Analyse parallèle par sections: {', '.join(f'{g}={len(t)}' for g, t in texts.items())}")
+        with ThreadPoolExecutor(max_workers=len(texts)) as executor:
+            futures = [executor.submit(self._request_section_group, group, text) for group, text in texts.items()]
+            partials = [future.result() for future in futures]
+        return merge_section_analyses(partials)
+
+    def _section_group_texts(self, cv_text: str) -> Dict[str, str]:
+        return {
+            group: self.sectionizer.condense(cv_text, config['sections'])
+            for group, config in SECTION_GROUPS.items()
+        }
+
+    def _create_message(self, **kwargs):
+        """
+        Appel à l'API Messages en conservant la consommation de tokens de chaque appel.
+        Au-delà du p95 de latence, un doublon peut être lancé (voir hedging.py).
+        """
+        if self.cancelled.is_set():
+            raise SpeculationCancelled("Route spéculative abandonnée")
+        with admission.stage(STAGE_LLM):
+            response = hedged_call(
+                lambda: self.client.messages.create(**kwargs), _prompt_chars(kwargs['messages']), kwargs['model']
+            )
+        self.last_usage = getattr(response, 'usage', None)
+        self.call_usages.append(self.last_usage)
+        self.usage_log.append((kwargs['model'], self.last_usage))
+        return response
+
+    def _usage_tokens(self) -> Dict[str, int]:
+        """Tokens consommés par les appels depuis le dernier reset de call_usages"""
+        return {
+            'input_tokens': sum(getattr(usage, 'input_tokens', 0) or 0 for usage in self.call_usages),
+            'output_tokens': sum(getattr(usage, 'output_tokens', 0) or 0 for usage in self.call_usages),
+        }
     
     def _mock_analysis_response(self, cv_text: str, filename: str = None) -> CVAnalysisResponse:
         """Génère une réponse fictive pour les tests"""
         import re
+        self.mock_used = True
         
         # Analyse basique du texte pour extraire des infos
         lines = cv_text.split('\n')
@@ -565,42 +1444,366 @@ JSON ATTENDU:
         
         return analysis, self.model_version
     
-    def analyze_cv_from_bytes(self, file_content: bytes, filename: str = None) -> tuple[CVAnalysisResponse, str]:
+    def analyze_cv_from_bytes(self, file_content: bytes, filename: str = None,
+                              previous=None) -> tuple[CVAnalysisResponse, str]:
         """
         Analyse un CV depuis des bytes (pour upload direct)
         
+        La route (texte, OCR, PDF direct) est choisie à partir d'un preflight
+        du document ; en cas d'échec on passe à la route suivante du plan.
+        Si `previous` (candidature précédente du même candidat) est fourni,
+        seules les sections modifiées sont ré-analysées.
+        
         Returns:
             tuple: (CVAnalysisResponse, model_version)
         """
-        try:
-            # Essayer d'abord l'extraction de texte
-            cv_text = self.extract_text_from_pdf(file_content)
-            print(f"Extraction de texte réussie: {len(cv_text)} caractères")
-            
-            if not cv_text.strip():
-                raise ValueError("Aucun texte extractible du fichier PDF")
-            
-            # Analyse IA avec texte extrait
-            analysis = self.analyze_cv_with_ai(cv_text)
-            
-        except ValueError as e:
-            error_msg = str(e)
-            if "PDF_SCANNED" in error_msg or "PDF" in error_msg or "No /Root object" in error_msg:
-                # PDF problématique ou scanné - analyse directe avec Claude
-                print(f"PDF problématique détecté ({error_msg[:50]}...) - analyse directe avec Claude...")
-                try:
-                    analysis = self.analyze_cv_with_pdf_direct(file_content)
-                except Exception as pdf_error:
-                    # Si même l'analyse directe échoue, utiliser le mode factice
-                    print(f"Analyse PDF directe échouée: {str(pdf_error)[:100]}")
-                    print("Fallback vers mode factice")
-                    analysis = self._mock_analysis_response("PDF non analysable - données générées automatiquement", filename)
-            else:
-                # Autre erreur - re-raise
-                raise e
+        preflight = self.preflight(file_content)
+        routes = self._start_analysis(preflight, previous)
+        
+        if self.speculative_candidate(preflight, routes):
+            result = self._run_speculative(file_content, preflight, filename)
+            if result is not None:
+                return result
+            routes = [route for route in routes if route not in (ROUTE_TEXT, ROUTE_PDF_DIRECT)]
         
+        for route in routes:
+            self.call_usages = []
+            self.use_model(self.model_router.select(route, preflight, self.last_language))
+            started = time.monotonic()
+            try:
+                analysis = self._run_route(route, file_content, preflight, filename)
+            except Exception as e:
+                self._record_stats(route, time.monotonic() - started, False)
+                print(f"Route {route} échouée: {str(e)[:100]}")
+                continue
+            self._record_stats(route, time.monotonic() - started, True)
+            self.last_route = route
+            if self.reused_previous:
+                return analysis, previous.model_version
+            return analysis, self.model_version
+        
+        # Inatteignable : la route factice ne lève pas
+        raise ValueError("Aucune route d'analyse n'a abouti")
+
+    def analyze_cached_text(self, candidature) -> Optional[tuple[CVAnalysisResponse, str]]:
+        """
+        Ré-analyse une candidature à partir du texte de ses pages en cache
+        (ExtractedPage), sans relire ni ré-extraire le PDF. Retourne None si
+        une page n'est plus en cache ou sans clé API : un re-scoring ne doit
+        jamais écrire de résultat factice.
+        """
+        if not api_key_configured():
+            return None
+        fingerprints = candidature.page_fingerprints or []
+        texts = self.page_store.load(fingerprints)
+        if not fingerprints or any(fp not in texts for fp in fingerprints):
+            return None
+        cv_text = '\n\x0c'.join(texts[fp] for fp in fingerprints)
+        preflight = PDFPreflight(
+            size_bytes=0,
+            page_count=len(fingerprints),
+            pages_with_fonts=len(fingerprints),
+            sample_text=texts[fingerprints[0]],
+            sampled_pages=1,
+            page_fingerprints=fingerprints,
+            page_texts=texts,
+        )
+        self.last_preflight = preflight
+        self.last_text = cv_text
+        self.last_language = LanguageDetection()
+        self.detect_cv_language(cv_text, 'text_layer')
+        self.last_section_fingerprints = candidature.section_fingerprints or {}
+        self.previous = None
+        self.reused_previous = False
+        self.mock_used = False
+        self.call_usages = []
+        self.use_model(self.model_router.select(ROUTE_TEXT, preflight, self.last_language))
+        started = time.monotonic()
+        try:
+            analysis = self._analyze_text_route(cv_text)
+        except Exception:
+            self._record_stats(ROUTE_TEXT, time.monotonic() - started, False)
+            raise
+        self._record_stats(ROUTE_TEXT, time.monotonic() - started, True)
+        self.last_route = ROUTE_TEXT
         return analysis, self.model_version
 
+    def preflight(self, file_content: bytes) -> PDFPreflight:
+        return preflight_pdf(file_content, getattr(settings, 'CV_ROUTING_SAMPLE_PAGES', 1),
+                             self.extraction_backend, self.page_store)
+
+    def _start_analysis(self, preflight: PDFPreflight, previous=None) -> list[str]:
+        """Réinitialise l'état de l'analyse et retourne le plan de routes"""
+        self.last_preflight = preflight
+        self.last_text = None
+        self.last_language = LanguageDetection()
+        if preflight.has_text_layer:
+            self.detect_cv_language(preflight.sample_text, 'text_layer')
+        self.last_section_fingerprints = {}
+        self.previous = previous
+        self.reused_previous = False
+        self.mock_used = False
+        routes = self.router.plan(preflight)
+        print(f"Preflight: {preflight.page_count} page(s), {preflight.chars_per_page:.0f} car./page, "
+              f"{preflight.size_bytes} octets - routes: {routes}")
+        return routes
+
+    def speculative_candidate(self, preflight: PDFPreflight, routes: list[str]) -> bool:
+        """
+        Document limite : couche texte présente mais peu dense. L'analyse PDF
+        directe est alors lancée en parallèle de l'extraction plutôt qu'après son échec.
+        """
+        if not getattr(settings, 'CV_SPECULATIVE_DIRECT', False) or not api_key_configured():
+            return False
+        if ROUTE_TEXT not in routes or ROUTE_PDF_DIRECT not in routes or self.previous is not None:
+            return False
+        max_chars = getattr(settings, 'CV_SPECULATIVE_MAX_CHARS_PER_PAGE', 2 * self.router.min_chars_per_page)
+        return preflight.chars_per_page < max_chars
+
+    def _run_speculative(self, file_content: bytes, preflight: PDFPreflight,
+                         filename: str = None) -> Optional[tuple[CVAnalysisResponse, str]]:
+        """
+        Routes texte et PDF direct en concurrence, chacune sur sa propre copie
+        du service : le premier succès l'emporte et seul son état est repris.
+        """
+        hedge_stats.incr('speculative')
+        self.call_usages = []
+        # Les deux routes partagent le modèle : document limite, donc grand modèle
+        self.use_model(self.model_router.select(ROUTE_PDF_DIRECT, preflight, self.last_language))
+        started = time.monotonic()
+        executor = get_executor('speculative')
+        futures = {}
+        for route in (ROUTE_TEXT, ROUTE_PDF_DIRECT):
+            route_service = self._fork_route(route)
+            future = executor.submit(
+                self._speculative_route, route_service, route, file_content, preflight, filename
+            )
+            futures[future] = route_service
+        winner = None
+        pending = set(futures)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    print(f"Route spéculative {futures[future].last_route} échouée: {str(future.exception())[:100]}")
+                    continue
+                winner = future
+                break
+
+        for future, route_service in futures.items():
+            if future is not winner:
+                route_service.cancelled.set()
+                # Immédiat si la route est terminée, sinon à sa fin (dans le worker)
+                future.add_done_callback(functools.partial(self._settle_route, route_service))
+
+        if winner is None:
+            self._record_stats(ROUTE_TEXT, time.monotonic() - started, False)
+            return None
+        route_service = futures[winner]
+        self._adopt_route(route_service)
+        hedge_stats.incr(f'speculative_{route_service.last_route}_wins')
+        self._record_stats(route_service.last_route, time.monotonic() - started, True)
+        self.last_route = route_service.last_route
+        print(f"Route spéculative retenue: {self.last_route}")
+        if self.reused_previous:
+            return winner.result(), self.previous.model_version
+        return winner.result(), self.model_version
+
+    def _fork_route(self, route: str) -> 'CVAnalysisService':
+        """Copie du service pour une route spéculative : état et consommation propres"""
+        route_service = copy.copy(self)
+        route_service.last_route = route
+        route_service.last_section_fingerprints = dict(self.last_section_fingerprints)
+        route_service.call_usages = []
+        route_service.usage_log = []
+        route_service.cancelled = threading.Event()
+        route_service.usage_lock = threading.Lock()
+        route_service.usage_context = None
+        route_service.usage_settled = False
+        return route_service
+
+    def _speculative_route(self, route_service: 'CVAnalysisService', route: str, file_content: bytes,
+                           preflight: PDFPreflight, filename: str = None) -> CVAnalysisResponse:
+        """Exécutée par un worker du pool 'speculative'"""
+        close_old_connections()
+        try:
+            return route_service._run_route(route, file_content, preflight, filename)
+        finally:
+            close_old_connections()
+
+    def _adopt_route(self, route_service: 'CVAnalysisService'):
+        """Reprend l'état et la consommation de la route retenue"""
+        for name in ('last_text', 'last_language', 'last_section_fingerprints', 'reused_previous',
+                     'mock_used', 'last_usage', 'call_usages'):
+            setattr(self, name, getattr(route_service, name))
+        with self.usage_lock:
+            route_service.usage_settled = True
+            self.usage_log.extend(route_service.usage_log)
+
+    def _settle_route(self, route_service: 'CVAnalysisService', future=None):
+        """
+        Consommation d'une route perdante, une seule fois : ajoutée à usage_log
+        si l'analyse n'a pas encore été enregistrée, sinon enregistrée directement.
+        """
+        with self.usage_lock:
+            if route_service.usage_settled:
+                return
+            route_service.usage_settled = True
+            if self.usage_context is None:
+                self.usage_log.extend(route_service.usage_log)
+                return
+            context = self.usage_context
+        try:
+            record_usage(route_service, *context)
+        finally:
+            close_old_connections()
+
+    def _record_stats(self, route: str, seconds: float, success: bool):
+        usage = self._usage_tokens()
+        route_stats.record(route, seconds, success, **usage)
+        if route != ROUTE_MOCK:
+            model_stats.record(f"{route}:{self.model}", seconds, success, **usage)
+
+    def _run_route(self, route: str, file_content: bytes, preflight: PDFPreflight,
+                   filename: str = None) -> CVAnalysisResponse:
+        """Exécute une route d'analyse ; lève une exception si elle n'aboutit pas"""
+        if route == ROUTE_TEXT:
+            cv_text = self._extract_route_text(file_content, preflight)
+            return self._analyze_text_incremental(cv_text, filename)
+        if route == ROUTE_OCR:
+            cv_text = self._extract_ocr_text(file_content)
+            return self._analyze_text_route(cv_text, filename)
+        if route == ROUTE_PDF_DIRECT:
+            return self._request_pdf_analysis(file_content)
+        return self._mock_route_response(filename)
+
+    def _extract_route_text(self, file_content: bytes, preflight: PDFPreflight) -> str:
+        """Texte de la route texte (pages en cache réutilisées) ; lève s'il est trop court"""
+        if preflight.page_fingerprints:
+            cv_text = self._extract_text_incremental(file_content, preflight)
+        else:
+            cv_text = self.extract_text_from_pdf(file_content)
+        if len(cv_text.strip()) < self.router.min_chars_per_page:
+            raise ValueError("Texte extrait trop court")
+        self.last_text = cv_text
+        self.detect_cv_language(cv_text, 'text_layer')
+        return cv_text
+
+    def _extract_ocr_text(self, file_content: bytes) -> str:
+        self.last_text = self.extract_text_with_ocr(file_content)
+        self.detect_cv_language(self.last_text, 'ocr')
+        return self.last_text
+
+    def _mock_route_response(self, filename: str = None) -> CVAnalysisResponse:
+        # Données factices, construites sur le texte déjà extrait s'il y en a un
+        fallback_text = self.last_text or "PDF non analysable - données générées automatiquement"
+        return self._mock_analysis_response(fallback_text, filename)
+
+    def _analyze_text_route(self, cv_text: str, filename: str = None) -> CVAnalysisResponse:
+        if not api_key_configured():
+            return self._mock_analysis_response(cv_text, filename)
+        return self._request_text_analysis(cv_text)
+
+    def _extract_text_incremental(self, file_content: bytes, preflight: PDFPreflight) -> str:
+        """N'extrait que les pages dont l'empreinte est absente du cache"""
+        fingerprints = preflight.page_fingerprints
+        texts = preflight.page_texts
+        missing = [i for i, fp in enumerate(fingerprints) if fp not in texts]
+        if missing:
+            extracted = dict(zip(
+                [fingerprints[i] for i in missing],
+                run_sandboxed(
+                    'extract', extract_pages_with_backend, self.extraction_backend.name, file_content,
+                    missing, getattr(settings, 'CV_EXTRACTION_TIMEOUT', None),
+                ),
+            ))
+            self.page_store.save(extracted, self.extraction_backend.name)
+            texts.update(extracted)
+        extracted_count = len(missing) + preflight.pages_extracted
+        incremental_stats.incr('pages_total', len(fingerprints))
+        incremental_stats.incr('pages_reused', len(fingerprints) - extracted_count)
+        print(f"Extraction incrémentale: {extracted_count}/{len(fingerprints)} page(s) extraites")
+        return '\n\x0c'.join(texts.get(fp, '') for fp in fingerprints)
+
+    def _analyze_text_incremental(self, cv_text: str, filename: str = None) -> CVAnalysisResponse:
+        """
+        Compare les sections avec la candidature précédente : analyse sautée si
+        rien n'a changé, limitée aux sections modifiées si le diff est petit.
+        """
+        mode, changed_sections, removed = self._incremental_plan(cv_text)
+        if mode == 'skip':
+            return analysis_from_candidature(self.previous)
+        if mode == 'partial':
+            return self._request_incremental_analysis(self.previous, changed_sections, removed)
+        return self._analyze_text_route(cv_text, filename)
+
+    def _incremental_plan(self, cv_text: str) -> tuple[str, list[tuple[str, str]], list[str]]:
+        """Décide entre 'skip', 'partial' et 'full' ; retourne aussi les sections modifiées et supprimées"""
+        sections = split_sections(cv_text)
+        current = section_fingerprints(sections)
+        self.last_section_fingerprints = current
+        previous = self.previous
+        # Une analyse factice n'est jamais réutilisée
+        if previous is None or not previous.section_fingerprints or previous.model_version == MOCK_MODEL_VERSION:
+            incremental_stats.incr('analyses_full')
+            return 'full', [], []
+
+        changed = [key for key, fp in current.items() if previous.section_fingerprints.get(key) != fp]
+        removed = [key for key in previous.section_fingerprints if key not in current]
+        if not changed and not removed:
+            print("Sections identiques à la candidature précédente - analyse réutilisée")
+            incremental_stats.incr('analyses_skipped')
+            self.reused_previous = True
+            return 'skip', [], []
+
+        max_ratio = getattr(settings, 'CV_INCREMENTAL_MAX_CHANGED_RATIO', 0.34)
+        if api_key_configured() and (len(changed) + len(removed)) / max(len(current), 1) <= max_ratio:
+            print(f"Ré-analyse partielle: sections modifiées {changed}, supprimées {removed}")
+            incremental_stats.incr('analyses_partial')
+            incremental_stats.incr('chars_not_sent', len(cv_text) - sum(
+                len(body) for key, body in sections if key in changed
+            ))
+            return 'partial', [(key, body) for key, body in sections if key in changed], removed
+
+        incremental_stats.incr('analyses_full')
+        return 'full', [], []
+
+    def create_incremental_prompt(self, previous_analysis: CVAnalysisResponse,
+                                  changed_sections: list[tuple[str, str]], removed: list[str]) -> str:
+        """Prompt de mise à jour d'une analyse existante à partir des seules sections modifiées"""
+        sections_text = '\n\n'.join(f"[{key}]\n{body}" for key, body in changed_sections)
+        removed_text = ', '.join(removed) if removed else 'aucune'
+        return f"""
+Tu es un analyste RH expert. Un candidat a mis à jour son CV. Voici l'analyse JSON de la version précédente :
+
+{previous_analysis.model_dump_json(indent=2)}
+
+SECTIONS MODIFIÉES OU AJOUTÉES (texte complet de la nouvelle version) :
+{sections_text}
+
+SECTIONS SUPPRIMÉES : {removed_text}
+
+Mets à jour l'analyse en tenant compte uniquement de ces changements et réponds UNIQUEMENT
+avec le JSON complet mis à jour, au même format et avec les mêmes contraintes (scores entre 0 et 100,
+work_authorization 'EU', 'Visa' ou 'No', availability_date 'YYYY-MM-DD' ou null).
+"""
+
+    def _request_incremental_analysis(self, previous, changed_sections: list[tuple[str, str]],
+                                      removed: list[str]) -> CVAnalysisResponse:
+        prompt = self.create_incremental_prompt(analysis_from_candidature(previous), changed_sections, removed)
+        response = self._create_message(**self._text_message_kwargs(prompt))
+        return self._parse_analysis(response)
+
+    def extraction_metadata(self) -> Dict[str, Any]:
+        """Champs de Candidature décrivant le document analysé (empreintes pages et sections)"""
+        preflight = self.last_preflight
+        return {
+            'page_fingerprints': preflight.page_fingerprints if preflight else [],
+            'section_fingerprints': self.last_section_fingerprints,
+            'detected_language': self.last_language.language,
+            'language_confidence': round(self.last_language.confidence, 3) if self.last_language.language else None,
+        }
+
 
 def create_candidature_from_analysis(analysis: CVAnalysisResponse, model_version: str, resume_url: str) -> dict:
     """
@@ -616,6 +1819,8 @@ def create_candidature_from_analysis(analysis: CVAnalysisResponse, model_version
     """
     from .models import WorkAuthorizationChoices, StatusChoices, PriorityChoices
     
+    canonicalizer = get_canonicalizer()
+    
     # Mapping work_authorization
     work_auth_mapping = {
         'EU': WorkAuthorizationChoices.EU,
@@ -632,8 +1837,9 @@ def create_candidature_from_analysis(analysis: CVAnalysisResponse, model_version
         'summary': analysis.summary,
         'years_experience': Decimal(str(analysis.years_experience)),
         'experiences': analysis.experiences,
-        'skills_primary': analysis.skills_primary,
-        'skills_secondary': analysis.skills_secondary,
+        # Compétences canoniques ("JS", "javascript (ES6)" -> "JavaScript"), sans doublon entre les deux listes
+        'skills_primary': canonicalizer.canonical_list(analysis.skills_primary),
+        'skills_secondary': canonicalizer.canonical_list(analysis.skills_secondary, exclude=analysis.skills_primary),
         'languages': analysis.languages,
         'education_highest': analysis.education_highest,
         'education': analysis.education,
@@ -0,0 +1,97 @@
+"""
+Compétences normalisées des candidatures.
+
+Les listes skills_primary / skills_secondary (JSON) sont recopiées dans
+Skill / CandidatureSkill pour filtrer et compter par compétence avec des
+index plutôt qu'en parcourant toutes les lignes en Python.
+"""
+from typing import Dict, Iterable, Tuple
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Candidature, CandidatureSkill, Skill, SkillWeightChoices
+from .search import normalize_search_text
+from .taxonomy import canonical_skill
+
+SKILL_MODE_ALL = 'all'
+SKILL_MODE_ANY = 'any'
+
+
+def skill_key(label: str) -> str:
+    """Clé d'une compétence : nom canonique (taxonomy.py) en minuscules, sans accents"""
+    return normalize_search_text(canonical_skill(label))[:100]
+
+
+def candidature_skill_weights(candidature) -> Dict[str, Tuple[str, int]]:
+    """Compétences d'une candidature : nom canonique -> (libellé, poids) ; principale l'emporte"""
+    weights: Dict[str, Tuple[str, int]] = {}
+    for labels, weight in ((candidature.skills_secondary, SkillWeightChoices.SECONDARY),
+                           (candidature.skills_primary, SkillWeightChoices.PRIMARY)):
+        for label in labels or []:
+            if not isinstance(label, str) or not label.strip():
+                continue
+            key = skill_key(label)
+            if key and (key not in weights or weight > weights[key][1]):
+                weights[key] = (canonical_skill(label)[:100], weight)
+    return weights
+
+
+def get_or_create_skills(labels: Dict[str, str]) -> Dict[str, Skill]:
+    """Skills par nom canonique, créés en une requête si absents"""
+    skills = {skill.name: skill for skill in Skill.objects.filter(name__in=labels)}
+    missing = [Skill(name=name, label=label) for name, label in labels.items() if name not in skills]
+    if missing:
+        Skill.objects.bulk_create(missing, ignore_conflicts=True)
+        skills.update({skill.name: skill for skill in Skill.objects.filter(name__in=[s.name for s in missing])})
+    return skills
+
+
+def sync_candidature_skills(candidatures: Iterable[Candidature]):
+    """Remplace les liens CandidatureSkill d'un lot de candidatures enregistrées"""
+    candidatures = list(candidatures)
+    if not candidatures:
+        return
+    weights = {candidature.pk: candidature_skill_weights(candidature) for candidature in candidatures}
+    labels = {key: label for entries in weights.values() for key, (label, _) in entries.items()}
+    with transaction.atomic():
+        skills = get_or_create_skills(labels)
+        CandidatureSkill.objects.filter(candidature__in=list(weights)).delete()
+        CandidatureSkill.objects.bulk_create([
+            CandidatureSkill(candidature_id=pk, skill=skills[key], weight=weight)
+            for pk, entries in weights.items()
+            for key, (_, weight) in entries.items()
+        ])
+
+
+def parse_skill_filter(value: str) -> list[str]:
+    """'Django, PostgreSQL' -> noms canoniques"""
+    return [key for key in dict.fromkeys(skill_key(part) for part in (value or '').split(',')) if key]
+
+
+def filter_by_skills(queryset, keys: list[str], mode: str = SKILL_MODE_ALL):
+    """Candidatures ayant toutes (all) ou au moins une (any) des compétences"""
+    if not keys:
+        return queryset
+    links = CandidatureSkill.objects.filter(skill__name__in=keys)
+    if mode == SKILL_MODE_ANY:
+        return queryset.filter(id__in=links.values('candidature_id'))
+    matching = (
+        links.values('candidature_id')
+        .annotate(matched=Count('skill_id', distinct=True))
+        .filter(matched=len(keys))
+        .values('candidature_id')
+    )
+    return queryset.filter(id__in=matching)
+
+
+def skill_counts(queryset=None, limit: int = 10) -> list[dict]:
+    """Compétences les plus fréquentes (parmi un queryset de candidatures si fourni)"""
+    links = CandidatureSkill.objects.all()
+    if queryset is not None:
+        links = links.filter(candidature__in=queryset.values('id'))
+    return list(
+        links.values('skill__label', 'skill__name')
+        .annotate(count=Count('candidature_id'))
+        .order_by('-count', 'skill__name')[:limit]
+    )
@@ -0,0 +1,175 @@
+"""
+Canonicalisation des compétences.
+
+Claude renvoie la même compétence sous plusieurs formes ("JS", "Javascript",
+"javascript (ES6)", "React.js", "ReactJS"). Un trie d'alias (par mots) donne
+le nom canonique ; les qualificatifs de version qui suivent un alias sont
+ignorés ; à défaut, une correspondance approchée (difflib) rattrape les
+fautes de frappe. Le moteur est construit une fois par processus et les
+résultats sont mis en cache.
+"""
+import difflib
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+# Nom canonique -> alias (le nom canonique est toujours un alias de lui-même). Un alias
+# désigne la même compétence : pas de mot générique ('next') ni de produit voisin
+# ('spring' pour Spring Boot, 'unix' pour Linux, 'github' pour Git)
+SKILL_ALIASES: Dict[str, Tuple[str, ...]] = {
+    'JavaScript': ('js', 'javascript', 'java script', 'ecmascript', 'es6', 'vanilla js'),
+    'TypeScript': ('ts', 'typescript'),
+    'React': ('react', 'reactjs', 'react js', 'react.js'),
+    'React Native': ('react native',),
+    'Vue.js': ('vue', 'vuejs', 'vue js', 'vue.js'),
+    'Angular': ('angular', 'angularjs', 'angular js'),
+    'Node.js': ('node', 'nodejs', 'node js', 'node.js'),
+    'Next.js': ('nextjs', 'next js', 'next.js'),
+    'Express': ('express', 'expressjs', 'express js'),
+    'Python': ('python', 'python3', 'py'),
+    'Django': ('django',),
+    'Django REST Framework': ('drf', 'django rest framework', 'django rest'),
+    'Flask': ('flask',),
+    'FastAPI': ('fastapi', 'fast api'),
+    'Java': ('java',),
+    'Spring Boot': ('spring boot', 'springboot'),
+    'Kotlin': ('kotlin',),
+    'C': ('c', 'langage c'),
+    'C++': ('c++', 'cpp'),
+    'C#': ('c#', 'csharp', 'c sharp'),
+    '.NET': ('.net', 'dotnet', 'dot net', '.net core', 'asp.net', 'asp.net core'),
+    'PHP': ('php',),
+    'Symfony': ('symfony',),
+    'Laravel': ('laravel',),
+    'Go': ('go', 'golang'),
+    'Rust': ('rust',),
+    'Ruby on Rails': ('rails', 'ruby on rails', 'ror'),
+    'SQL': ('sql',),
+    'PostgreSQL': ('postgresql', 'postgres', 'psql', 'pgsql'),
+    'MySQL': ('mysql', 'my sql'),
+    'MongoDB': ('mongodb', 'mongo', 'mongo db'),
+    'Redis': ('redis',),
+    'Elasticsearch': ('elasticsearch', 'elastic search'),
+    'Docker': ('docker',),
+    'Kubernetes': ('kubernetes', 'k8s'),
+    'AWS': ('aws', 'amazon web services'),
+    'Google Cloud': ('gcp', 'google cloud', 'google cloud platform'),
+    'Azure': ('azure', 'microsoft azure'),
+    'Terraform': ('terraform',),
+    'Git': ('git',),
+    'CI/CD': ('ci/cd', 'ci cd', 'cicd', 'integration continue'),
+    'Linux': ('linux',),
+    'HTML': ('html', 'html5'),
+    'CSS': ('css', 'css3'),
+    'Tailwind CSS': ('tailwind', 'tailwindcss', 'tailwind css'),
+    'Machine Learning': ('machine learning', 'ml', 'apprentissage automatique'),
+    'Deep Learning': ('deep learning', 'apprentissage profond'),
+    'Data Science': ('data science', 'science des donnees'),
+    'Power BI': ('power bi', 'powerbi'),
+    'Excel': ('excel', 'microsoft excel', 'ms excel'),
+    'Agile': ('agile', 'methode agile', 'methodes agiles', 'methodologie agile'),
+    'Scrum': ('scrum',),
+    'Gestion de projet': ('gestion de projet', 'project management', 'gestion de projets'),
+}
+
+# Mots qui peuvent suivre un alias sans changer la compétence ("Python 3", "React.js (hooks)")
+QUALIFIERS = {
+    'js', 'framework', 'langage', 'language', 'lang', 'avance', 'advanced', 'notions', 'bases',
+    'hooks', 'core', 'moderne', 'modern', 'es6', 'es2015', 'lts',
+}
+VERSION = re.compile(r'^(v?\d+(\.\d+)*[a-z]?|es\d+)$')
+TOKEN = re.compile(r'[a-z0-9][a-z0-9#+]*|\.net|#|\+\+')
+
+
+def tokenize(label: str) -> tuple[str, ...]:
+    """Mots normalisés (minuscules, sans accents) ; '.', '-', '/', '_' séparent les mots"""
+    text = unicodedata.normalize('NFKD', label or '').encode('ascii', 'ignore').decode('ascii').lower()
+    return tuple(TOKEN.findall(text))
+
+
+class SkillCanonicalizer:
+    """Trie d'alias par mots, avec repli approché pour les libellés inconnus"""
+
+    def __init__(self, aliases: Dict[str, Iterable[str]], fuzzy_cutoff: float = 0.88):
+        self.trie: dict = {}
+        self.keys: Dict[str, str] = {}
+        self.fuzzy_cutoff = fuzzy_cutoff
+        for canonical, names in aliases.items():
+            for name in (canonical, *names):
+                tokens = tokenize(name)
+                if not tokens:
+                    continue
+                node = self.trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node[None] = canonical
+                self.keys[' '.join(tokens)] = canonical
+        # Repli approché limité aux clés de même initiale : quelques dizaines de comparaisons
+        self._by_initial: Dict[str, list[str]] = {}
+        for key in self.keys:
+            self._by_initial.setdefault(key[0], []).append(key)
+        self.canonical = lru_cache(maxsize=8192)(self._canonical)
+
+    def longest_match(self, tokens: tuple[str, ...], start: int = 0) -> Tuple[Optional[str], int]:
+        """Alias le plus long commençant à `start` : (nom canonique, position de fin)"""
+        node, found, end = self.trie, None, start
+        for position in range(start, len(tokens)):
+            node = node.get(tokens[position])
+            if node is None:
+                break
+            if None in node:
+                found, end = node[None], position + 1
+        return found, end
+
+    def _canonical(self, label: str) -> str:
+        tokens = tokenize(label)
+        if not tokens:
+            return (label or '').strip()
+        canonical, end = self.longest_match(tokens)
+        if canonical and all(token in QUALIFIERS or VERSION.match(token) for token in tokens[end:]):
+            return canonical
+        key = ' '.join(tokens)
+        if len(key) >= 4:
+            close = difflib.get_close_matches(key, self._by_initial.get(key[0], []), n=1, cutoff=self.fuzzy_cutoff)
+            if close:
+                return self.keys[close[0]]
+        return re.sub(r'\s+', ' ', label.strip())
+
+    def canonical_list(self, labels: Iterable[str], exclude: Iterable[str] = ()) -> list[str]:
+        """Noms canoniques sans doublons, dans l'ordre ; `exclude` (alias acceptés) retire des noms déjà présents ailleurs"""
+        seen = {tokenize(name) for name in self.canonical_list(exclude)} if exclude else set()
+        result = []
+        for label in labels or []:
+            if not isinstance(label, str) or not label.strip():
+                continue
+            canonical = self.canonical(label)
+            key = tokenize(canonical)
+            if key not in seen:
+                seen.add(key)
+                result.append(canonical)
+        return result
+
+
+_canonicalizer: Optional[SkillCanonicalizer] = None
+_canonicalizer_lock = threading.Lock()
+
+
+def get_canonicalizer() -> SkillCanonicalizer:
+    """Moteur partagé par le processus, construit au premier usage (alias de CV_SKILL_ALIASES inclus)"""
+    global _canonicalizer
+    if _canonicalizer is None:
+        with _canonicalizer_lock:
+            if _canonicalizer is None:
+                aliases = {name: tuple(values) for name, values in SKILL_ALIASES.items()}
+                for name, values in getattr(settings, 'CV_SKILL_ALIASES', {}).items():
+                    aliases[name] = aliases.get(name, ()) + tuple(values)
+                _canonicalizer = SkillCanonicalizer(aliases)
+    return _canonicalizer
+
+
+def canonical_skill(label: str) -> str:
+    return get_canonicalizer().canonical(label)
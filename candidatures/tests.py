@@ -1,3 +1,1052 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import Mock, patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from .admission import AdmissionController, AdmissionRejected, admission
+from .async_services import AsyncCVAnalysisService
+from .budget import DailyBudget, record_usage
+from . import hedging
+from .hedging import ahedged_call, get_executor, hedge_pool_size, hedge_stats, hedged_call, message_latency
+from .language import detect_language, tesseract_lang
+from .listing import LIST_FIELDS, list_rows, summarize
+from .management.commands.rescore import Command as RescoreCommand
+from .models import AnalysisUsage, Candidature, ExtractedPage
+from .ocr import (
+    TESSEROCR_AVAILABLE, OCREngine, OCROptions, PytesseractEngine, TesserocrEngine, crop_margins, estimate_skew,
+    get_ocr_engine, ocr_pdf_bytes, ocr_pdf_pages, preprocess_page,
+)
+from . import sandbox
+from .pagination import KeysetPaginator
+from .sandbox import SandboxLimitExceeded, run_sandboxed
+from .scheduling import FairScheduler, candidature_priority, scheduler as default_scheduler, scheduling_priority
+from .search import search_candidatures, search_terms
+from .services import (
+    MOCK_MODEL_VERSION, ROUTE_MOCK, ROUTE_OCR, ROUTE_PDF_DIRECT, ROUTE_TEXT, CVAnalysisService, CVRouter,
+    CVSectionizer, ExtractionTimeout, ModelRouter, PDFPreflight, current_model_versions, get_extraction_backend,
+    incremental_stats, merge_section_analyses, model_version_for, preflight_pdf,
+)
+from .skills import SKILL_MODE_ANY, filter_by_skills, parse_skill_filter
+from .taxonomy import get_canonicalizer
+from .views import previous_candidatures
+
+
+def make_pdf(pages) -> bytes:
+    """PDF texte minimal : une page par liste de lignes (Helvetica)"""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for lines in pages:
+        body = 'BT /F1 11 Tf 14 TL 50 780 Td ' + ' '.join(
+            '(%s) Tj T*' % line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for line in lines
+        ) + ' ET'
+        objects.append('<< /Length %d >>\nstream\n%s\nendstream' % (len(body), body))
+        objects.append('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       '/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % len(objects))
+        kids.append(len(objects))
+    objects[1] = '<< /Type /Pages /Kids [%s] /Count %d >>' % (' '.join('%d 0 R' % k for k in kids), len(kids))
+    out, offsets = b'%PDF-1.4\n', []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += ('%d 0 obj\n%s\nendobj\n' % (number, obj)).encode('latin-1')
+    xref = len(out)
+    out += ('xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)).encode()
+    out += ''.join('%010d 00000 n \n' % offset for offset in offsets).encode()
+    out += ('trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)).encode()
+    return out
+
+
+CV_LINES = ['Jean Dupont', 'Developpeur Python senior', 'EXPERIENCE'] + [
+    f'Acme Corp 2019-2024 developpement backend Django PostgreSQL {i}' for i in range(20)
+]
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), "Plans d'exécution vérifiés pour SQLite et PostgreSQL")
+class CandidatureIndexTests(TestCase):
+    """Les requêtes de la liste et du dashboard passent par les index de Candidature (EXPLAIN)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Candidature.objects.bulk_create([
+            Candidature(
+                email=f"candidat{i % 20}@example.com",
+                status=['submitted', 'screening', 'hired'][i % 3],
+                fit_score_overall=i % 100,
+                years_experience=i % 15,
+                fit_scores={},
+            )
+            for i in range(300)
+        ])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE candidatures_candidature')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Sur une petite table, PostgreSQL préfère un parcours séquentiel
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('SCAN candidatures_candidature', plan, plan)
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def test_default_ordering(self):
+        self.assertUsesIndex(Candidature.objects.all()[:30], 'cand_created_idx')
+
+    def test_status_filter_ordered_by_date(self):
+        self.assertUsesIndex(Candidature.objects.filter(status='screening')[:30], 'cand_status_created_idx')
+
+    def test_email_filter_ordered_by_date(self):
+        queryset = Candidature.objects.filter(email='candidat3@example.com')[:30]
+        self.assertUsesIndex(queryset, 'cand_email_created_idx')
+
+    def test_score_min_filter(self):
+        queryset = Candidature.objects.filter(fit_score_overall__gte=95).order_by()
+        self.assertUsesIndex(queryset, 'cand_fit_score_idx')
+
+    def test_experience_range_filter(self):
+        queryset = Candidature.objects.filter(years_experience__gte=10, years_experience__lte=12).order_by()
+        self.assertUsesIndex(queryset, 'cand_years_exp_idx')
+
+    def test_email_status_kpi(self):
+        # Index email ou statut selon les statistiques du planificateur, jamais de parcours complet
+        queryset = Candidature.objects.filter(email='candidat3@example.com', status='hired').order_by()
+        self.assertNoFullScan(queryset)
+
+
+class CandidatureSearchTests(TestCase):
+    """Recherche plein texte : accents ignorés, expériences indexées, document tenu à jour"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.helene = Candidature.objects.create(
+            email='helene@example.com', first_name='Hélène', last_name='Durand',
+            headline='Développeuse Python', skills_primary=['Django', 'PostgreSQL'],
+            experiences=[{'company': 'Société Générale', 'position': 'Ingénieure'}],
+            years_experience=3, fit_scores={},
+        )
+        cls.john = Candidature.objects.create(
+            email='john@example.com', first_name='John', last_name='Smith',
+            headline='Data engineer', skills_primary=['Spark'], years_experience=5, fit_scores={},
+        )
+
+    def search(self, query):
+        return list(search_candidatures(Candidature.objects.all(), query))
+
+    def test_accent_insensitive(self):
+        self.assertEqual(self.search('helene developpeuse'), [self.helene])
+        self.assertEqual(self.search('Société'), [self.helene])
+
+    def test_prefix_and_skills(self):
+        self.assertEqual(self.search('postgre'), [self.helene])
+        self.assertEqual(self.search('spark'), [self.john])
+        # Termes libres non réécrits en compétence ('next' ne devient pas 'next.js')
+        self.assertEqual(search_terms('Next GitHub'), ['next', 'github'])
+
+    def test_document_updated_on_save(self):
+        self.john.skills_primary = ['Django']
+        self.john.save(update_fields=['skills_primary'])
+        self.assertEqual({c.pk for c in self.search('django')}, {self.helene.pk, self.john.pk})
+
+
+class CandidatureSkillTests(TestCase):
+    """Compétences normalisées : synchronisation à l'enregistrement et filtres ET / OU"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Candidature.objects.create(
+            email='alice@example.com', skills_primary=['Django', 'PostgreSQL'], skills_secondary=['django', 'Docker'],
+            years_experience=2, fit_scores={},
+        )
+        cls.bob = Candidature.objects.create(
+            email='bob@example.com', skills_primary=['Django'], skills_secondary=['Kubernetes'],
+            years_experience=4, fit_scores={},
+        )
+
+    def test_links_keep_highest_weight(self):
+        weights = dict(self.alice.skill_links.values_list('skill__name', 'weight'))
+        self.assertEqual(weights, {'django': 2, 'postgresql': 2, 'docker': 1})
+
+    def test_links_synced_only_when_skills_change(self):
+        def skill_writes(candidature):
+            with CaptureQueriesContext(connection) as queries:
+                candidature.save()
+            return [q['sql'] for q in queries if 'candidatures_candidatureskill' in q['sql']]
+
+        bob = Candidature.objects.get(pk=self.bob.pk)
+        bob.status = 'screening'
+        self.assertEqual(skill_writes(bob), [])
+        bob.skills_secondary.append('Docker')
+        self.assertNotEqual(skill_writes(bob), [])
+        self.assertEqual(skill_writes(bob), [])
+        self.assertEqual(set(bob.skill_links.values_list('skill__name', flat=True)), {'django', 'kubernetes', 'docker'})
+
+    def test_aliases_share_a_canonical_skill(self):
+        canonicalizer = get_canonicalizer()
+        for label in ('JS', 'Javascript', 'javascript (ES6)', 'Javascrpit'):
+            self.assertEqual(canonicalizer.canonical(label), 'JavaScript')
+        self.assertEqual(canonicalizer.canonical_list(['React.js', 'ReactJS', 'Postgres'], exclude=['postgresql']), ['React'])
+        # Alias d'un côté, nom canonique de l'autre : l'exclusion compare les formes canoniques
+        self.assertEqual(canonicalizer.canonical_list(['React', 'JS'], exclude=['ReactJS', 'Javascript (ES6)']), [])
+        self.assertEqual(canonicalizer.canonical_list(['ReactJS', 'Docker'], exclude=['React']), ['Docker'])
+        self.assertEqual(parse_skill_filter('k8s, Kubernetes'), ['kubernetes'])
+        # Produits voisins et mots génériques gardent leur sens
+        for label in ('Spring', 'Unix', 'GitHub', 'GitLab', 'Elastic', 'Next'):
+            self.assertEqual(canonicalizer.canonical(label), label)
+        self.assertEqual(canonicalizer.canonical('Next.js 14'), 'Next.js')
+
+    def test_all_and_any_filters(self):
+        queryset = Candidature.objects.all()
+        self.assertEqual(list(filter_by_skills(queryset, parse_skill_filter('Django, postgresql'))), [self.alice])
+        self.assertEqual(
+            set(filter_by_skills(queryset, parse_skill_filter('PostgreSQL,Kubernetes'), SKILL_MODE_ANY)),
+            {self.alice, self.bob},
+        )
+
+
+class CandidaturePaginationTests(TestCase):
+    """Pagination par curseur : pages disjointes et complètes, y compris à created_at égal"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(7):
+            Candidature.objects.create(email=f'page{i}@example.com', years_experience=i, fit_scores={})
+        # Quatre candidatures à la même date : le départage se fait sur l'id
+        Candidature.objects.filter(email__in=[f'page{i}@example.com' for i in range(4)]).update(
+            created_at=Candidature.objects.earliest('created_at').created_at
+        )
+
+    def test_walk_forward_and_back(self):
+        paginator = KeysetPaginator(Candidature.objects.all(), per_page=3)
+        pages, page = [], paginator.page()
+        self.assertFalse(page.has_previous)
+        while True:
+            pages.append(page)
+            if not page.has_next:
+                break
+            page = paginator.page(page.next_cursor)
+        seen = [c.pk for p in pages for c in p.object_list]
+        self.assertEqual([len(p.object_list) for p in pages], [3, 3, 1])
+        self.assertEqual(seen, list(Candidature.objects.order_by('-created_at', '-id').values_list('pk', flat=True)))
+
+        back = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+        self.assertTrue(back.has_next and back.has_previous)
+        self.assertEqual(paginator.page('falsifie').object_list, pages[0].object_list)
+
+    def test_list_reads_only_card_fields(self):
+        rows = list_rows(Candidature.objects.all())
+        sql = str(rows.query)
+        for heavy in ('experiences', 'education', 'summary', 'fit_scores', 'search_document'):
+            self.assertNotIn(f'"{heavy}"', sql)
+        page = KeysetPaginator(rows, per_page=3).page()
+        summaries = summarize(page.object_list)
+        self.assertEqual([s.pk for s in summaries], [c['id'] for c in page.object_list])
+        self.assertEqual(len(LIST_FIELDS), len(page.object_list[0]))
+        self.assertEqual(len(KeysetPaginator(rows, per_page=3).page(page.next_cursor).object_list), 3)
+
+
+@override_settings(ANTHROPIC_API_KEY='sk-test', CV_ROUTING_POLICY='auto')
+@patch('candidatures.services.OCR_AVAILABLE', True)
+class CVRouterTests(SimpleTestCase):
+    """Ordre des routes décidé d'après les faits du preflight"""
+
+    def scan(self, pages):
+        return PDFPreflight(size_bytes=1000, page_count=pages, pages_with_images=pages)
+
+    def test_text_layer_first(self):
+        preflight = PDFPreflight(size_bytes=1000, page_count=1, pages_with_fonts=1, sampled_pages=1,
+                                 sample_text='x' * 500)
+        self.assertEqual(CVRouter().plan(preflight), [ROUTE_TEXT, ROUTE_OCR, ROUTE_PDF_DIRECT, ROUTE_MOCK])
+        # Couche texte trop maigre : traitée comme un scan
+        preflight.sample_text = 'x' * 50
+        self.assertEqual(CVRouter().plan(preflight)[0], ROUTE_OCR)
+
+    def test_scans_by_length_and_policy(self):
+        self.assertEqual(CVRouter().plan(self.scan(1)), [ROUTE_OCR, ROUTE_PDF_DIRECT, ROUTE_MOCK])
+        self.assertEqual(CVRouter().plan(self.scan(5)), [ROUTE_PDF_DIRECT, ROUTE_OCR, ROUTE_MOCK])
+        self.assertEqual(CVRouter('latency').plan(self.scan(1)), [ROUTE_PDF_DIRECT, ROUTE_OCR, ROUTE_MOCK])
+        self.assertEqual(CVRouter('cost').plan(self.scan(5)), [ROUTE_OCR, ROUTE_PDF_DIRECT, ROUTE_MOCK])
+        with override_settings(CV_ROUTING_DIRECT_MAX_PAGES=3):
+            self.assertEqual(CVRouter().plan(self.scan(5)), [ROUTE_OCR, ROUTE_MOCK])
+
+    def test_unreadable_pdf(self):
+        preflight = preflight_pdf(b'pas un PDF')
+        self.assertIsNotNone(preflight.parse_error)
+        self.assertEqual(CVRouter().plan(preflight), [ROUTE_PDF_DIRECT, ROUTE_MOCK])
+        with override_settings(ANTHROPIC_API_KEY=''):
+            self.assertEqual(CVRouter().plan(preflight), [ROUTE_MOCK])
+        with self.assertRaises(ValueError):
+            CVRouter('rapide')
+
+
+class ExtractionBackendTests(SimpleTestCase):
+    """Backends pdfminer : même texte page par page, échéance respectée"""
+
+    def test_backends_agree(self):
+        pdf = make_pdf([CV_LINES[:4], ['Page deux']])
+        for name in ('pdfminer', 'pdfminer_fast', 'pdfminer_raw'):
+            with self.subTest(backend=name):
+                backend = get_extraction_backend(name)
+                pages = [page.strip() for page in backend.extract_pages(pdf)]
+                self.assertEqual(pages, ['\n'.join(CV_LINES[:4]), 'Page deux'])
+                self.assertEqual(backend.extract_pages(pdf, [1])[0].strip(), 'Page deux')
+
+    def test_timeout_and_unknown_backend(self):
+        with self.assertRaises(ExtractionTimeout):
+            get_extraction_backend('pdfminer').extract(make_pdf([['Un'], ['Deux']]), timeout=1e-9)
+        with self.assertRaisesMessage(ValueError, 'inconnu'):
+            get_extraction_backend('pdftotext')
+
+    def test_benchmark_command(self):
+        with tempfile.TemporaryDirectory() as corpus:
+            with self.assertRaises(CommandError):
+                call_command('benchmark_extraction', corpus, stdout=StringIO())
+            Path(corpus, 'cv.pdf').write_bytes(make_pdf([CV_LINES]))
+            out = StringIO()
+            call_command('benchmark_extraction', corpus, backends=['pdfminer_fast'], stdout=out)
+        self.assertIn('pdfminer_fast', out.getvalue())
+        self.assertIn('Backend recommandé', out.getvalue())
+
+
+@override_settings(ANTHROPIC_API_KEY='', CV_SANDBOX_ENABLED=False)
+class IncrementalExtractionTests(TestCase):
+    """Texte mis en cache par page : seules les pages modifiées sont ré-extraites"""
+
+    EDUCATION = ['FORMATION', 'Master informatique Paris 2018']
+
+    def setUp(self):
+        incremental_stats.reset()
+
+    def test_only_changed_pages_extracted(self):
+        service = CVAnalysisService()
+        service.analyze_cv_from_bytes(make_pdf([CV_LINES, self.EDUCATION]))
+        self.assertEqual((service.last_route, ExtractedPage.objects.count()), (ROUTE_TEXT, 2))
+
+        preflight = service.preflight(make_pdf([CV_LINES, self.EDUCATION + ['Licence Lyon 2016']]))
+        self.assertEqual(preflight.pages_extracted, 0)
+        incremental_stats.reset()
+        service.analyze_cv_from_bytes(make_pdf([CV_LINES, self.EDUCATION + ['Licence Lyon 2016']]))
+        stats = incremental_stats.snapshot()
+        self.assertEqual((stats['pages_total'], stats['pages_reused']), (2, 1))
+        self.assertEqual(ExtractedPage.objects.count(), 3)
+
+    def test_unchanged_sections_reuse_previous_analysis(self):
+        service = CVAnalysisService()
+        pdf = make_pdf([CV_LINES, self.EDUCATION])
+        service.analyze_cv_from_bytes(pdf)
+        previous = Candidature.objects.create(
+            email='jean@example.com', years_experience=5, fit_scores={}, fit_score_overall=70,
+            headline='Développeur Python', model_version='claude-ancien-v0.9', **service.extraction_metadata(),
+        )
+        analysis, model_version = service.analyze_cv_from_bytes(pdf, previous=previous)
+        self.assertTrue(service.reused_previous)
+        self.assertEqual((model_version, analysis.headline), ('claude-ancien-v0.9', 'Développeur Python'))
+        self.assertEqual(incremental_stats.snapshot()['analyses_skipped'], 1)
+
+    @override_settings(ANTHROPIC_API_KEY='')
+    def test_mock_analysis_marked_stale_and_not_reused(self):
+        service = CVAnalysisService()
+        pdf = make_pdf([CV_LINES, self.EDUCATION])
+        _, model_version = service.analyze_cv_from_bytes(pdf)
+        self.assertEqual(model_version, MOCK_MODEL_VERSION)
+        previous = Candidature.objects.create(
+            email='jean@example.com', years_experience=5, fit_scores={}, model_version=model_version,
+            **service.extraction_metadata(),
+        )
+        service.analyze_cv_from_bytes(pdf, previous=previous)
+        self.assertFalse(service.reused_previous)
+        self.assertEqual(list(RescoreCommand().stale_queryset()), [previous])
+
+    def test_previous_candidature_scoped_to_tenant(self):
+        Candidature.objects.create(email='jean@example.com', years_experience=5, fit_scores={}, tenant='Acme')
+        globex = Candidature.objects.create(email='jean@example.com', years_experience=5, fit_scores={},
+                                            tenant='Globex')
+        self.assertEqual(list(previous_candidatures('jean@example.com', 'Globex')), [globex])
+        self.assertIsNone(previous_candidatures('jean@example.com').first())
+
+
+class CVSectionizerTests(SimpleTestCase):
+    """Sections classées par catégorie puis plafonnées sur une fin de ligne"""
+
+    CV_TEXT = '\n'.join([
+        'Jean Dupont', 'jean@example.com',
+        'Expérience professionnelle :', 'Acme 2019-2024', 'Backend Django',
+        'PUBLICATIONS', *[f'Article {i} sur les bases de données' for i in range(10)],
+        'Compétences', 'Python, Django',
+    ])
+
+    def test_classify_and_condense(self):
+        sectionizer = CVSectionizer(caps={'other': 80})
+        self.assertEqual(sectionizer.classify('experience professionnelle'), 'experience')
+        self.assertEqual(sectionizer.classify('technical skills#2'), 'skills')
+        self.assertEqual(sectionizer.classify('permis de conduire'), 'other')
+
+        condensed = sectionizer.condense(self.CV_TEXT)
+        self.assertTrue(condensed.startswith('Jean Dupont\njean@example.com\n\n## EXPERIENCE\nAcme 2019-2024'))
+        other = condensed.split('## OTHER\n')[1].split('\n\n')[0]
+        self.assertLessEqual(len(other), 80 + len('\n[...]'))
+        self.assertTrue(other.endswith('données\n[...]'))
+        self.assertIn('## SKILLS\nPython, Django', condensed)
+        self.assertEqual(sectionizer.condense(self.CV_TEXT, ['skills']), '## SKILLS\nPython, Django')
+
+    def test_merge_section_analyses(self):
+        analysis = merge_section_analyses([
+            {'first_name': 'Jean', 'last_name': 'Dupont', 'headline': 'Dev', 'summary': '', 'years_experience': 5,
+             'work_authorization': 'EU', 'fit_scores': {'experience': 80}, 'fit_score_overall': 10},
+            {'skills_primary': ['Python'], 'education_highest': 'Master', 'fit_scores': {'competences': 60}},
+        ])
+        self.assertEqual((analysis.first_name, analysis.skills_primary), ('Jean', ['Python']))
+        self.assertEqual(analysis.fit_score_overall, 70.0)
+        with self.assertRaises(ValueError):
+            merge_section_analyses([{'first_name': 'Jean'}])
+
+
+@override_settings(CV_SANDBOX_ENABLED=True)
+class PreflightSandboxTests(TestCase):
+    """Pré-analyse réelle dans le processus isolé : import de services dans l'enfant, dépassement de limite"""
+
+    def tearDown(self):
+        sandbox.stop_pools()
+
+    def test_text_pdf_routed_to_text(self):
+        preflight = preflight_pdf(make_pdf([CV_LINES, CV_LINES]))
+        self.assertIsNone(preflight.parse_error)
+        self.assertEqual(preflight.page_count, 2)
+        self.assertEqual(CVRouter().plan(preflight)[0], ROUTE_TEXT)
+
+    @override_settings(ANTHROPIC_API_KEY='', CV_SANDBOX_LIMITS={'extract': {'wall_seconds': 0.001}})
+    def test_limit_breach_degrades_to_parse_error(self):
+        wall = sandbox.sandbox_stats.snapshot().get('extract', {}).get('wall', 0)
+        preflight = preflight_pdf(make_pdf([CV_LINES]))
+        self.assertIn('interrompu', preflight.parse_error)
+        self.assertEqual(sandbox.sandbox_stats.snapshot()['extract']['wall'], wall + 1)
+        service = CVAnalysisService()
+        service.analyze_cv_from_bytes(make_pdf([CV_LINES]))
+        self.assertEqual(service.last_route, ROUTE_MOCK)
+
+    @override_settings(ANTHROPIC_API_KEY='')
+    def test_text_cv_reuses_extraction_child(self):
+        sandbox.stop_pools()
+        before = sandbox.sandbox_stats.snapshot().get('extract', {})
+        # Preflight, échantillon et extraction des pages restantes : trois traitements, un seul enfant
+        for first_page in (CV_LINES, CV_LINES + ['Nouvelle ligne']):
+            service = CVAnalysisService()
+            service.analyze_cv_from_bytes(make_pdf([first_page, ['FORMATION', 'Master informatique 2018']]))
+            self.assertEqual(service.last_route, ROUTE_TEXT)
+        after = sandbox.sandbox_stats.snapshot()['extract']
+        self.assertEqual(after.get('started', 0) - before.get('started', 0), 1)
+        # Second CV : page 2 en cache, pas d'extraction restante
+        self.assertEqual(after['ok'] - before.get('ok', 0), 5)
+
+
+def make_scan(width=800, height=1000, angle=0.0) -> Image.Image:
+    """Page scannée synthétique : lignes de texte noires sur fond blanc, éventuellement inclinée"""
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for y in range(height * 3 // 20, height * 17 // 20, 40):
+        draw.rectangle((width * 3 // 20, y, width * 17 // 20, y + 12), fill=0)
+    return image.rotate(angle, expand=True, fillcolor=255) if angle else image
+
+
+class FakeOCREngine(OCREngine):
+    """Confiance fixée par la largeur de l'image reçue"""
+
+    name = 'fake'
+
+    def __init__(self, confidences, text=None):
+        self.confidences = confidences
+        self.text = text
+        self.calls = []
+
+    def recognize(self, image, lang, psm):
+        self.calls.append((image.width, lang))
+        return self.text or f'page {image.width}', self.confidences[image.width]
+
+
+class OCRPreprocessingTests(SimpleTestCase):
+    """Prétraitement des scans et nouvel essai à plus haute résolution des pages peu fiables"""
+
+    def test_preprocess_page(self):
+        for angle in (3, -2):
+            self.assertEqual(estimate_skew(make_scan(angle=angle)), -angle)
+        self.assertEqual(crop_margins(make_scan()).size, (581, 713))
+        page = preprocess_page(make_scan(angle=3).convert('RGB'), OCROptions(max_pixels=400 * 500))
+        self.assertEqual(page.mode, 'L')
+        self.assertLessEqual(page.width * page.height, 400 * 500)
+        self.assertEqual({value for _, value in page.getcolors()}, {0, 255})
+
+    def test_low_confidence_page_retried_at_higher_dpi(self):
+        # Page 1 fiable à 150 DPI ; page 2 peu fiable, meilleure à 300 DPI
+        engine = FakeOCREngine({1000: 90, 500: 50, 600: 80})
+
+        def rasterize(file_content, dpi, options, page=None):
+            widths = [600] if page == 2 else [1000, 500]
+            return [Image.new('L', (width, 10)) for width in widths]
+
+        options = OCROptions(preprocess=False, detect_language=False)
+        with patch('candidatures.ocr.get_ocr_engine', return_value=engine), \
+                patch('candidatures.ocr._rasterize', side_effect=rasterize):
+            pages = ocr_pdf_pages(b'%PDF', options)
+            self.assertEqual([(p['dpi'], p['confidence']) for p in pages], [(150, 90), (300, 80)])
+            self.assertEqual(ocr_pdf_bytes(b'%PDF', options), 'page 1000\n\npage 600')
+        self.assertEqual(engine.calls, [(1000, 'fra+eng'), (500, 'fra+eng'), (600, 'fra+eng')] * 2)
+
+        with patch('candidatures.ocr.get_ocr_engine', return_value=engine), \
+                patch('candidatures.ocr._rasterize', side_effect=OSError('poppler absent')):
+            with self.assertRaisesMessage(ValueError, 'Poppler-utils requis'):
+                ocr_pdf_bytes(b'%PDF', options)
+
+
+class OCREngineTests(SimpleTestCase):
+    """Un moteur par nom et par processus, repli sur pytesseract sans tesserocr"""
+
+    def test_engine_selection(self):
+        engine = get_ocr_engine('pytesseract')
+        self.assertIs(get_ocr_engine('pytesseract'), engine)
+        if not TESSEROCR_AVAILABLE:
+            self.assertIs(get_ocr_engine('tesserocr'), engine)
+            self.assertIs(get_ocr_engine('auto'), engine)
+        with self.assertRaisesMessage(ValueError, 'Moteur OCR inconnu'):
+            get_ocr_engine('easyocr')
+
+    def test_missing_tesseract(self):
+        missing = SimpleNamespace(get_tesseract_version=Mock(side_effect=OSError('tesseract introuvable')))
+        with patch('candidatures.ocr.pytesseract', missing, create=True):
+            with self.assertRaisesMessage(ValueError, 'Tesseract non trouvé'):
+                PytesseractEngine().check()
+
+    @skipUnless(TESSEROCR_AVAILABLE, "tesserocr non installé")
+    def test_tesserocr_api_loaded_once(self):
+        engine = TesserocrEngine()
+        try:
+            engine.recognize(make_scan(), 'eng', 6)
+            api = engine._apis[('eng', 6)]
+            engine.recognize(make_scan(), 'eng', 6)
+            self.assertIs(engine._apis[('eng', 6)], api)
+        finally:
+            engine.close()
+        self.assertEqual(engine._apis, {})
+
+
+class LanguageDetectionTests(SimpleTestCase):
+    """Langue du CV : modèles Tesseract chargés et variante du prompt"""
+
+    ENGLISH = 'Work experience: 5 years in the team, developed and managed the platform with my team at Acme.'
+    FRENCH = "Expérience de 5 ans dans une équipe, développement et maintenance de la plateforme pour les clients."
+
+    def test_detect_language(self):
+        for text, language in ((self.ENGLISH, 'en'), (self.FRENCH, 'fr'),
+                               ('Experiencia en el equipo de gestion, trabajo con los clientes y las ventas', 'es')):
+            detection = detect_language(text)
+            self.assertEqual(detection.language, language)
+            self.assertTrue(detection.reliable())
+        # Trop peu de mots-outils : langue inconnue, jeu de langues par défaut
+        unknown = detect_language('Python Django PostgreSQL')
+        self.assertFalse(unknown.reliable())
+        self.assertEqual(tesseract_lang(unknown, 'fra+eng'), 'fra+eng')
+        self.assertEqual(tesseract_lang(detect_language(self.ENGLISH), 'fra+eng'), 'eng')
+
+    def test_ocr_probe_narrows_models(self):
+        engine = FakeOCREngine({1000: 90, 100: 90}, text=self.ENGLISH)
+        options = OCROptions(preprocess=False, probe_dpi=15)
+        with patch('candidatures.ocr.get_ocr_engine', return_value=engine), \
+                patch('candidatures.ocr._rasterize', return_value=[Image.new('L', (1000, 10))]):
+            ocr_pdf_pages(b'%PDF', options)
+        self.assertEqual(engine.calls, [(100, 'eng'), (1000, 'eng')])
+
+    def test_prompt_and_ocr_options_follow_language(self):
+        service = CVAnalysisService()
+        self.assertEqual(service.ocr_options().lang, OCROptions.from_settings().lang)
+        service.detect_cv_language(self.ENGLISH, 'text_layer')
+        self.assertIn('written in English', service.create_analysis_prompt('CV'))
+        options = service.ocr_options()
+        self.assertEqual((options.lang, options.detect_language), ('eng', False))
+
+
+@override_settings(CV_DAILY_BUDGET_USD=10, CV_TENANT_DAILY_BUDGET_USD=0, CV_BUDGET_DEFER_RATIO=0.8,
+                   CV_BUDGET_CACHE_SECONDS=0)
+class DailyBudgetTests(TestCase):
+    """Budget glissant : analyses non urgentes différées, puis toutes refusées"""
+
+    def spend(self, cost):
+        AnalysisUsage.objects.create(model='claude-3-5-haiku', cost=Decimal(cost))
+
+    def test_defer_then_refuse(self):
+        budget = DailyBudget()
+        self.spend('5')
+        budget.check('acme', urgent=False)
+        self.spend('3.5')
+        budget.check('acme', urgent=True)
+        with self.assertRaises(AdmissionRejected):
+            budget.check('acme', urgent=False)
+        self.spend('2')
+        with self.assertRaises(AdmissionRejected) as refused:
+            budget.check('acme', urgent=True)
+        self.assertGreaterEqual(refused.exception.retry_after, 60)
+        snapshot = budget.snapshot()
+        self.assertEqual((snapshot['deferred'], snapshot['refused']), (1, 1))
+
+    @override_settings(CV_TENANT_DAILY_BUDGET_USD=3, CV_ANONYMOUS_DAILY_BUDGET_USD=2)
+    def test_retry_after_from_refusing_window(self):
+        now = timezone.now()
+        for tenant, cost, hours in [('acme', '1', 23), ('', '2', 2), ('acme', '1.5', 5)]:
+            usage = AnalysisUsage.objects.create(model='claude-3-5-haiku', tenant=tenant, cost=Decimal(cost))
+            AnalysisUsage.objects.filter(pk=usage.pk).update(created_at=now - timedelta(hours=hours))
+        # Dépôts anonymes : leur propre budget, libéré quand leur dépense d'il y a 2 h sort de la fenêtre
+        response = self.client.post(reverse('candidatures:analyze-api'))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('du client', response.json()['message'])
+        self.assertAlmostEqual(int(response['Retry-After']), 22 * 3600, delta=60)
+        # Client différé à 80 % de 3 $ : repasse sous le seuil quand la dépense d'il y a 23 h sort
+        with self.assertRaises(AdmissionRejected) as deferred:
+            DailyBudget().check('acme', urgent=False)
+        self.assertIn('presque atteint', str(deferred.exception))
+        self.assertAlmostEqual(deferred.exception.retry_after, 3600, delta=60)
+        DailyBudget().check('acme', urgent=True)
+
+    def test_exhausted_budget_returns_429(self):
+        self.spend('10')
+        for name in ('candidatures:analyze-api', 'candidatures:analyze-async-api'):
+            with self.subTest(view=name):
+                response = self.client.post(reverse(name))
+                self.assertEqual(response.status_code, 429)
+                self.assertIn('Budget journalier', response.json()['message'])
+                self.assertGreaterEqual(int(response['Retry-After']), 60)
+
+
+@override_settings(ANTHROPIC_API_KEY='')
+class RescoreTests(TestCase):
+    """Sans clé API, le re-scoring refuse de tourner plutôt que d'écrire des analyses factices"""
+
+    def setUp(self):
+        ExtractedPage.objects.create(fingerprint='a' * 64, text='\n'.join(CV_LINES), backend='pdfminer')
+        self.candidature = Candidature.objects.create(
+            email='stale@example.com', years_experience=3, fit_scores={}, fit_score_overall=42,
+            model_version='claude-ancien:v0', page_fingerprints=['a' * 64],
+        )
+
+    def test_refuses_without_api_key(self):
+        self.assertIsNone(CVAnalysisService().analyze_cached_text(self.candidature))
+        call_command('rescore', dry_run=True, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('rescore', stdout=StringIO())
+        self.candidature.refresh_from_db()
+        self.assertEqual((self.candidature.model_version, self.candidature.fit_score_overall),
+                         ('claude-ancien:v0', 42))
+
+
+class FakeMessages:
+    """API Messages factice : la route texte répond une fois l'appel PDF direct en cours, qui attend `release`"""
+
+    def __init__(self):
+        self.in_flight = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def create(self, **kwargs):
+        content = kwargs['messages'][0]['content']
+        if content == ROUTE_PDF_DIRECT:
+            self.in_flight.set()
+            self.release.wait(5)
+        else:
+            self.in_flight.wait(5)
+        self.calls.append(content)
+        return SimpleNamespace(usage=SimpleNamespace(input_tokens=100, output_tokens=10))
+
+
+class SpeculationService(CVAnalysisService):
+    settled = threading.Event()
+
+    def _settle_route(self, route_service, future=None):
+        super()._settle_route(route_service, future)
+        self.settled.set()
+
+    def _run_route(self, route, file_content, preflight, filename=None):
+        self.last_text = route
+        for _ in range(2):
+            self._create_message(model=self.model, max_tokens=10, messages=[{'role': 'user', 'content': route}])
+        return route
+
+
+class SpeculativeExecutionTests(TransactionTestCase):
+    """Routes spéculatives isolées : seul l'état du gagnant est repris, la perdante est comptée puis arrêtée"""
+
+    def test_loser_is_cancelled_and_counted(self):
+        service = SpeculationService()
+        service.settled = threading.Event()
+        messages = FakeMessages()
+        service.client = SimpleNamespace(messages=messages)
+        preflight = PDFPreflight(size_bytes=0, page_count=1, pages_with_fonts=1, sampled_pages=1)
+
+        analysis, _ = service._run_speculative(b'', preflight)
+        self.assertEqual((analysis, service.last_route, service.last_text), (ROUTE_TEXT, ROUTE_TEXT, ROUTE_TEXT))
+        self.assertEqual(len(service.usage_log), 2)
+        record_usage(service, 'acme')
+
+        # L'appel en cours de la route perdante aboutit et est enregistré ; le suivant n'est pas lancé
+        messages.release.set()
+        self.assertTrue(service.settled.wait(5))
+        usages = dict(AnalysisUsage.objects.values_list('route', 'calls'))
+        self.assertEqual(usages, {ROUTE_TEXT: 2, ROUTE_PDF_DIRECT: 1})
+        self.assertEqual(messages.calls, [ROUTE_TEXT, ROUTE_TEXT, ROUTE_PDF_DIRECT])
+        self.assertEqual(service.last_text, ROUTE_TEXT)
+
+
+@override_settings(CV_HEDGE_ENABLED=True, CV_HEDGE_MIN_SAMPLES=5, CV_HEDGE_MAX_RATIO=1)
+class HedgedCallTests(SimpleTestCase):
+    """Doublon lancé au-delà du p95 : la première réponse gagne, le perdant est compté"""
+
+    KEY = 'modele-test'
+
+    def setUp(self):
+        hedge_stats.reset()
+        message_latency(self.KEY).reset()
+        for _ in range(5):
+            message_latency(self.KEY).add(0.01)
+
+    def slow_then_fast(self, release):
+        calls = []
+
+        def call():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                release.wait(5)
+                return SimpleNamespace(name='primary', usage=SimpleNamespace(input_tokens=100, output_tokens=10))
+            return SimpleNamespace(name='hedge', usage=None)
+        return call
+
+    def test_hedge_wins_and_loser_is_counted(self):
+        release = threading.Event()
+        self.assertEqual(hedged_call(self.slow_then_fast(release), 100, self.KEY).name, 'hedge')
+        release.set()
+        for _ in range(100):
+            if hedge_stats.get('wasted_input_tokens'):
+                break
+            time.sleep(0.01)
+        stats = hedge_stats.snapshot()
+        self.assertEqual((stats['hedged'], stats['hedge_wins'], stats['wasted_input_tokens']), (1, 1, 100))
+
+    def test_guards_and_errors(self):
+        release = threading.Event()
+        threading.Timer(0.1, release.set).start()
+        with override_settings(CV_HEDGE_MAX_PROMPT_CHARS=10):
+            self.assertEqual(hedged_call(self.slow_then_fast(release), 100, self.KEY).name, 'primary')
+        self.assertEqual(hedge_stats.get('hedged'), 0)
+
+        # p95 relevé à 0,1 s par l'appel précédent
+        def failing():
+            time.sleep(0.2)
+            raise ValueError('API indisponible')
+        with self.assertRaisesMessage(ValueError, 'API indisponible'):
+            hedged_call(failing, 100, self.KEY)
+        self.assertEqual(hedge_stats.get('hedged'), 1)
+
+    def test_saturated_pool_does_not_hedge(self):
+        release, fast = threading.Event(), threading.Event()
+        executor = get_executor('hedge', hedge_pool_size())
+        # Tous les threads occupés : l'attente dans la file ne déclenche pas de doublon
+        blockers = [executor.submit(hedging._run_busy, release.wait, threading.Event())
+                    for _ in range(hedge_pool_size())]
+        threading.Timer(0.2, release.set).start()
+        self.assertEqual(hedged_call(lambda: 'primary', 100, self.KEY), 'primary')
+        self.assertEqual(hedge_stats.get('hedged'), 0)
+        # Un seul thread libre, pris par l'appel principal lent : pas de thread pour le doublon
+        blockers = [executor.submit(hedging._run_busy, fast.wait, threading.Event())
+                    for _ in range(hedge_pool_size() - 1)]
+        threading.Timer(0.2, fast.set).start()
+        self.assertEqual(hedged_call(lambda: time.sleep(0.1) or 'primary', 100, self.KEY), 'primary')
+        self.assertEqual((hedge_stats.get('hedged'), hedge_stats.get('hedge_skipped_busy')), (0, 1))
+        for blocker in blockers:
+            blocker.result()
+
+    def test_async_loser_is_cancelled(self):
+        calls = []
+
+        async def call():
+            calls.append(len(calls))
+            await asyncio.sleep(5 if len(calls) == 1 else 0)
+            return len(calls)
+
+        self.assertEqual(async_to_sync(ahedged_call)(call, 100, self.KEY), 2)
+        self.assertEqual((hedge_stats.get('hedge_wins'), hedge_stats.get('cancelled')), (1, 1))
+
+
+@override_settings(CV_MODEL_SMALL='petit', CV_MODEL_LARGE='grand', CV_MODEL_BUDGET='balanced')
+class ModelRouterTests(SimpleTestCase):
+    """Petit modèle pour les CV texte courts, structurés et en français ou anglais"""
+
+    def preflight(self, pages=1, sample_text='Jean Dupont\nEXPERIENCE\nAcme\nFORMATION\nMaster'):
+        return PDFPreflight(size_bytes=1000, page_count=pages, pages_with_fonts=pages, sampled_pages=1,
+                            sample_text=sample_text)
+
+    def test_balanced(self):
+        router = ModelRouter()
+        french = detect_language(LanguageDetectionTests.FRENCH)
+        self.assertEqual(router.select(ROUTE_TEXT, self.preflight(), french), 'petit')
+        self.assertEqual(router.select(ROUTE_TEXT, self.preflight(pages=3), french), 'grand')
+        self.assertEqual(router.select(ROUTE_TEXT, self.preflight(sample_text='Jean Dupont\nEXPERIENCE'), french),
+                         'grand')
+        self.assertEqual(router.select(ROUTE_TEXT, self.preflight(), detect_language('Python Django SQL')), 'grand')
+        self.assertEqual(router.select(ROUTE_TEXT, self.preflight(), None), 'grand')
+        self.assertEqual(router.select(ROUTE_OCR, self.preflight(), french), 'grand')
+
+    def test_budgets(self):
+        self.assertEqual(ModelRouter('quality').select(ROUTE_TEXT, self.preflight(pages=1)), 'grand')
+        self.assertEqual(ModelRouter('latency').select(ROUTE_TEXT, self.preflight(pages=9)), 'petit')
+        self.assertEqual(ModelRouter('latency').select(ROUTE_PDF_DIRECT, self.preflight()), 'grand')
+        self.assertEqual(current_model_versions(), {model_version_for('petit'), model_version_for('grand')})
+        with self.assertRaisesMessage(ValueError, 'Budget de modèle inconnu'):
+            ModelRouter('eco')
+
+
+@override_settings(ANTHROPIC_API_KEY='', CV_SANDBOX_ENABLED=False)
+class AsyncAnalyzeAPITests(TestCase):
+    """Endpoint asynchrone : mêmes réponses que la version synchrone"""
+
+    async def post_pending(self, pending=None):
+        if pending is not None:
+            session = await self.async_client.asession()
+            session['pending_candidature'] = pending
+            await session.asave()
+        return await self.async_client.post(reverse('candidatures:analyze-async-api'))
+
+    async def test_analyze_pdf(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            path = default_storage.save('cvs/cv.pdf', ContentFile(make_pdf([CV_LINES])))
+            response = await self.post_pending({'email': 'async@example.com', 'cv_file_path': path,
+                                                'cv_file_url': f'/media/{path}'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        candidature = await Candidature.objects.aget(pk=data['candidature_id'])
+        self.assertEqual((candidature.email, len(candidature.page_fingerprints)), ('async@example.com', 1))
+        self.assertEqual(data['metadata']['model_version'], candidature.model_version)
+        # Candidature en attente consommée
+        self.assertEqual((await self.post_pending()).status_code, 400)
+
+    async def test_concurrent_analyses_overlap(self):
+        # Au-delà de CV_SCHEDULER_CONCURRENCY (4) : les analyses asynchrones ont leurs propres limites
+        running, peak, all_started = 0, 0, asyncio.Event()
+        analyze = AsyncCVAnalysisService.aanalyze_cv_with_ai
+
+        async def waiting_analysis(service, cv_text):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            if running == 6:
+                all_started.set()
+            try:
+                await asyncio.wait_for(all_started.wait(), 2)
+            except asyncio.TimeoutError:
+                pass
+            running -= 1
+            return await analyze(service, cv_text)
+
+        async def post(i):
+            client = AsyncClient()
+            session = await client.asession()
+            session['pending_candidature'] = {'email': f'async{i}@example.com', 'cv_text': '\n'.join(CV_LINES),
+                                              'cv_file_url': ''}
+            await session.asave()
+            return await client.post(reverse('candidatures:analyze-async-api'))
+
+        with patch.object(AsyncCVAnalysisService, 'aanalyze_cv_with_ai', waiting_analysis):
+            responses = await asyncio.gather(*(post(i) for i in range(6)))
+        self.assertEqual([response.status_code for response in responses], [200] * 6)
+        self.assertEqual(peak, 6)
+
+    async def test_analysis_error(self):
+        response = await self.post_pending({'email': 'async@example.com', 'cv_file_url': ''})
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('ni texte ni fichier', response.json()['message'])
+        self.assertFalse(await Candidature.objects.filter(email='async@example.com').aexists())
+
+
+ADMISSION_LIMITS = {
+    'max_in_flight': 2, 'max_queue': 1, 'bulk_max_share': 0.5, 'queue_timeout': 0.1, 'min_retry_after': 5,
+    'stages': {'extract': 8, 'ocr': 1, 'llm': 16},
+}
+
+
+class AdmissionControlTests(TestCase):
+    """Places réservées aux analyses interactives, refus en 429 avec Retry-After"""
+
+    def test_bulk_share_queue_and_stages(self):
+        controller = AdmissionController(ADMISSION_LIMITS)
+        with controller.admit('bulk'):
+            with self.assertRaises(AdmissionRejected):
+                with controller.admit('bulk'):
+                    pass
+            with controller.admit('interactive'):
+                # Plus de place : l'analyse interactive attend queue_timeout puis est refusée
+                with self.assertRaises(AdmissionRejected) as rejected:
+                    with controller.admit('interactive'):
+                        pass
+                self.assertGreaterEqual(rejected.exception.retry_after, 5)
+        with controller.stage('ocr'):
+            with self.assertRaises(AdmissionRejected):
+                with controller.admit('bulk'):
+                    pass
+            self.assertEqual(controller.snapshot()['saturated_stages'], ['ocr'])
+        snapshot = controller.snapshot()
+        self.assertEqual((snapshot['admitted_bulk'], snapshot['rejected_bulk'], snapshot['rejected_interactive']),
+                         (1, 2, 1))
+        self.assertEqual(snapshot['in_flight'], {'interactive': 0, 'bulk': 0})
+
+    def test_async_waiters_admitted_in_order(self):
+        controller = AdmissionController(ADMISSION_LIMITS, {'max_in_flight': 1, 'max_queue': 4})
+        order = []
+
+        async def analysis(name):
+            with await controller.aadmit():
+                order.append(name)
+                await asyncio.sleep(0)
+
+        async def scenario():
+            held = await controller.aadmit()
+            tasks = [asyncio.ensure_future(analysis(name)) for name in ('a', 'b', 'c', 'abandonnée')]
+            await asyncio.sleep(0.01)
+            tasks.pop().cancel()
+            # Chaque place libérée passe à l'analyse suivante dans l'ordre d'arrivée, sans attente active
+            with held:
+                pass
+            await asyncio.gather(*tasks)
+            with await controller.aadmit():
+                with self.assertRaises(AdmissionRejected):
+                    await controller.aadmit()
+
+        async_to_sync(scenario)()
+        self.assertEqual(order, ['a', 'b', 'c'])
+        snapshot = controller.snapshot()
+        self.assertEqual((snapshot['async_in_flight'], snapshot['async_queue_depth']),
+                         ({'interactive': 0, 'bulk': 0}, {'interactive': 0, 'bulk': 0}))
+        self.assertEqual((snapshot['admitted_interactive'], snapshot['rejected_interactive']), (5, 1))
+
+    @override_settings(CV_ADMISSION=dict(ADMISSION_LIMITS, max_in_flight=0), CV_ASYNC_ADMISSION={'max_in_flight': 0})
+    def test_api_returns_429(self):
+        for name in ('candidatures:analyze-api', 'candidatures:analyze-async-api'):
+            for priority in ('bulk', 'interactive'):
+                with self.subTest(view=name, priority=priority):
+                    response = self.client.post(reverse(name), headers={'X-Analysis-Priority': priority})
+                    self.assertEqual(response.status_code, 429)
+                    self.assertEqual(response['Retry-After'], str(response.json()['retry_after']))
+        self.assertFalse(Candidature.objects.exists())
+
+
+class SchedulingTests(TestCase):
+    """Priorité tirée de la candidature, puis partage équitable entre clients"""
+
+    def test_priority_from_candidature(self):
+        request = SimpleNamespace(session={'pending_candidature': {'email': 'vip@example.com'}})
+        self.assertIsNone(candidature_priority(request))
+        self.assertEqual(scheduling_priority('interactive', None), 'normal')
+        self.assertEqual(scheduling_priority('bulk', None), 'low')
+        Candidature.objects.create(email='vip@example.com', years_experience=1, fit_scores={}, priority='high')
+        self.assertEqual(scheduling_priority('bulk', candidature_priority(request)), 'high')
+
+    def test_priority_then_fair_share(self):
+        scheduler = FairScheduler(concurrency=1)
+        order, threads = [], []
+
+        def run(name, priority, tenant):
+            with scheduler.permit(priority, tenant):
+                order.append(name)
+
+        with scheduler.permit('normal', 'occupe'):
+            for name, priority, tenant in [('a1', 'low', 'A'), ('a2', 'low', 'A'), ('a3', 'low', 'A'),
+                                           ('b1', 'low', 'B'), ('c1', 'high', 'C')]:
+                threads.append(threading.Thread(target=run, args=(name, priority, tenant)))
+                threads[-1].start()
+                while sum(sum(q.values()) for q in scheduler.snapshot()['queued'].values()) < len(threads):
+                    time.sleep(0.01)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, ['c1', 'a1', 'b1', 'a2', 'a3'])
+
+    def test_wait_bounded_by_timeout(self):
+        scheduler = FairScheduler(concurrency=1)
+
+        async def apermit():
+            return await scheduler.apermit('normal', 'B', timeout=0.05)
+
+        with scheduler.permit('normal', 'occupe'):
+            with self.assertRaises(AdmissionRejected) as rejected:
+                with scheduler.permit('normal', 'A', timeout=0.05):
+                    pass
+            self.assertGreaterEqual(rejected.exception.retry_after, 5)
+            with self.assertRaises(AdmissionRejected):
+                async_to_sync(apermit)()
+        # Analyses expirées retirées de la file : la place libérée n'est donnée à personne
+        snapshot = scheduler.snapshot()
+        self.assertEqual((snapshot['queued'], snapshot['running'], snapshot['expired']), ({}, 0, 2))
+
+    @override_settings(CV_ADMISSION=dict(ADMISSION_LIMITS, queue_timeout=0.1), CV_SCHEDULER_CONCURRENCY=1)
+    def test_api_returns_429_when_no_turn(self):
+        # Admise mais sans tour d'analyse dans le délai : 429, place d'admission rendue
+        with default_scheduler.permit('normal', 'occupe'):
+            response = self.client.post(reverse('candidatures:analyze-api'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(response.json()['retry_after']))
+        self.assertEqual(admission.snapshot()['in_flight'], {'interactive': 0, 'bulk': 0})
+
+
+TEST_SANDBOX_LIMITS = {'test': {'cpu_seconds': 1, 'wall_seconds': 2, 'memory_mb': 256}}
+
+
+@override_settings(CV_SANDBOX_ENABLED=True, CV_SANDBOX_LIMITS=TEST_SANDBOX_LIMITS)
+class SandboxTests(SimpleTestCase):
+    """Dépassements de limites, enfant par traitement ou réutilisé"""
+
+    def tearDown(self):
+        sandbox.stop_pools()
+
+    def assertLimit(self, limit, func, *args):
+        with self.assertRaises(SandboxLimitExceeded) as raised:
+            run_sandboxed('test', func, *args)
+        self.assertEqual(raised.exception.limit, limit)
+
+    def test_limits(self):
+        self.assertLimit('wall', time.sleep, 10)
+        self.assertLimit('cpu', sum, range(10 ** 12))
+        self.assertLimit('memory', bytearray, 512 * 1024 * 1024)
+        with self.assertRaisesMessage(ValueError, 'ValueError'):
+            run_sandboxed('test', int, 'x')
+        self.assertNotEqual(run_sandboxed('test', os.getpid), os.getpid())
+
+    @override_settings(CV_SANDBOX_POOLS={'test': {'processes': 1, 'max_jobs': 4}})
+    def test_pool_reuses_child_until_breach_or_max_jobs(self):
+        pid = run_sandboxed('test', os.getpid)
+        self.assertEqual(run_sandboxed('test', os.getpid), pid)
+        # Le temps CPU est compté par traitement, pas depuis le démarrage de l'enfant
+        self.assertEqual(run_sandboxed('test', sum, range(10 ** 6)), sum(range(10 ** 6)))
+        self.assertEqual(run_sandboxed('test', os.getpid), pid)
+        # max_jobs atteint : nouvel enfant
+        replaced = run_sandboxed('test', os.getpid)
+        self.assertNotEqual(replaced, pid)
+        self.assertLimit('cpu', sum, range(10 ** 12))
+        self.assertLimit('wall', time.sleep, 10)
+        self.assertNotIn(run_sandboxed('test', os.getpid), (pid, replaced))
@@ -4,8 +4,10 @@ from .views import (
     CandidatureTestTextView,
     CandidatureAnalyzeView,
     CandidatureAnalyzeAPIView,
+    CandidatureAnalyzeAsyncAPIView,
     CandidatureSuccessView,
-    CandidatureListView
+    CandidatureListView,
+    CandidatureStatsAPIView
 )
 
 app_name = 'candidatures'
@@ -17,6 +19,8 @@ urlpatterns = [
     path('test-text/', CandidatureTestTextView.as_view(), name='test-text'),
     path('analyze/', CandidatureAnalyzeView.as_view(), name='analyze'),
     path('api/analyze/', CandidatureAnalyzeAPIView.as_view(), name='analyze-api'),
+    path('api/analyze-async/', CandidatureAnalyzeAsyncAPIView.as_view(), name='analyze-async-api'),
+    path('api/stats/', CandidatureStatsAPIView.as_view(), name='stats-api'),
     path('list/', CandidatureListView.as_view(), name='list'),
 
     # Liste des candidatures filtré par id
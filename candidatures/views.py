@@ -6,11 +6,28 @@ from django.http import JsonResponse
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.utils import timezone
-from django.db import models
+from django.urls import reverse
+from django.conf import settings
+from accounts.decorators import RecruteurOrAdminRequiredMixin
+from .admission import PRIORITY_BULK, AdmissionRejected, admission, analysis_priority
+from .async_services import AsyncCVAnalysisService
+from .budget import arecord_usage, budget, record_usage
 from .forms import CandidatureUploadForm
+from .hedging import hedge_stats
+from .sandbox import sandbox_stats
+from .listing import list_rows, summarize
 from .models import Candidature
-from .services import CVAnalysisService, create_candidature_from_analysis
+from .pagination import DEFAULT_KEYS, KeysetPaginator, approximate_count
+from .scheduling import (
+    acandidature_priority, arequest_tenant, async_scheduler, candidature_priority, request_tenant, scheduler,
+    scheduling_priority,
+)
+from .search import search_candidatures
+from .services import CVAnalysisService, create_candidature_from_analysis, incremental_stats, model_stats, route_stats
+from .skills import SKILL_MODE_ALL, filter_by_skills, parse_skill_filter
 import json
+import os
+import time
 import uuid
 
 
@@ -110,13 +127,120 @@ class CandidatureAnalyzeView(TemplateView):
         context = super().get_context_data(**kwargs)
         pending = self.request.session.get('pending_candidature', {})
         context['candidature_data'] = pending
+        # Sous ASGI, l'analyse passe par la vue asynchrone
+        context['analyze_api_url'] = reverse(
+            'candidatures:analyze-async-api' if getattr(settings, 'CV_ANALYZE_ASYNC', False) else 'candidatures:analyze-api'
+        )
         return context
 
 
+def previous_candidatures(email: str, tenant: str = ''):
+    """
+    Candidatures antérieures du même candidat chez le même client, la plus
+    récente d'abord : pages et sections en cache ne passent pas d'un client à l'autre.
+    """
+    return Candidature.objects.filter(email=email, tenant=tenant).order_by('-created_at')
+
+
+def build_candidature_data(service, analysis_result, model_version: str, pending_data: dict,
+                           tenant: str = '') -> dict:
+    """Champs de la Candidature à créer à partir de l'analyse et des données de session"""
+    candidature_data = create_candidature_from_analysis(
+        analysis_result,
+        model_version,
+        pending_data['cv_file_url']
+    )
+    
+    # Ajouter les données du formulaire (les noms viennent maintenant de l'analyse Claude)
+    candidature_data['email'] = pending_data['email']
+    candidature_data['phone'] = ''
+    candidature_data['position_applied'] = ''
+    candidature_data['message'] = ''
+    candidature_data['tenant'] = tenant
+    candidature_data.update(service.extraction_metadata())
+    return candidature_data
+
+
+def analysis_payload(analysis_result, candidature, model_version: str) -> dict:
+    """Réponse JSON de l'API d'analyse, avec TOUTES les données"""
+    return {
+        'status': 'success',
+        'candidature_id': str(candidature.id),
+        'candidate': {
+            'first_name': analysis_result.first_name,
+            'last_name': analysis_result.last_name,
+            'full_name': f"{analysis_result.first_name} {analysis_result.last_name}",
+            'headline': analysis_result.headline,
+            'summary': analysis_result.summary,
+        },
+        'experience': {
+            'years_total': float(analysis_result.years_experience),
+            'experiences': analysis_result.experiences,
+        },
+        'education': {
+            'highest_degree': analysis_result.education_highest,
+            'education_details': analysis_result.education,
+        },
+        'skills': {
+            'primary': analysis_result.skills_primary,
+            'secondary': analysis_result.skills_secondary,
+        },
+        'languages': analysis_result.languages,
+        'personal': {
+            'interests': analysis_result.interests,
+            'locations_preferred': analysis_result.locations_preferred,
+            'availability_date': analysis_result.availability_date,
+            'work_authorization': analysis_result.work_authorization,
+        },
+        'salary': {
+            'expectation_min': analysis_result.salary_expectation_min,
+            'expectation_max': analysis_result.salary_expectation_max,
+        },
+        'scoring': {
+            'fit_score_overall': float(analysis_result.fit_score_overall),
+            'fit_scores_detailed': {
+                k: float(v) for k, v in analysis_result.fit_scores.items()
+            }
+        },
+        'metadata': {
+            'analyzed_at': candidature.analyzed_at.isoformat() if candidature.analyzed_at else None,
+            'model_version': model_version,
+        },
+        'redirect_url': f'/candidatures/{candidature.id}/'
+    }
+
+
+def admission_rejected_response(rejection: AdmissionRejected) -> JsonResponse:
+    """Réponse 429 d'une analyse refusée par le contrôle d'admission"""
+    response = JsonResponse({
+        'status': 'error',
+        'message': f"{rejection} - réessayez dans {rejection.retry_after} secondes",
+        'retry_after': rejection.retry_after,
+    }, status=429)
+    response['Retry-After'] = str(rejection.retry_after)
+    return response
+
+
 class CandidatureAnalyzeAPIView(View):
     """API endpoint pour lancer l'analyse du CV avec Claude"""
     
     def post(self, request):
+        priority = analysis_priority(request)
+        tenant = request_tenant(request)
+        queued_at = time.monotonic()
+        try:
+            # Budget journalier : les analyses de masse sont différées en premier
+            budget.check(tenant, urgent=priority != PRIORITY_BULK)
+            with admission.admit(priority):
+                # Ordre d'exécution : priorité de la candidature puis partage équitable entre clients,
+                # dans le reste du délai d'attente de l'admission
+                class_priority = scheduling_priority(priority, candidature_priority(request))
+                with scheduler.permit(class_priority, tenant, admission.queue_time_left(queued_at)):
+                    return self.analyze(request, tenant, class_priority)
+        except AdmissionRejected as rejection:
+            return admission_rejected_response(rejection)
+    
+    def analyze(self, request, tenant: str = '', priority: str = 'normal'):
         try:
             # Récupérer les données de la session
             pending_data = request.session.get('pending_candidature')
@@ -130,6 +254,7 @@ class CandidatureAnalyzeAPIView(View):
             print("Contenu session complète:", pending_data)
             
             # Analyser selon le type (fichier ou texte)
+            service = None
             try:
                 service = CVAnalysisService()
                 
@@ -152,7 +277,12 @@ class CandidatureAnalyzeAPIView(View):
                     filename = os.path.basename(file_path)
                     print(f"Nom de fichier original: {filename}")
                     
-                    analysis_result, model_version = service.analyze_cv_from_bytes(file_content, filename)
+                    # Dernière candidature du même candidat : permet une ré-analyse incrémentale
+                    previous = previous_candidatures(pending_data['email'], tenant).first()
+                    
+                    analysis_result, model_version = service.analyze_cv_from_bytes(
+                        file_content, filename, previous=previous
+                    )
                     print("Analyse fichier terminée avec succès")
                 else:
                     print("ERREUR: Aucune donnée CV trouvée dans la session")
@@ -160,6 +290,8 @@ class CandidatureAnalyzeAPIView(View):
                     raise ValueError("Aucune donnée CV trouvée (ni texte ni fichier)")
                     
             except Exception as e:
+                if service is not None:
+                    record_usage(service, tenant, priority)
                 return JsonResponse({
                     'status': 'error',
                     'message': f'Erreur analyse CV: {str(e)}'
@@ -167,20 +299,13 @@ class CandidatureAnalyzeAPIView(View):
             
             # Créer la candidature
             try:
-                candidature_data = create_candidature_from_analysis(
-                    analysis_result,
-                    model_version,
-                    pending_data['cv_file_url']
+                candidature_data = build_candidature_data(
+                    service, analysis_result, model_version, pending_data, tenant
                 )
                 
-                # Ajouter les données du formulaire (les noms viennent maintenant de l'analyse Claude)
-                candidature_data['email'] = pending_data['email']
-                candidature_data['phone'] = ''
-                candidature_data['position_applied'] = ''
-                candidature_data['message'] = ''
-                
                 # Créer l'objet Candidature
                 candidature = Candidature.objects.create(**candidature_data)
+                record_usage(service, tenant, priority, candidature)
                 
                 # Nettoyer la session
                 del request.session['pending_candidature']
@@ -192,51 +317,98 @@ class CandidatureAnalyzeAPIView(View):
                 }, status=500)
             
             # Retourner les résultats de l'analyse avec TOUTES les données
+            return JsonResponse(analysis_payload(analysis_result, candidature, model_version))
+            
+        except Exception as e:
             return JsonResponse({
-                'status': 'success',
-                'candidature_id': str(candidature.id),
-                'candidate': {
-                    'first_name': analysis_result.first_name,
-                    'last_name': analysis_result.last_name,
-                    'full_name': f"{analysis_result.first_name} {analysis_result.last_name}",
-                    'headline': analysis_result.headline,
-                    'summary': analysis_result.summary,
-                },
-                'experience': {
-                    'years_total': float(analysis_result.years_experience),
-                    'experiences': analysis_result.experiences,
-                },
-                'education': {
-                    'highest_degree': analysis_result.education_highest,
-                    'education_details': analysis_result.education,
-                },
-                'skills': {
-                    'primary': analysis_result.skills_primary,
-                    'secondary': analysis_result.skills_secondary,
-                },
-                'languages': analysis_result.languages,
-                'personal': {
-                    'interests': analysis_result.interests,
-                    'locations_preferred': analysis_result.locations_preferred,
-                    'availability_date': analysis_result.availability_date,
-                    'work_authorization': analysis_result.work_authorization,
-                },
-                'salary': {
-                    'expectation_min': analysis_result.salary_expectation_min,
-                    'expectation_max': analysis_result.salary_expectation_max,
-                },
-                'scoring': {
-                    'fit_score_overall': float(analysis_result.fit_score_overall),
-                    'fit_scores_detailed': {
-                        k: float(v) for k, v in analysis_result.fit_scores.items()
-                    }
-                },
-                'metadata': {
-                    'analyzed_at': candidature.analyzed_at.isoformat() if candidature.analyzed_at else None,
-                    'model_version': model_version,
-                },
-                'redirect_url': f'/candidatures/{candidature.id}/'
-            })
+                'status': 'error',
+                'message': f"Erreur lors de l'analyse : {str(e)}"
+            }, status=500)
+
+
+def read_stored_file(file_path: str) -> bytes:
+    with default_storage.open(file_path) as stored:
+        return stored.read()
+
+
+class CandidatureAnalyzeAsyncAPIView(View):
+    """
+    Version asynchrone de CandidatureAnalyzeAPIView (servie sous ASGI) :
+    session, ORM et appels Claude sont attendus sans bloquer de thread.
+    """
+    
+    async def post(self, request):
+        priority = analysis_priority(request)
+        tenant = await arequest_tenant(request)
+        queued_at = time.monotonic()
+        try:
+            await budget.acheck(tenant, urgent=priority != PRIORITY_BULK)
+            admitted = await admission.aadmit(priority)
+        except AdmissionRejected as rejection:
+            return admission_rejected_response(rejection)
+        with admitted:
+            class_priority = scheduling_priority(priority, await acandidature_priority(request))
+            try:
+                permit = await async_scheduler.apermit(
+                    class_priority, tenant, admission.queue_time_left(queued_at, asynchronous=True)
+                )
+            except AdmissionRejected as rejection:
+                return admission_rejected_response(rejection)
+            with permit:
+                return await self.analyze(request, tenant, class_priority)
+    
+    async def analyze(self, request, tenant: str = '', priority: str = 'normal'):
+        try:
+            pending_data = await request.session.aget('pending_candidature')
+            if not pending_data:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'Aucune candidature en attente'
+                }, status=400)
+            
+            service = None
+            try:
+                service = AsyncCVAnalysisService()
+                
+                if 'cv_text' in pending_data:
+                    analysis_result = await service.aanalyze_cv_with_ai(pending_data['cv_text'])
+                    model_version = service.model_version
+                elif 'cv_file_path' in pending_data:
+                    file_path = pending_data['cv_file_path']
+                    file_content = await service.run_blocking(read_stored_file, file_path)
+                    filename = os.path.basename(file_path)
+                    
+                    # Dernière candidature du même candidat : permet une ré-analyse incrémentale
+                    previous = await previous_candidatures(pending_data['email'], tenant).afirst()
+                    
+                    analysis_result, model_version = await service.aanalyze_cv_from_bytes(
+                        file_content, filename, previous=previous
+                    )
+                else:
+                    raise ValueError("Aucune donnée CV trouvée (ni texte ni fichier)")
+                    
+            except Exception as e:
+                if service is not None:
+                    await arecord_usage(service, tenant, priority)
+                return JsonResponse({
+                    'status': 'error',
+                    'message': f'Erreur analyse CV: {str(e)}'
+                }, status=500)
+            
+            try:
+                candidature_data = build_candidature_data(
+                    service, analysis_result, model_version, pending_data, tenant
+                )
+                candidature = await Candidature.objects.acreate(**candidature_data)
+                await arecord_usage(service, tenant, priority, candidature)
+                await request.session.apop('pending_candidature')
+            except Exception as e:
+                return JsonResponse({
+                    'status': 'error', 
+                    'message': f'Erreur création candidature: {str(e)}'
+                }, status=500)
+            
+            return JsonResponse(analysis_payload(analysis_result, candidature, model_version))
             
         except Exception as e:
             return JsonResponse({
@@ -245,6 +417,22 @@ class CandidatureAnalyzeAPIView(View):
             }, status=500)
 
 
+class CandidatureStatsAPIView(RecruteurOrAdminRequiredMixin, View):
+    """Statistiques de traitement des analyses (latence et tokens par route)"""
+    
+    def get(self, request):
+        return JsonResponse({
+            'routing': route_stats.snapshot(),
+            'models': model_stats.snapshot(),
+            'incremental': incremental_stats.snapshot(),
+            'sandbox': sandbox_stats.snapshot(),
+            'hedging': hedge_stats.snapshot(),
+            'admission': admission.snapshot(),
+            'scheduling': scheduler.snapshot(),
+            'async_scheduling': async_scheduler.snapshot(),
+        })
+
+
 class CandidatureSuccessView(TemplateView):
     template_name = 'candidatures/success.html'
     
@@ -265,7 +453,8 @@ class CandidatureListView(ListView):
     model = Candidature
     template_name = 'candidatures/list.html'
     context_object_name = 'candidatures'
-    paginate_by = 30
+    # Pagination par curseur (pagination.py) : ni OFFSET ni COUNT(*) par page
+    page_size = 30
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -287,6 +476,7 @@ class CandidatureListView(ListView):
         score_min = self.request.GET.get('score_min')
         experience = self.request.GET.get('experience')
         search = self.request.GET.get('search')
+        skills = parse_skill_filter(self.request.GET.get('skills'))
 
         if status:
             qs = qs.filter(status=status)
@@ -304,17 +494,44 @@ class CandidatureListView(ListView):
                 qs = qs.filter(years_experience__gte=6, years_experience__lte=10)
             elif experience == '10+':
                 qs = qs.filter(years_experience__gte=10)
+        if skills:
+            # Table CandidatureSkill indexée : toutes les compétences (défaut) ou au moins une
+            qs = filter_by_skills(qs, skills, self.request.GET.get('skills_mode', SKILL_MODE_ALL))
         if search:
-            qs = qs.filter(
-                models.Q(first_name__icontains=search) |
-                models.Q(last_name__icontains=search) |
-                models.Q(email__icontains=search) |
-                models.Q(headline__icontains=search)
-            )
+            # Index plein texte, résultats classés par pertinence
+            qs = search_candidatures(qs, search)
         return qs
 
+    def page_url(self, cursor):
+        """URL de la page d'un curseur, filtres courants conservés"""
+        params = self.request.GET.copy()
+        params.pop('cursor', None)
+        if cursor:
+            params['cursor'] = cursor
+        return f"?{params.urlencode()}" if params else '?'
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        queryset = context['object_list']
+        # Une recherche est triée par pertinence : le rang devient la première clé du curseur
+        keys = ('search_rank', 'created_at', 'id') if 'search_rank' in queryset.query.annotations else DEFAULT_KEYS
+        # Projection des seuls champs de la carte (listing.py)
+        page = KeysetPaginator(list_rows(queryset), self.page_size, keys).page(self.request.GET.get('cursor'))
+        summaries = summarize(page.object_list)
+        context.update({
+            'candidatures': summaries,
+            'object_list': summaries,
+            'page': page,
+            'next_url': self.page_url(page.next_cursor) if page.has_next else None,
+            'previous_url': self.page_url(page.previous_cursor) if page.has_previous else None,
+        })
+        if getattr(settings, 'CV_LIST_APPROXIMATE_TOTAL', True):
+            filtered = bool(self.kwargs.get('id')) or any(
+                self.request.GET.get(name) for name in ('status', 'score_min', 'experience', 'search', 'skills')
+            )
+            context['total'], context['total_exact'] = approximate_count(
+                queryset, getattr(settings, 'CV_LIST_COUNT_CAP', 1000), filtered
+            )
         # Ajouter l'id utilisateur filtré au contexte pour l'affichage
         user_id_filter = self.kwargs.get('id')
         if user_id_filter:
@@ -0,0 +1,111 @@
+"""
+Cache des données du tableau de bord.
+
+Chaque réponse (KPIs de home, graphiques de dashboard_data_api) est mise en
+cache par filtre avec la génération courante. Toute écriture sur Candidature
+incrémente la génération (signals.py) : les entrées existantes deviennent
+périmées sans avoir à les retrouver. Une entrée périmée depuis moins de
+CV_DASHBOARD_STALE_SECONDS est servie telle quelle pendant qu'un thread la
+recalcule (stale-while-revalidate) ; au-delà, elle est recalculée dans la
+requête.
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Callable, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from candidatures.hedging import get_executor
+
+GENERATION_KEY = 'dashboard:generation'
+REFRESH_LOCK_SECONDS = 30
+
+
+class DashboardCacheStats:
+    """Compteurs du cache : hits, hits périmés, misses, recalculs, invalidations"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            data: Dict[str, float] = dict(self._counters)
+        requests = data.get('hits', 0) + data.get('stale_hits', 0) + data.get('misses', 0)
+        data['requests'] = requests
+        data['hit_rate'] = (data.get('hits', 0) + data.get('stale_hits', 0)) / requests if requests else 0.0
+        data['generation'] = generation()
+        return data
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+dashboard_cache_stats = DashboardCacheStats()
+
+
+def generation() -> int:
+    return cache.get_or_set(GENERATION_KEY, 1, timeout=None)
+
+
+def bump_generation():
+    """Périme toutes les entrées du tableau de bord"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+    dashboard_cache_stats.incr('invalidations')
+
+
+def cache_key(name: str, params: dict) -> str:
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f'dashboard:{name}:{digest}'
+
+
+def _compute_and_store(key: str, compute: Callable):
+    current = generation()
+    value = compute()
+    # La génération lue avant le calcul : une écriture pendant le calcul laisse l'entrée périmée
+    timeout = max(getattr(settings, 'CV_DASHBOARD_CACHE_SECONDS', 60), getattr(settings, 'CV_DASHBOARD_STALE_SECONDS', 600))
+    cache.set(key, {'generation': current, 'computed_at': time.time(), 'value': value}, timeout=timeout)
+    return value
+
+
+def _refresh(key: str, compute: Callable):
+    close_old_connections()
+    try:
+        _compute_and_store(key, compute)
+        dashboard_cache_stats.incr('refreshes')
+    except Exception as e:
+        print(f"Recalcul du tableau de bord en échec ({key}) : {e}")
+    finally:
+        cache.delete(f'{key}:refreshing')
+        close_old_connections()
+
+
+def cached_payload(name: str, params: dict, compute: Callable):
+    """Valeur en cache de `compute()` pour ce nom et ces paramètres"""
+    key = cache_key(name, params)
+    entry = cache.get(key)
+    if entry is not None:
+        age = time.time() - entry['computed_at']
+        if entry['generation'] == generation() and age < getattr(settings, 'CV_DASHBOARD_CACHE_SECONDS', 60):
+            dashboard_cache_stats.incr('hits')
+            return entry['value']
+        if age < getattr(settings, 'CV_DASHBOARD_STALE_SECONDS', 600):
+            dashboard_cache_stats.incr('stale_hits')
+            # Un seul recalcul par entrée, tous processus confondus si le cache est partagé
+            if cache.add(f'{key}:refreshing', 1, timeout=REFRESH_LOCK_SECONDS):
+                get_executor('dashboard', max_workers=2).submit(_refresh, key, compute)
+            return entry['value']
+    dashboard_cache_stats.incr('misses')
+    return _compute_and_store(key, compute)
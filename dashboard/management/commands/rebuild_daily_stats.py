@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from dashboard.cache import bump_generation
+from dashboard.rollup import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule l'agrégat journalier des candidatures (CandidatureDailyStat) depuis la table Candidature"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Limiter aux N derniers jours (tout l'historique par défaut)")
+
+    def handle(self, *args, **options):
+        dates = None
+        if options['days'] is not None:
+            if options['days'] < 1:
+                raise CommandError("--days doit être positif")
+            today = timezone.localdate()
+            dates = [today - timedelta(days=i) for i in range(options['days'])]
+
+        rows = rebuild_daily_stats(dates)
+        bump_generation()
+        scope = f"{options['days']} dernier(s) jour(s)" if dates else "tout l'historique"
+        self.stdout.write(self.style.SUCCESS(f"Terminé : {rows} ligne(s) recalculée(s) ({scope})"))
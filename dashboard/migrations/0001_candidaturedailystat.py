@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-19 16:00
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_daily_stats(apps, schema_editor):
+    """Agrégat initial depuis les candidatures existantes"""
+    Candidature = apps.get_model('candidatures', 'Candidature')
+    CandidatureDailyStat = apps.get_model('dashboard', 'CandidatureDailyStat')
+    rows = (
+        Candidature.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'status', 'tenant')
+        .annotate(
+            count=Count('id'),
+            score_sum=Sum('fit_score_overall', default=0),
+            score_count=Count('id', filter=Q(fit_score_overall__isnull=False)),
+        )
+        .order_by()
+    )
+    CandidatureDailyStat.objects.bulk_create([
+        CandidatureDailyStat(
+            date=row['day'], status=row['status'], tenant=row['tenant'], count=row['count'],
+            score_sum=row['score_sum'], score_count=row['score_count'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('candidatures', '0011_candidature_created_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidatureDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Jour de création (fuseau TIME_ZONE)')),
+                ('status', models.CharField(max_length=20)),
+                ('tenant', models.CharField(blank=True, default='', max_length=255)),
+                ('count', models.IntegerField(default=0)),
+                ('score_sum', models.DecimalField(decimal_places=2, default=0, help_text='Somme des scores globaux renseignés', max_digits=14)),
+                ('score_count', models.IntegerField(default=0, help_text='Candidatures ayant un score global')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Statistique journalière',
+                'verbose_name_plural': 'Statistiques journalières',
+                'ordering': ['date', 'status'],
+                'indexes': [models.Index(fields=['tenant', 'date'], name='daily_stat_tenant_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'status', 'tenant'), name='unique_daily_stat')],
+            },
+        ),
+        migrations.RunPython(populate_daily_stats, migrations.RunPython.noop),
+    ]
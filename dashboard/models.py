@@ -1,3 +1,33 @@
 from django.db import models
 
-# Create your models here.
+
+class CandidatureDailyStat(models.Model):
+    """
+    Agrégat journalier des candidatures (jour de création × statut × client),
+    tenu à jour à chaque écriture (rollup.py) : les séries et les comparaisons
+    de périodes lisent quelques centaines de lignes au lieu de la table entière.
+    """
+    date = models.DateField(help_text="Jour de création (fuseau TIME_ZONE)")
+    status = models.CharField(max_length=20)
+    tenant = models.CharField(max_length=255, blank=True, default='')
+    count = models.IntegerField(default=0)
+    score_sum = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        help_text="Somme des scores globaux renseignés"
+    )
+    score_count = models.IntegerField(default=0, help_text="Candidatures ayant un score global")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status', 'tenant'], name='unique_daily_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['tenant', 'date'], name='daily_stat_tenant_date_idx'),
+        ]
+        ordering = ['date', 'status']
+        verbose_name = "Statistique journalière"
+        verbose_name_plural = "Statistiques journalières"
+
+    def __str__(self):
+        return f"{self.date} {self.status} {self.tenant or '-'} : {self.count}"
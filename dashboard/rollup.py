@@ -0,0 +1,100 @@
+"""
+Tenue à jour de CandidatureDailyStat.
+
+Chaque candidature compte pour (jour de création, statut courant, client) :
+une création ajoute sa contribution, un changement de statut, de score ou de
+client la déplace, une suppression la retire (signals.py). Les écritures
+qui ne passent pas par save() (update(), bulk_update) sont rattrapées par
+rebuild_daily_stats, pour quelques jours ou pour tout l'historique
+(commande rebuild_daily_stats).
+"""
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, NamedTuple, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from candidatures.models import Candidature
+from .models import CandidatureDailyStat
+
+# Champs de Candidature dont dépend l'agrégat
+ROLLUP_FIELDS = ('created_at', 'status', 'tenant', 'fit_score_overall')
+
+
+class Contribution(NamedTuple):
+    date: date
+    status: str
+    tenant: str
+    score: Optional[Decimal]
+
+
+def contribution(candidature) -> Optional[Contribution]:
+    if candidature.created_at is None:
+        return None
+    return Contribution(
+        timezone.localdate(candidature.created_at), candidature.status,
+        candidature.tenant or '', candidature.fit_score_overall,
+    )
+
+
+def apply_delta(item: Contribution, sign: int):
+    """Ajoute (sign=1) ou retire (sign=-1) une candidature de sa ligne journalière"""
+    score = Decimal(str(item.score)) if item.score is not None else Decimal(0)
+    changes = dict(
+        count=F('count') + sign,
+        score_sum=F('score_sum') + sign * score,
+        score_count=F('score_count') + (sign if item.score is not None else 0),
+    )
+    rows = CandidatureDailyStat.objects.filter(date=item.date, status=item.status, tenant=item.tenant)
+    if rows.update(**changes) or sign < 0:
+        return
+    try:
+        with transaction.atomic():
+            CandidatureDailyStat.objects.create(
+                date=item.date, status=item.status, tenant=item.tenant, count=1,
+                score_sum=score, score_count=int(item.score is not None),
+            )
+    except IntegrityError:
+        # Créée entre-temps par une écriture concurrente
+        rows.update(**changes)
+
+
+def move(previous: Optional[Contribution], current: Optional[Contribution]):
+    if previous == current:
+        return
+    if previous is not None:
+        apply_delta(previous, -1)
+    if current is not None:
+        apply_delta(current, 1)
+
+
+def rebuild_daily_stats(dates: Iterable[date] = None) -> int:
+    """Recalcule les lignes des jours donnés (tous si None) depuis Candidature ; retourne le nombre de lignes"""
+    candidatures = Candidature.objects.annotate(day=TruncDate('created_at'))
+    stats = CandidatureDailyStat.objects.all()
+    if dates is not None:
+        dates = sorted(set(dates))
+        candidatures = candidatures.filter(day__in=dates)
+        stats = stats.filter(date__in=dates)
+    rows = (
+        candidatures.values('day', 'status', 'tenant')
+        .annotate(
+            count=Count('id'),
+            score_sum=Sum('fit_score_overall', default=0),
+            score_count=Count('id', filter=Q(fit_score_overall__isnull=False)),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        stats.delete()
+        created = CandidatureDailyStat.objects.bulk_create([
+            CandidatureDailyStat(
+                date=row['day'], status=row['status'], tenant=row['tenant'], count=row['count'],
+                score_sum=row['score_sum'], score_count=row['score_count'],
+            )
+            for row in rows
+        ], batch_size=500)
+    return len(created)
@@ -0,0 +1,234 @@
+"""
+Agrégats du tableau de bord.
+
+Les KPIs sont calculés en une seule requête (agrégats conditionnels) et la
+tendance en un seul GROUP BY TruncWeek : le coût ne dépend ni du nombre de
+KPIs ni du nombre de semaines affichées. Sans filtre par email, ils sont lus
+dans l'agrégat journalier CandidatureDailyStat plutôt que dans Candidature.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from candidatures.models import Candidature
+from candidatures.skills import skill_counts
+from .models import CandidatureDailyStat
+
+REVIEW_STATUSES = ('screening', 'manager_review', 'tech_test')
+PRESELECTION_STATUSES = ('interview_1', 'offer')
+HIRED_STATUS = 'hired'
+
+STATUS_LABELS = {
+    'submitted': 'Soumise',
+    'screening': 'En sélection',
+    'manager_review': 'Revue managériale',
+    'tech_test': 'Test technique',
+    'interview_1': 'Entretien',
+    'offer': 'Offre émise',
+    'hired': 'Embauché(e)',
+    'rejected': 'Rejetée',
+}
+
+DEFAULT_TREND_WEEKS = 8
+MAX_TREND_WEEKS = 520
+
+# Durées de période (jours) proposées pour les variations des KPIs
+PERIOD_CHOICES = (7, 30, 90, 365)
+DEFAULT_PERIOD_DAYS = 30
+
+
+def dashboard_queryset(email: str = None):
+    """Candidatures du tableau de bord, filtrées par email si demandé"""
+    queryset = Candidature.objects.all()
+    return queryset.filter(email=email) if email else queryset
+
+
+def period_bounds(days: int, today: date = None) -> tuple[date, date, date]:
+    """(début de la période précédente, début de la période courante, lendemain de today)"""
+    end = (today or timezone.localdate()) + timedelta(days=1)
+    return end - timedelta(days=2 * days), end - timedelta(days=days), end
+
+
+def _day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _kpi_expressions(rollup: bool, window: Q = Q(), prefix: str = '') -> dict:
+    """Agrégats conditionnels des KPIs, restreints à `window`"""
+    def count(condition: Q = Q()):
+        if rollup:
+            return Sum('count', filter=condition & window, default=0)
+        return Count('id', filter=condition & window)
+
+    expressions = {
+        'total': count(),
+        'en_revue': count(Q(status__in=REVIEW_STATUSES)),
+        'preselection': count(Q(status__in=PRESELECTION_STATUSES)),
+        'embauches': count(Q(status=HIRED_STATUS)),
+    }
+    # Alias distincts des colonnes score_sum / score_count de l'agrégat journalier
+    if rollup:
+        expressions['scores'] = Sum('score_sum', filter=window, default=0)
+        expressions['scored'] = Sum('score_count', filter=window, default=0)
+    else:
+        expressions['scores'] = Sum('fit_score_overall', filter=window, default=0)
+        expressions['scored'] = Count('fit_score_overall', filter=window)
+    return {f'{prefix}{name}': expression for name, expression in expressions.items()}
+
+
+def _kpis(row: dict, prefix: str = '') -> dict:
+    kpis = {name: row[f'{prefix}{name}'] for name in ('total', 'en_revue', 'preselection', 'embauches')}
+    kpis['score_count'] = row[f'{prefix}scored']
+    kpis['taux_conversion'] = (kpis['embauches'] / kpis['total'] * 100) if kpis['total'] else 0
+    kpis['score_moyen'] = float((row[f'{prefix}scores'] or 0) / kpis['score_count']) if kpis['score_count'] else 0.0
+    return kpis
+
+
+def _aggregate_kpis(queryset, rollup: bool, period_days: int = None, today: date = None) -> dict:
+    """
+    KPIs globaux et, si period_days est donné, ceux des candidatures créées
+    pendant la période courante et la période précédente : une seule requête.
+    """
+    expressions = _kpi_expressions(rollup)
+    if period_days:
+        previous_start, current_start, end = period_bounds(period_days, today)
+        if rollup:
+            current = Q(date__gte=current_start, date__lt=end)
+            previous = Q(date__gte=previous_start, date__lt=current_start)
+        else:
+            current = Q(created_at__gte=_day_start(current_start), created_at__lt=_day_start(end))
+            previous = Q(created_at__gte=_day_start(previous_start), created_at__lt=_day_start(current_start))
+        expressions.update(_kpi_expressions(rollup, current, 'current_'))
+        expressions.update(_kpi_expressions(rollup, previous, 'previous_'))
+
+    row = queryset.aggregate(**expressions)
+    kpis = _kpis(row)
+    if period_days:
+        kpis['current'] = _kpis(row, 'current_')
+        kpis['previous'] = _kpis(row, 'previous_')
+    return kpis
+
+
+def compute_kpis(queryset, period_days: int = None, today: date = None) -> dict:
+    """Tous les KPIs en une requête"""
+    return _aggregate_kpis(queryset, False, period_days, today)
+
+
+def compute_rollup_kpis(stats, period_days: int = None, today: date = None) -> dict:
+    """Mêmes KPIs que compute_kpis, depuis des lignes CandidatureDailyStat"""
+    return _aggregate_kpis(stats, True, period_days, today)
+
+
+def dashboard_kpis(email: str = None, period_days: int = None) -> dict:
+    if email:
+        return compute_kpis(dashboard_queryset(email), period_days)
+    return compute_rollup_kpis(CandidatureDailyStat.objects.all(), period_days)
+
+
+def kpi_changes(kpis: dict) -> dict:
+    """
+    Variation de chaque KPI entre la période précédente et la période
+    courante : {'change': '+8', 'positive': True}. Taux et score n'ont pas de
+    variation si l'une des périodes n'a aucune candidature (ou aucun score).
+    """
+    current, previous = kpis['current'], kpis['previous']
+    changes = {}
+    for name, key in (('total_candidatures', 'total'), ('en_revue', 'en_revue'), ('preselection', 'preselection')):
+        delta = current[key] - previous[key]
+        changes[name] = {'change': f"{delta:+d}", 'positive': delta >= 0}
+
+    if current['total'] and previous['total']:
+        delta = current['taux_conversion'] - previous['taux_conversion']
+        changes['taux_conversion'] = {'change': f"{delta:+.1f} pts", 'positive': delta >= 0}
+    else:
+        changes['taux_conversion'] = {'change': '', 'positive': True}
+
+    if current['score_count'] and previous['score_count']:
+        delta = current['score_moyen'] - previous['score_moyen']
+        changes['score_moyen'] = {'change': f"{delta:+.1f}", 'positive': delta >= 0}
+    else:
+        changes['score_moyen'] = {'change': '', 'positive': True}
+    return changes
+
+
+def week_start(day: date) -> date:
+    """Lundi de la semaine (même découpage que TruncWeek)"""
+    return day - timedelta(days=day.weekday())
+
+
+def _trend_range(weeks: int, end: date = None) -> list[date]:
+    """Lundis des `weeks` semaines se terminant par celle de `end`"""
+    weeks = min(max(weeks, 1), MAX_TREND_WEEKS)
+    last = week_start(end or timezone.localdate())
+    return [last - timedelta(weeks=weeks - 1 - i) for i in range(weeks)]
+
+
+def _trend(buckets: list[date], counts: dict) -> dict:
+    return {
+        'labels': [bucket.strftime('%m-%d') for bucket in buckets],
+        'values': [counts.get(bucket, 0) for bucket in buckets],
+    }
+
+
+def weekly_trend(queryset, weeks: int = DEFAULT_TREND_WEEKS, end: date = None) -> dict:
+    """Candidatures par semaine sur `weeks` semaines jusqu'à `end` (incluse), semaines vides à 0"""
+    buckets = _trend_range(weeks, end)
+    counts = dict(
+        queryset.filter(created_at__date__gte=buckets[0], created_at__date__lt=buckets[-1] + timedelta(weeks=1))
+        .annotate(week=TruncWeek('created_at', output_field=DateField()))
+        .values('week').annotate(count=Count('id')).values_list('week', 'count')
+    )
+    return _trend(buckets, counts)
+
+
+def rollup_weekly_trend(stats, weeks: int = DEFAULT_TREND_WEEKS, end: date = None) -> dict:
+    """weekly_trend depuis des lignes CandidatureDailyStat (au plus 7 × statuts × clients par semaine)"""
+    buckets = _trend_range(weeks, end)
+    counts = dict(
+        stats.filter(date__gte=buckets[0], date__lt=buckets[-1] + timedelta(weeks=1))
+        .annotate(week=TruncWeek('date')).values('week')
+        .annotate(total=Sum('count')).values_list('week', 'total')
+    )
+    return _trend(buckets, counts)
+
+
+def status_chart(queryset) -> dict:
+    if queryset.model is CandidatureDailyStat:
+        rows = queryset.values('status').annotate(count=Sum('count')).filter(count__gt=0).order_by('status')
+    else:
+        rows = queryset.values('status').annotate(count=Count('id')).order_by('status')
+    return {
+        'labels': [STATUS_LABELS.get(row['status'], row['status']) for row in rows],
+        'values': [row['count'] for row in rows],
+    }
+
+
+def postes_chart(queryset) -> dict:
+    """Top des postes (position_applied, à défaut headline)"""
+    rows = list(queryset.exclude(position_applied='').values('position_applied')
+                .annotate(count=Count('id')).order_by('-count')[:6])
+    if rows:
+        labels = [row['position_applied'] for row in rows]
+    else:
+        rows = list(queryset.exclude(headline='').values('headline')
+                    .annotate(count=Count('id')).order_by('-count')[:6])
+        labels = [row['headline'][:20] + '...' if len(row['headline']) > 20 else row['headline'] for row in rows]
+    return {'labels': labels, 'values': [row['count'] for row in rows]}
+
+
+def dashboard_data(email: str = None, weeks: int = DEFAULT_TREND_WEEKS) -> dict:
+    """Données des graphiques (réponse de dashboard_data_api)"""
+    queryset = dashboard_queryset(email)
+    stats = CandidatureDailyStat.objects.all()
+    top_skills = skill_counts(queryset if email else None)
+    return {
+        'status_chart': status_chart(queryset if email else stats),
+        'postes_chart': postes_chart(queryset),
+        'tendance_chart': weekly_trend(queryset, weeks) if email else rollup_weekly_trend(stats, weeks),
+        'skills_chart': {
+            'labels': [item['skill__label'] for item in top_skills],
+            'values': [item['count'] for item in top_skills],
+        },
+    }
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from candidatures.models import Candidature
+from .cache import bump_generation
+from .rollup import ROLLUP_FIELDS, contribution, move
+
+
+@receiver(pre_save, sender=Candidature)
+def remember_rollup_contribution(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Contribution enregistrée avant la modification, pour la déplacer dans l'agrégat journalier"""
+    instance._rollup_previous = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(ROLLUP_FIELDS):
+        instance._rollup_previous = False
+        return
+    previous = Candidature.objects.filter(pk=instance.pk).only(*ROLLUP_FIELDS).first()
+    instance._rollup_previous = contribution(previous) if previous else None
+
+
+@receiver(post_save, sender=Candidature)
+def update_rollup(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if raw or previous is False:
+        return
+    move(previous, contribution(instance))
+
+
+@receiver(post_delete, sender=Candidature)
+def remove_from_rollup(sender, instance, **kwargs):
+    move(contribution(instance), None)
+
+
+@receiver(post_save, sender=Candidature)
+@receiver(post_delete, sender=Candidature)
+def invalidate_dashboard(sender, **kwargs):
+    """Périme le cache du tableau de bord une fois l'écriture validée"""
+    transaction.on_commit(bump_generation)
@@ -1,3 +1,110 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from candidatures.models import Candidature
+from .cache import cached_payload, dashboard_cache_stats
+from .models import CandidatureDailyStat
+from .rollup import rebuild_daily_stats
+from .services import (
+    compute_kpis, compute_rollup_kpis, dashboard_queryset, kpi_changes, rollup_weekly_trend, week_start,
+    weekly_trend,
+)
+
+
+class DashboardAggregationTests(TestCase):
+    """KPIs et tendance : nombre de requêtes constant"""
+
+    @classmethod
+    def setUpTestData(cls):
+        statuses = ['submitted', 'screening', 'tech_test', 'interview_1', 'hired', 'hired']
+        for i, status in enumerate(statuses):
+            Candidature.objects.create(
+                email=f'kpi{i}@example.com', status=status, years_experience=1, fit_score_overall=50 + 10 * i,
+                fit_scores={},
+            )
+        # Deux candidatures il y a trois semaines
+        Candidature.objects.filter(email__in=['kpi0@example.com', 'kpi1@example.com']).update(
+            created_at=timezone.now() - timedelta(weeks=3)
+        )
+
+    def test_kpis_in_one_query(self):
+        with self.assertNumQueries(1):
+            kpis = compute_kpis(dashboard_queryset())
+        self.assertEqual((kpis['total'], kpis['en_revue'], kpis['preselection'], kpis['embauches']), (6, 2, 1, 2))
+        self.assertAlmostEqual(kpis['taux_conversion'], 100 * 2 / 6)
+        self.assertAlmostEqual(kpis['score_moyen'], 75.0)
+
+    def test_weekly_trend_in_one_query(self):
+        for weeks in (8, 104):
+            with self.assertNumQueries(1):
+                trend = weekly_trend(dashboard_queryset(), weeks)
+            self.assertEqual(len(trend['values']), weeks)
+            self.assertEqual(trend['values'][-1] + trend['values'][-4], 6)
+        self.assertEqual(trend['labels'][-1], week_start(timezone.localdate()).strftime('%m-%d'))
+
+    def test_period_deltas_in_one_query(self):
+        rebuild_daily_stats()
+        with self.assertNumQueries(1):
+            kpis = compute_rollup_kpis(CandidatureDailyStat.objects.all(), period_days=14)
+        self.assertEqual(kpis, compute_kpis(dashboard_queryset(), period_days=14))
+        self.assertEqual((kpis['current']['total'], kpis['previous']['total']), (4, 2))
+        changes = kpi_changes(kpis)
+        self.assertEqual(changes['total_candidatures'], {'change': '+2', 'positive': True})
+        self.assertEqual(changes['en_revue'], {'change': '+0', 'positive': True})
+        # Période précédente : 50 et 60 ; courante : 70 à 100
+        self.assertEqual(changes['score_moyen'], {'change': '+30.0', 'positive': True})
+        self.assertEqual(changes['taux_conversion'], {'change': '+50.0 pts', 'positive': True})
+
+
+@override_settings(CV_DASHBOARD_STALE_SECONDS=0)
+class DashboardCacheTests(TestCase):
+    """Cache par filtre, périmé par toute écriture sur Candidature"""
+
+    def setUp(self):
+        cache.clear()
+        dashboard_cache_stats.reset()
+
+    def kpis(self):
+        return cached_payload('kpis', {'email': None}, lambda: compute_kpis(dashboard_queryset()))
+
+    def test_write_invalidates(self):
+        self.assertEqual(self.kpis()['total'], 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.kpis()['total'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Candidature.objects.create(email='cache@example.com', years_experience=1, fit_scores={})
+        self.assertEqual(self.kpis()['total'], 1)
+        stats = dashboard_cache_stats.snapshot()
+        self.assertEqual((stats['hits'], stats['misses'], stats['invalidations']), (1, 2, 1))
+
+
+class DailyRollupTests(TestCase):
+    """Agrégat journalier tenu à jour à chaque écriture, identique à une reconstruction"""
+
+    def rollup(self):
+        return sorted(CandidatureDailyStat.objects.filter(count__gt=0).values_list(
+            'date', 'status', 'tenant', 'count', 'score_sum', 'score_count'))
+
+    def test_incremental_matches_rebuild(self):
+        first = Candidature.objects.create(email='r1@example.com', years_experience=1, fit_score_overall=80,
+                                           fit_scores={}, tenant='Acme')
+        second = Candidature.objects.create(email='r2@example.com', years_experience=1, fit_scores={})
+        Candidature.objects.create(email='r3@example.com', years_experience=1, fit_score_overall=60, fit_scores={})
+        first.status = 'hired'
+        first.fit_score_overall = 90
+        first.save()
+        second.save(update_fields=['first_name'])
+        second.delete()
+
+        incremental = self.rollup()
+        self.assertEqual(sum(row[3] for row in incremental), 2)
+        rebuild_daily_stats()
+        self.assertEqual(self.rollup(), incremental)
+
+        stats = CandidatureDailyStat.objects.all()
+        kpis = compute_rollup_kpis(stats)
+        self.assertEqual(kpis, compute_kpis(dashboard_queryset()))
+        self.assertEqual(rollup_weekly_trend(stats, 4), weekly_trend(dashboard_queryset(), 4))
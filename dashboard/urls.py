@@ -8,4 +8,6 @@ urlpatterns = [
     path('list/', views.list_candidatures, name='list'),
     path('home/email/<str:email>/', views.home, name='home-email'),
     path('api/data/', views.dashboard_data_api, name='data-api'),
+    path('api/spend/', views.spend_api, name='spend-api'),
+    path('api/cache/', views.cache_stats_api, name='cache-stats-api'),
 ]
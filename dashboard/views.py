@@ -1,48 +1,48 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.db.models import Count, Avg, Q
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncHour
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import timedelta
 from accounts.decorators import recruteur_or_admin_required
-from candidatures.models import Candidature, StatusChoices
+from candidatures.budget import budget
+from candidatures.models import AnalysisUsage
+from candidatures.scheduling import request_tenant
+from .cache import cached_payload, dashboard_cache_stats
+from .services import (
+    DEFAULT_PERIOD_DAYS, DEFAULT_TREND_WEEKS, MAX_TREND_WEEKS, PERIOD_CHOICES, dashboard_data, dashboard_kpis,
+    kpi_changes,
+)
 
 @login_required
 def home(request):
     # Filtrer par email si présent dans l'URL
     email_filter = request.GET.get('email')
-    queryset = Candidature.objects.all()
     
-    if email_filter:
-        queryset = queryset.filter(email=email_filter)
+    # Durée de la période comparée à la précédente (jours)
+    try:
+        period = int(request.GET.get('period', DEFAULT_PERIOD_DAYS))
+    except ValueError:
+        period = DEFAULT_PERIOD_DAYS
+    if period not in PERIOD_CHOICES:
+        period = DEFAULT_PERIOD_DAYS
     
-    # Calculer les KPIs
-    total_candidatures = queryset.count()
-    en_revue = queryset.filter(status__in=['screening', 'manager_review', 'tech_test']).count()
-    preselection = queryset.filter(status__in=['interview_1', 'offer']).count()
-    embauches = queryset.filter(status='hired').count()
-    
-    # Taux de conversion (embauches / total)
-    taux_conversion = (embauches / total_candidatures * 100) if total_candidatures > 0 else 0
-    
-    # Score moyen
-    score_moyen = queryset.aggregate(avg_score=Avg('fit_score_overall'))['avg_score'] or 0
-    
-    # Variations (simulées pour l'exemple - vous pouvez calculer par rapport à la période précédente)
-    total_change = "+8"  # À calculer avec une vraie logique temporelle
-    revue_change = "-2"
-    preselection_change = "+3"
-    conversion_change = "+2.0 pts"
-    score_change = "+1.4"
+    # KPIs et KPIs des deux périodes en une requête (agrégat journalier, voir dashboard/services.py), en cache par filtre
+    kpis = cached_payload('kpis', {'email': email_filter, 'period': period},
+                          lambda: dashboard_kpis(email_filter, period))
+    changes = kpi_changes(kpis)
     
     context = {
         'email_filter': email_filter,
+        'period': period,
+        'period_choices': PERIOD_CHOICES,
         'kpis': {
-            'total_candidatures': {'value': total_candidatures, 'change': total_change, 'positive': True},
-            'en_revue': {'value': en_revue, 'change': revue_change, 'positive': False},
-            'preselection': {'value': preselection, 'change': preselection_change, 'positive': True},
-            'taux_conversion': {'value': f"{taux_conversion:.1f}%", 'change': conversion_change, 'positive': True},
-            'score_moyen': {'value': f"{score_moyen:.1f}", 'change': score_change, 'positive': True},
+            'total_candidatures': {'value': kpis['total'], **changes['total_candidatures']},
+            'en_revue': {'value': kpis['en_revue'], **changes['en_revue']},
+            'preselection': {'value': kpis['preselection'], **changes['preselection']},
+            'taux_conversion': {'value': f"{kpis['taux_conversion']:.1f}%", **changes['taux_conversion']},
+            'score_moyen': {'value': f"{kpis['score_moyen']:.1f}", **changes['score_moyen']},
         }
     }
     return render(request, 'dashboard/home.html', context)
@@ -54,79 +54,64 @@ def list_candidatures(request):
 @login_required
 def dashboard_data_api(request):
     """API pour fournir les données des graphiques en temps réel"""
-    
-    # Filtrer par email si présent dans l'URL
     email_filter = request.GET.get('email')
-    queryset = Candidature.objects.all()
-    
-    if email_filter:
-        queryset = queryset.filter(email=email_filter)
-    
-    # Répartition par statut
-    status_data = list(queryset.values('status').annotate(count=Count('id')))
-    status_labels = []
-    status_values = []
-    
-    status_mapping = {
-        'submitted': 'Soumise',
-        'screening': 'En sélection',
-        'manager_review': 'Revue managériale', 
-        'tech_test': 'Test technique',
-        'interview_1': 'Entretien',
-        'offer': 'Offre émise',
-        'hired': 'Embauché(e)',
-        'rejected': 'Rejetée'
-    }
-    
-    for item in status_data:
-        status_labels.append(status_mapping.get(item['status'], item['status']))
-        status_values.append(item['count'])
-    
-    # Top des postes (basé sur position_applied ou headline)
-    postes_data = list(queryset.exclude(position_applied='')
-                      .values('position_applied')
-                      .annotate(count=Count('id'))
-                      .order_by('-count')[:6])
-    
-    if not postes_data:  # Fallback sur headline si position_applied est vide
-        postes_data = list(queryset.exclude(headline='')
-                          .values('headline')
-                          .annotate(count=Count('id'))
-                          .order_by('-count')[:6])
-        postes_labels = [item['headline'][:20] + '...' if len(item['headline']) > 20 else item['headline'] for item in postes_data]
-    else:
-        postes_labels = [item['position_applied'] for item in postes_data]
-    
-    postes_values = [item['count'] for item in postes_data]
-    
-    # Tendance hebdomadaire (dernières 8 semaines)
-    today = timezone.now().date()
-    weeks_data = []
-    week_labels = []
-    
-    for i in range(7, -1, -1):
-        week_start = today - timedelta(weeks=i)
-        week_end = week_start + timedelta(days=6)
-        
-        count = queryset.filter(
-            created_at__date__gte=week_start,
-            created_at__date__lte=week_end
-        ).count()
-        
-        weeks_data.append(count)
-        week_labels.append(week_start.strftime("%m-%d"))
+    try:
+        weeks = min(max(int(request.GET.get('weeks', DEFAULT_TREND_WEEKS)), 1), MAX_TREND_WEEKS)
+    except ValueError:
+        weeks = DEFAULT_TREND_WEEKS
+    return JsonResponse(cached_payload('data', {'email': email_filter, 'weeks': weeks},
+                                       lambda: dashboard_data(email_filter, weeks)))
+
+@recruteur_or_admin_required
+def cache_stats_api(request):
+    """Taux de succès du cache du tableau de bord"""
+    return JsonResponse(dashboard_cache_stats.snapshot())
+
+@recruteur_or_admin_required
+def spend_api(request):
+    """Dépense Claude (budget glissant sur 24 h) et débit des analyses ; un recruteur ne voit que son entreprise"""
+    tenant = None if request.user.role == 'admin' else request_tenant(request)
+    try:
+        days = min(max(int(request.GET.get('days', 7)), 1), 90)
+    except ValueError:
+        days = 7
+    
+    usages = AnalysisUsage.objects.all()
+    if tenant is not None:
+        usages = usages.filter(tenant=tenant)
+    totals = dict(
+        analyses=Count('candidature', distinct=True),
+        calls=Sum('calls'),
+        input_tokens=Sum('input_tokens'),
+        output_tokens=Sum('output_tokens'),
+        cache_creation_tokens=Sum('cache_creation_tokens'),
+        cache_read_tokens=Sum('cache_read_tokens'),
+        cost=Sum('cost'),
+    )
+    
+    # Consommation par jour
+    since = timezone.now() - timedelta(days=days)
+    daily = [
+        {**row, 'day': row['day'].isoformat(), 'cost': float(row['cost'] or 0)}
+        for row in usages.filter(created_at__gte=since)
+        .annotate(day=TruncDate('created_at')).values('day')
+        .annotate(**totals).order_by('day')
+    ]
+    
+    # Débit horaire sur les dernières 24 heures
+    hourly = [
+        {'hour': row['hour'].isoformat(), 'analyses': row['analyses'], 'output_tokens': row['output_tokens']}
+        for row in usages.filter(created_at__gte=timezone.now() - timedelta(hours=24))
+        .annotate(hour=TruncHour('created_at')).values('hour')
+        .annotate(analyses=Count('candidature', distinct=True), output_tokens=Sum('output_tokens'))
+        .order_by('hour')
+    ]
     
     return JsonResponse({
-        'status_chart': {
-            'labels': status_labels,
-            'values': status_values
+        'budget': budget.snapshot(tenant),
+        'daily': daily,
+        'throughput': {
+            'hourly': hourly,
+            'analyses_24h': sum(row['analyses'] for row in hourly),
         },
-        'postes_chart': {
-            'labels': postes_labels,
-            'values': postes_values
-        },
-        'tendance_chart': {
-            'labels': week_labels,
-            'values': weeks_data
-        }
     })